@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+
+import pytest
+from staff.pagination import encode_cursor
+
+from benchmarks.harness import BenchmarkSession
+
+
+@pytest.fixture
+def client(admin_user: User) -> Client:
+    client = Client()
+    client.force_login(admin_user)
+    return client
+
+
+def get_ok(client: Client, url: str, **params):
+    response = client.get(url, params)
+    assert response.status_code == 200
+    return response
+
+
+def test_department_changelist(bench: BenchmarkSession, client: Client):
+    url = reverse('admin:staff_department_changelist')
+    bench.measure('admin.department_changelist', lambda: get_ok(client, url))
+
+
+def test_department_changelist_sorted_by_count(bench: BenchmarkSession, client: Client):
+    url = reverse('admin:staff_department_changelist')
+    # Сортировка по колонке "Сотр. (всего)"
+    bench.measure(
+        'admin.department_changelist.sorted_by_count',
+        lambda: get_ok(client, url, o='-3'),
+    )
+
+
+def test_employee_changelist(bench: BenchmarkSession, client: Client):
+    url = reverse('admin:staff_employee_changelist')
+    bench.measure('admin.employee_changelist', lambda: get_ok(client, url))
+
+
+def test_employee_changelist_search(bench: BenchmarkSession, client: Client):
+    url = reverse('admin:staff_employee_changelist')
+    bench.measure(
+        'admin.employee_changelist.search', lambda: get_ok(client, url, q='Иван')
+    )
+
+
+def test_employee_changelist_deep_page(bench: BenchmarkSession, client: Client):
+    url = reverse('admin:staff_employee_changelist')
+    # Последняя страница списка: самый дорогой OFFSET
+    last_page = get_ok(client, url).context['cl'].paginator.num_pages
+    bench.measure(
+        'admin.employee_changelist.last_page',
+        lambda: get_ok(client, url, p=str(last_page)),
+    )
+
+
+def test_employee_changelist_deep_page_cursor(bench: BenchmarkSession, client: Client):
+    url = reverse('admin:staff_employee_changelist')
+    # Та же последняя страница по ссылке «Дальше»: ключ вместо OFFSET
+    cl = get_ok(client, url).context['cl']
+    last_page = cl.paginator.num_pages
+    last = cl.queryset[(last_page - 1) * cl.list_per_page - 1]
+    params = {'p': str(last_page), 'after': encode_cursor((last.full_name, last.id))}
+    bench.measure(
+        'admin.employee_changelist.last_page_cursor',
+        lambda: get_ok(client, url, **params),
+    )
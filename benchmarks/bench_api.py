@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+import pytest
+from staff.models import Department
+
+from benchmarks.harness import BenchmarkSession
+
+
+@pytest.fixture
+def client(admin_user: User) -> Client:
+    client = Client()
+    client.force_login(admin_user)
+    return client
+
+
+@pytest.fixture
+def largest_department() -> Department:
+    """Подразделение с наибольшим числом прямых сотрудников"""
+
+    return (
+        Department.objects.annotate(total=Count('employees'))
+        .order_by('-total', 'id')
+        .first()
+    )
+
+
+def get_ok(client: Client, url: str):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response
+
+
+def test_index(bench: BenchmarkSession, client: Client):
+    url = reverse('index')
+    bench.measure('view.index', lambda: get_ok(client, url))
+
+
+@pytest.mark.parametrize('employees', ['1', '0'])
+def test_department_data(
+    bench: BenchmarkSession,
+    client: Client,
+    largest_department: Department,
+    employees: str,
+):
+    url = reverse('api-department-data', kwargs={'pk': largest_department.pk})
+    url = f'{url}?employees={employees}'
+
+    bench.measure(
+        f'api.department_data.employees_{employees}.cold',
+        lambda: get_ok(client, url),
+        setup=cache.clear,
+    )
+    bench.measure(
+        f'api.department_data.employees_{employees}.warm',
+        lambda: get_ok(client, url),
+    )
+
+
+def test_department_data_root(bench: BenchmarkSession, client: Client):
+    root = Department.objects.root_nodes().first()
+    url = reverse('api-department-data', kwargs={'pk': root.pk})
+    bench.measure(
+        'api.department_data.root.cold', lambda: get_ok(client, url), setup=cache.clear
+    )
+
+
+def test_department_employees_page(
+    bench: BenchmarkSession, client: Client, largest_department: Department
+):
+    url = reverse('api-department-employees', kwargs={'pk': largest_department.pk})
+    bench.measure('api.department_employees.first_page', lambda: get_ok(client, url))
+
+
+def test_department_tree(bench: BenchmarkSession, client: Client):
+    root = Department.objects.root_nodes().first()
+    url = reverse('api-department-tree', kwargs={'pk': root.pk})
+    bench.measure(
+        'api.department_tree.root.cold', lambda: get_ok(client, url), setup=cache.clear
+    )
+
+
+@pytest.mark.parametrize('fmt', ['json', 'columnar'])
+def test_department_employees_format(
+    bench: BenchmarkSession, client: Client, largest_department: Department, fmt: str
+):
+    url = reverse('api-department-employees', kwargs={'pk': largest_department.pk})
+    url = f'{url}?page_size=1000&format={fmt}'
+    size = len(get_ok(client, url).content)
+    bench.measure(
+        f'api.department_employees.page_1000.{fmt}', lambda: get_ok(client, url)
+    )
+    bench.results[f'api.department_employees.page_1000.{fmt}']['bytes'] = size
+
+
+def test_department_analytics(bench: BenchmarkSession, client: Client):
+    root = Department.objects.root_nodes().first()
+    url = reverse('api-department-analytics', kwargs={'pk': root.pk})
+    bench.measure(
+        'api.department_analytics.root.cold',
+        lambda: get_ok(client, url),
+        setup=cache.clear,
+    )
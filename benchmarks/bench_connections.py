@@ -0,0 +1,33 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from benchmarks.harness import BenchmarkSession
+
+
+def _select_one(connection: BaseDatabaseWrapper) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def test_new_connection(bench: BenchmarkSession):
+    # CONN_MAX_AGE=0: соединение открывается и закрывается на каждый запрос
+    def connect() -> None:
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            _select_one(connection)
+        finally:
+            connection.close()
+
+    bench.measure('db.connection.new', connect, rounds=50)
+
+
+def test_persistent_connection(bench: BenchmarkSession):
+    # CONN_MAX_AGE>0 с CONN_HEALTH_CHECKS: в начале запроса соединение
+    # проверяется (is_usable) и используется повторно
+    connection = connections[DEFAULT_DB_ALIAS]
+
+    def reuse() -> None:
+        assert connection.is_usable()
+        _select_one(connection)
+
+    bench.measure('db.connection.persistent', reuse, rounds=50)
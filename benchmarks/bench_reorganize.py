@@ -0,0 +1,71 @@
+from itertools import cycle
+
+import pytest
+from staff.models import Department
+from staff.reorganization import DepartmentChange, reorganize
+
+from benchmarks.harness import BenchmarkSession, env_int
+
+GROUPS = env_int('BENCH_REORG_GROUPS', 50)
+ROUNDS = env_int('BENCH_REORG_ROUNDS', 3)
+
+
+@pytest.fixture
+def plan() -> list[tuple[int, int, int]]:
+    """
+    Перемещения групп третьего уровня в направления других филиалов:
+    (id группы, исходный родитель, новый родитель).
+    """
+
+    divisions = cycle(Department.objects.filter(level=1).order_by('tree_id', 'lft'))
+    taken = set(Department.objects.values_list('parent_id', 'name'))
+    moves = []
+    for group in Department.objects.filter(level=3).order_by('tree_id', 'lft'):
+        division = next(divisions)
+        if division.tree_id == group.tree_id or (division.pk, group.name) in taken:
+            continue
+        taken.add((division.pk, group.name))
+        moves.append((group.pk, group.parent_id, division.pk))
+        if len(moves) == GROUPS:
+            break
+    return moves
+
+
+class Toggle:
+    """Каждый прогон переносит группы туда или обратно"""
+
+    def __init__(self, moves: list[tuple]) -> None:
+        self.moves = moves
+        self.forward = False
+
+    def next(self) -> list[tuple[int, int]]:
+        self.forward = not self.forward
+        return [
+            (pk, target if self.forward else source)
+            for pk, source, target in self.moves
+        ]
+
+
+def test_move_per_node(bench: BenchmarkSession, plan: list[tuple[int, int, int]]):
+    toggle = Toggle(plan)
+
+    def move() -> None:
+        # Как перетаскивание в DepartmentAdmin: move_node на каждый узел
+        for pk, parent_id in toggle.next():
+            node = Department.objects.get(pk=pk)
+            target = Department.objects.get(pk=parent_id)
+            Department.objects.move_node(node, target, 'last-child')
+
+    bench.measure(f'reorganize.per_node.{len(plan)}', move, rounds=ROUNDS)
+
+
+def test_move_batch(bench: BenchmarkSession, plan: list[tuple[int, int, int]]):
+    toggle = Toggle(plan)
+
+    def move() -> None:
+        reorganize(
+            DepartmentChange(pk, parent_id, move=True)
+            for pk, parent_id in toggle.next()
+        )
+
+    bench.measure(f'reorganize.batch.{len(plan)}', move, rounds=ROUNDS)
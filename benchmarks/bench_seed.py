@@ -0,0 +1,17 @@
+import os
+
+from django.core.management import call_command
+
+from benchmarks.harness import BenchmarkSession, env_int
+
+
+def test_seed_db(bench: BenchmarkSession):
+    employees = env_int('BENCH_SEED_EMPLOYEES', 10000)
+    with open(os.devnull, 'w') as devnull:
+        bench.measure(
+            f'command.seed_db.{employees}',
+            lambda: call_command(
+                'seed_db', employees=employees, seed=1, stdout=devnull
+            ),
+            rounds=env_int('BENCH_SEED_ROUNDS', 3),
+        )
@@ -0,0 +1,58 @@
+import random
+
+from django.db.models import Max
+
+import pytest
+from staff.models import Department
+from staff.seeding import build_departments
+from staff.tree import department_paths
+
+from benchmarks.harness import BenchmarkSession, env_int
+
+# Глубина 7 и 8 групп на узел дают около 90 тыс. подразделений
+DEPTH = env_int('BENCH_TREE_DEPTH', 7)
+FANOUT = env_int('BENCH_TREE_FANOUT', 8)
+
+
+@pytest.fixture
+def large_tree() -> list[Department]:
+    """
+    Большое дерево поверх базы замеров: id и tree_id сдвигаются за
+    существующие, чтобы не пересекаться с деревьями seed_db. База
+    доступна через фикстуру bench, которая запрашивается раньше.
+    """
+
+    offsets = Department.objects.aggregate(id=Max('id'), tree_id=Max('tree_id'))
+    departments = build_departments(DEPTH, FANOUT, random.Random(1))
+    for department in departments:
+        department.id += offsets['id']
+        department.tree_id += offsets['tree_id']
+        if department.parent_id is not None:
+            department.parent_id += offsets['id']
+    Department.objects.bulk_create(departments, batch_size=5000)
+    return departments
+
+
+def test_subtree_query(bench: BenchmarkSession, large_tree: list[Department]):
+    # Узел третьего уровня: несколько тысяч потомков
+    node = next(d for d in large_tree if d.level == 2)
+    bench.measure(
+        f'tree.subtree.{len(large_tree)}',
+        lambda: list(node.get_descendants().values_list('id', 'level')),
+    )
+
+
+def test_ancestors_query(bench: BenchmarkSession, large_tree: list[Department]):
+    leaf = large_tree[-1]
+    bench.measure(
+        f'tree.ancestors.{len(large_tree)}',
+        lambda: list(leaf.get_ancestors().values_list('id', 'name')),
+    )
+
+
+def test_department_paths(bench: BenchmarkSession, large_tree: list[Department]):
+    # Пути для страницы результатов поиска: предки 25 узлов одним запросом
+    nodes = random.Random(2).sample(large_tree, 25)
+    bench.measure(
+        f'tree.department_paths.{len(large_tree)}', lambda: department_paths(nodes)
+    )
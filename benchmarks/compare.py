@@ -0,0 +1,73 @@
+"""
+Сравнение двух файлов результатов замеров.
+
+    python -m benchmarks.compare benchmarks/results/base.json \\
+        benchmarks/results/head.json --threshold 0.2
+
+Код возврата 1, если медиана задержки выросла больше порога или
+увеличилось число SQL-запросов.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def load(path: str) -> dict:
+    return json.loads(Path(path).read_text())['results']
+
+
+def compare(base: dict, head: dict, threshold: float) -> list[str]:
+    """Печать таблицы сравнения, возвращает список регрессий"""
+
+    regressions = []
+    print(
+        f'{"benchmark":<55} {"base ms":>10} {"head ms":>10} {"delta":>8} {"queries":>9}'
+    )
+    for name in sorted(base.keys() & head.keys()):
+        before, after = base[name], head[name]
+        delta = (
+            after['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0
+        )
+        queries = f'{before["queries"]}->{after["queries"]}'
+        marks = []
+        if delta > threshold:
+            marks.append('SLOWER')
+        if after['queries'] > before['queries']:
+            marks.append('MORE QUERIES')
+        print(
+            f'{name:<55} {before["median_ms"]:>10.2f} {after["median_ms"]:>10.2f} '
+            f'{delta:>+8.1%} {queries:>9} {" ".join(marks)}'
+        )
+        if marks:
+            regressions.append(name)
+
+    for name in sorted(base.keys() - head.keys()):
+        print(f'{name:<55} отсутствует в новых результатах')
+    for name in sorted(head.keys() - base.keys()):
+        print(f'{name:<55} новый замер')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('base', help='Результаты базового коммита')
+    parser.add_argument('head', help='Результаты проверяемого коммита')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='Допустимый рост медианы задержки (доля, по умолчанию 0.2)',
+    )
+    args = parser.parse_args()
+
+    regressions = compare(load(args.base), load(args.head), args.threshold)
+    if regressions:
+        print(f'\nРегрессии: {len(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
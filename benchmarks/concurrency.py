@@ -0,0 +1,155 @@
+"""
+Пропускная способность при множестве одновременных клиентов.
+
+Сравнивает одни и те же запросы раскрытия узлов на синхронном WSGI и
+асинхронном ASGI серверах (оба должны быть запущены, см. README):
+
+    python -m benchmarks.concurrency \\
+        wsgi=http://127.0.0.1:8002/staff/api \\
+        asgi=http://127.0.0.1:8001/staff/api/async \\
+        --concurrency 200 --duration 30
+
+Каждый клиент - отдельный поток с keep-alive соединением, который до
+истечения времени запрашивает случайные узлы. Сессия администратора и
+список подразделений берутся напрямую из базы проекта.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from urllib.parse import urlsplit
+
+PATHS = (
+    'department-data/{id}/?employees=0',
+    'department-employees/{id}/?page_size=100',
+)
+
+
+def django_context(username: str) -> tuple[list[int], str]:
+    """Идентификаторы подразделений и cookie сессии пользователя"""
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    from staff.models import Department
+
+    client = Client()
+    client.force_login(get_user_model().objects.get(username=username))
+    cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+    ids = list(Department.objects.values_list('id', flat=True))
+    return ids, f'{settings.SESSION_COOKIE_NAME}={cookie}'
+
+
+class Worker(threading.Thread):
+    """Клиент, выполняющий запросы до наступления deadline"""
+
+    def __init__(
+        self, base_url: str, ids: list[int], cookie: str, deadline: float
+    ) -> None:
+        super().__init__(daemon=True)
+        url = urlsplit(base_url)
+        self.host, self.prefix = url.netloc, url.path.rstrip('/')
+        self.ids, self.cookie, self.deadline = ids, cookie, deadline
+        self.latencies = []
+        self.errors = 0
+
+    def requests(self) -> Iterator[str]:
+        rng = random.Random()
+        while time.perf_counter() < self.deadline:
+            path = rng.choice(PATHS).format(id=rng.choice(self.ids))
+            yield f'{self.prefix}/{path}'
+
+    def run(self) -> None:
+        connection = http.client.HTTPConnection(self.host, timeout=60)
+        for path in self.requests():
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': self.cookie})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                continue
+            if response.status != 200:
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - start)
+        connection.close()
+
+
+def run_target(
+    base_url: str, ids: list[int], cookie: str, concurrency: int, duration: float
+) -> dict:
+    deadline = time.perf_counter() + duration
+    workers = [Worker(base_url, ids, cookie, deadline) for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    latencies = sorted(value for worker in workers for value in worker.latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': sum(worker.errors for worker in workers),
+        'rps': len(latencies) / duration,
+    }
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        result.update(
+            p50_ms=statistics.median(latencies) * 1000,
+            p95_ms=quantiles[94] * 1000,
+            p99_ms=quantiles[98] * 1000,
+        )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        'targets', nargs='+', help='name=base_url, например asgi=http://host/staff/api'
+    )
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--output', help='JSON-файл для результатов')
+    args = parser.parse_args()
+
+    ids, cookie = django_context(args.username)
+    results = {}
+    for target in args.targets:
+        name, _, base_url = target.partition('=')
+        results[name] = run_target(
+            base_url, ids, cookie, args.concurrency, args.duration
+        )
+        row = results[name]
+        print(
+            f'{name:<10} {row["rps"]:>10.1f} rps  '
+            f'p50 {row.get("p50_ms", 0):>8.1f} ms  '
+            f'p95 {row.get("p95_ms", 0):>8.1f} ms  '
+            f'p99 {row.get("p99_ms", 0):>8.1f} ms  '
+            f'errors {row["errors"]}'
+        )
+
+    if args.output:
+        meta = {'concurrency': args.concurrency, 'duration': args.duration}
+        Path(args.output).write_text(
+            json.dumps({'meta': meta, 'results': results}, indent=2)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import os
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+
+from benchmarks.harness import BenchmarkSession, env_int
+
+SCALE = {
+    'employees': env_int('BENCH_EMPLOYEES', 20000),
+    'depth': env_int('BENCH_DEPTH', 5),
+    'fanout': env_int('BENCH_FANOUT', 4),
+    'seed': env_int('BENCH_SEED', 42),
+}
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    """Тестовая база заполняется синтетической структурой один раз за сессию"""
+
+    with django_db_blocker.unblock():
+        call_command('seed_db', batch_size=5000, stdout=open(os.devnull, 'w'), **SCALE)
+
+
+@pytest.fixture(scope='session')
+def bench_session():
+    session = BenchmarkSession(SCALE)
+    yield session
+    output = os.getenv('BENCH_OUTPUT')
+    path = session.write(Path(output) if output else None)
+    print(f'\nРезультаты замеров: {path}')
+
+
+@pytest.fixture
+def bench(bench_session, db):
+    return bench_session
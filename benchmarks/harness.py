@@ -0,0 +1,119 @@
+"""
+Измерение задержки, числа SQL-запросов и пикового потребления памяти.
+
+Результаты копятся в BenchmarkSession и записываются в JSON, который
+сравнивается между коммитами скриптом benchmarks/compare.py.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+
+from django.db import connection
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkSession:
+    """Результаты всех замеров одного запуска"""
+
+    def __init__(self, scale: dict) -> None:
+        self.scale = scale
+        self.results = {}
+
+    def measure(
+        self,
+        name: str,
+        func: Callable[[], object],
+        rounds: int | None = None,
+        setup: Callable[[], object] | None = None,
+    ) -> dict:
+        """
+        Замер ``func``: ``rounds`` прогонов для задержки и по одному
+        прогону для числа запросов и памяти. ``setup`` выполняется перед
+        каждым прогоном и в замер не входит.
+        """
+
+        rounds = rounds or env_int('BENCH_ROUNDS', 10)
+        setup = setup or (lambda: None)
+
+        # Прогрев: импорты, компиляция шаблонов, соединение с базой
+        setup()
+        func()
+
+        timings = []
+        for _ in range(rounds):
+            setup()
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        setup()
+        queries = []
+        with connection.execute_wrapper(
+            lambda execute, sql, params, many, context: (
+                queries.append(sql) or execute(sql, params, many, context)
+            )
+        ):
+            func()
+
+        setup()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        result = {
+            'rounds': rounds,
+            'min_ms': round(timings[0], 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'p95_ms': round(
+                timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3
+            ),
+            'queries': len(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+        self.results[name] = result
+        return result
+
+    def write(self, path: Path | None = None) -> Path:
+        if path is None:
+            label = os.getenv('BENCH_LABEL') or current_commit() or 'local'
+            path = RESULTS_DIR / f'{label}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            'meta': {
+                'commit': current_commit(),
+                'created': datetime.now(UTC).isoformat(),
+                'vendor': connection.vendor,
+                'scale': self.scale,
+            },
+            'results': dict(sorted(self.results.items())),
+        }
+        path.write_text(json.dumps(payload, indent=2, ensure_ascii=False))
+        return path
@@ -3,14 +3,29 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Запуск в production-режиме (несколько процессов uvicorn):
+
+    uvicorn core.asgi:application --host 0.0.0.0 --port 8001 --workers 4
+
+Асинхронные представления узлов дерева (staff.async_api) выполняются
+в цикле событий воркера; чтобы страница обращалась к ним, нужен
+STAFF_ASYNC_API=1.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+if settings.DEBUG:
+    # В отладочном режиме статику админки раздаёт само приложение,
+    # как это делает runserver
+    application = ASGIStaticFilesHandler(application)
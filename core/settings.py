@@ -24,11 +24,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'mptt',
-    'silk',
     'staff',
 ]
 
 MIDDLEWARE = [
+    'staff.instrumentation.InstrumentationMiddleware',
+    'staff.sharding.TreeShardMiddleware',
+    'staff.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,9 +38,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'silk.middleware.SilkyMiddleware',
 ]
 
+# Профилировщик silk пишет каждый запрос в базу, поэтому включается
+# только явно и только для отладки (зависимость из группы dev)
+if os.getenv('SILK_ENABLED') == '1':
+    INSTALLED_APPS.append('silk')
+    MIDDLEWARE.append('silk.middleware.SilkyMiddleware')
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -67,6 +74,10 @@ DATABASES = {
         'PASSWORD': os.getenv('MARIADB_PASSWORD', 'company-structure'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '3306'),
+        # Постоянные соединения: без них каждый запрос заново подключается
+        # к MariaDB. Перед повторным использованием соединение проверяется
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
@@ -74,6 +85,94 @@ DATABASES = {
     }
 }
 
+# Локальный кэш отдельный в каждом процессе: при нескольких воркерах
+# инвалидация видна только в одном из них, поэтому в таком развёртывании
+# нужен общий бэкенд (CACHE_BACKEND/CACHE_LOCATION). docker-compose.yaml
+# использует DatabaseCache в MariaDB (таблица - manage.py createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'company-structure'),
+        # При превышении часть записей вытесняется (в том числе поколения -
+        # это лишь сбрасывает соответствующие ответы)
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '300'))},
+    }
+}
+
+# Размещение деревьев подразделений по базам: "id корня=alias,...".
+# Каждой базе нужна полная схема: migrate --database=<alias>
+STAFF_TREE_SHARDS = {
+    int(root_id): alias
+    for root_id, alias in (
+        item.split('=')
+        for item in os.getenv('STAFF_TREE_SHARDS', '').split(',')
+        if item
+    )
+}
+for alias in set(STAFF_TREE_SHARDS.values()) - {'default'}:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(f'DB_NAME_{alias.upper()}', alias),
+        'HOST': os.getenv(f'DB_HOST_{alias.upper()}', DATABASES['default']['HOST']),
+    }
+
+# Реплики default для чтения: "alias,...". Параметры как у default,
+# кроме DB_HOST_<ALIAS> и DB_NAME_<ALIAS>; в тестах - зеркало default
+STAFF_DB_REPLICAS = [
+    alias for alias in os.getenv('STAFF_DB_REPLICAS', '').split(',') if alias
+]
+for alias in STAFF_DB_REPLICAS:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(f'DB_NAME_{alias.upper()}', DATABASES['default']['NAME']),
+        'HOST': os.getenv(f'DB_HOST_{alias.upper()}', DATABASES['default']['HOST']),
+        'TEST': {'MIRROR': 'default'},
+    }
+# Допустимое отставание реплик: столько секунд после записи сессия читает
+# из default. Недоступная реплика пропускается на STAFF_REPLICA_RETRY_SECONDS
+STAFF_REPLICA_LAG_SECONDS = int(os.getenv('STAFF_REPLICA_LAG_SECONDS', '5'))
+STAFF_REPLICA_RETRY_SECONDS = int(os.getenv('STAFF_REPLICA_RETRY_SECONDS', '30'))
+
+DATABASE_ROUTERS = ['staff.replicas.ReplicaRouter', 'staff.sharding.TreeShardRouter']
+
+STAFF_CACHE_ALIAS = 'default'
+STAFF_CACHE_TIMEOUT = int(os.getenv('STAFF_CACHE_TIMEOUT', '3600'))
+
+# Страница запрашивает узлы дерева у асинхронных представлений
+# (имеет смысл при запуске под ASGI, см. core/asgi.py)
+STAFF_ASYNC_API = os.getenv('STAFF_ASYNC_API', '0') == '1'
+
+# Уровни дерева, которые главная страница и department-data без
+# сотрудников отдают из снимка в памяти процесса (0 - без снимка).
+# Актуальность снимка проверяется по поколениям кэша, поэтому по
+# умолчанию он включён только с общим кэшем: LocMemCache не видит
+# инвалидаций из других процессов. С ним снимок можно включить явно,
+# если процесс один (runserver)
+STAFF_SNAPSHOT_LEVELS = int(
+    os.getenv(
+        'STAFF_SNAPSHOT_LEVELS',
+        '0' if CACHES[STAFF_CACHE_ALIAS]['BACKEND'].endswith('.LocMemCache') else '3',
+    )
+)
+
+# Список сотрудников в админке: от этого числа строк (по статистике
+# таблицы) без фильтров показывается оценка вместо COUNT(*); страницы
+# дальше STAFF_ADMIN_MAX_OFFSET строк открываются только курсором
+STAFF_ADMIN_ESTIMATED_COUNT = int(os.getenv('STAFF_ADMIN_ESTIMATED_COUNT', '100000'))
+STAFF_ADMIN_MAX_OFFSET = int(os.getenv('STAFF_ADMIN_MAX_OFFSET', '10000'))
+
+# Каталог срезов структуры (manage.py archive_structure)
+STAFF_ARCHIVE_DIR = Path(os.getenv('STAFF_ARCHIVE_DIR', BASE_DIR / 'archive'))
+
+# Встроенные метрики запросов: гистограммы в памяти процесса,
+# доступны в формате Prometheus по /staff/metrics/
+STAFF_METRICS_ENABLED = os.getenv('STAFF_METRICS_ENABLED', '1') == '1'
+STAFF_METRICS_SAMPLE_RATE = float(os.getenv('STAFF_METRICS_SAMPLE_RATE', '1.0'))
+STAFF_METRICS_SERVER_TIMING = os.getenv('STAFF_METRICS_SERVER_TIMING', '1') == '1'
+STAFF_METRICS_TOKEN = os.getenv('STAFF_METRICS_TOKEN', '')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
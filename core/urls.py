@@ -7,7 +7,7 @@ urlpatterns = [
     path('staff/', include('staff.urls')),
 ]
 
-if settings.DEBUG:
+if 'silk' in settings.INSTALLED_APPS:
     urlpatterns += [
         path('silk/', include('silk.urls', namespace='silk')),
     ]
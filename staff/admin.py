@@ -1,13 +1,14 @@
 from django.contrib import admin
 from django.db.models import QuerySet
-from django.db.models.expressions import RawSQL
 from django.http import HttpRequest
 from django.urls import reverse
 from django.utils.html import format_html
 
-from mptt.admin import DraggableMPTTAdmin, TreeRelatedFieldListFilter
+from mptt.admin import DraggableMPTTAdmin
 
-from .models import Department, Employee
+from .changelist import DepartmentTreeFilter, EmployeeChangeList, EmployeePaginator
+from .models import PATH_SEPARATOR, Department, Employee
+from .pagination import KEYSET_ORDERING
 
 
 @admin.register(Department)
@@ -17,35 +18,33 @@ class DepartmentAdmin(DraggableMPTTAdmin):
         'tree_actions',
         'indented_title',
         'employee_count_display',
+        'salary_sum_display',
         'id',
     )
     list_display_links = ('indented_title',)
     search_fields = ('name',)
 
     def get_queryset(self, request: HttpRequest) -> QuerySet:
-        qs = super().get_queryset(request)
-        qs = qs.annotate(
-            employees_cumulative_count=RawSQL(
-                """
-                SELECT COUNT(e.id)
-                FROM staff_employee e
-                         JOIN staff_department d ON e.department_id = d.id
-                WHERE d.tree_id = staff_department.tree_id
-                  AND d.lft >= staff_department.lft
-                  AND d.rght <= staff_department.rght
-                """,
-                [],
-            )
-        )
-        return qs
+        # Агрегаты читаются из staff_departmentstats одним JOIN
+        return super().get_queryset(request).select_related('stats')
 
-    @admin.display(description='Сотр. (всего)', ordering='employees_cumulative_count')
+    @admin.display(description='Сотр. (всего)', ordering='stats__cumulative_count')
     def employee_count_display(self, obj: Department) -> str:
         """Отображение количества сотрудников"""
 
-        count = obj.employees_cumulative_count or 0
+        stats = getattr(obj, 'stats', None)
+        count = stats.cumulative_count if stats else 0
         return count if count > 0 else '—'
 
+    @admin.display(description='ФОТ (всего)', ordering='stats__salary_sum')
+    def salary_sum_display(self, obj: Department) -> str:
+        """Отображение фонда оплаты труда поддерева"""
+
+        stats = getattr(obj, 'stats', None)
+        if stats and stats.salary_sum:
+            return f'{stats.salary_sum:,.2f} ₽'.replace(',', ' ')
+        return '—'
+
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -60,14 +59,20 @@ class EmployeeAdmin(admin.ModelAdmin):
     )
 
     list_filter = (
-        ('department', TreeRelatedFieldListFilter),
+        ('department', DepartmentTreeFilter),
         'hire_date',
     )
 
-    search_fields = ('full_name', 'position')
+    # Поиск по префиксу, как в API: подстрока не использует индексы
+    search_fields = ('^full_name', '^position')
     list_select_related = ('department',)
     autocomplete_fields = ('department',)
     list_per_page = 25
+    # Порядок курсоров EmployeeChangeList и индекса по full_name
+    ordering = KEYSET_ORDERING
+    paginator = EmployeePaginator
+    # Без второго COUNT(*) по всей таблице при активных фильтрах
+    show_full_result_count = False
 
     fieldsets = (
         ('Основная информация', {'fields': ('full_name', 'position', 'department')}),
@@ -79,13 +84,24 @@ class EmployeeAdmin(admin.ModelAdmin):
         ),
     )
 
+    def get_changelist(
+        self, request: HttpRequest, **kwargs
+    ) -> type[EmployeeChangeList]:
+        return EmployeeChangeList
+
     @admin.display(description='Подразделение', ordering='department')
     def department_link(self, obj: Employee) -> str:
-        """Получение ссылки на редактирование отдела"""
+        """Ссылка на отдел с полным путём из материализованного пути"""
 
         if obj.department:
             url = reverse('admin:staff_department_change', args=[obj.department.id])
-            return format_html('<a href="{}">{}</a>', url, obj.department.name)
+            parents = obj.department.name_path.rpartition(PATH_SEPARATOR)[0]
+            return format_html(
+                '<a href="{}">{}</a><div class="help">{}</div>',
+                url,
+                obj.department.name,
+                parents,
+            )
         return '-'
 
     @admin.display(description='Зарплата', ordering='salary')
@@ -0,0 +1,138 @@
+"""
+Аналитика по зарплатам и стажу для всех узлов поддерева.
+
+Считается за один упорядоченный по зарплате проход по сотрудникам
+поддерева: каждая зарплата дописывается в списки всех предков своего
+подразделения, поэтому списки узлов получаются уже отсортированными
+и медиана с процентилями берутся по индексу без сортировки. Численность,
+фонд оплаты и стаж копятся по подразделениям и сворачиваются снизу
+вверх в памяти.
+"""
+
+from bisect import bisect_left
+from collections.abc import Sequence
+from datetime import date
+
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast
+
+from rest_framework import serializers
+
+from .instrumentation import TimedSerializerMixin
+from .models import Department, Employee
+
+PERCENTILES = (10, 25, 75, 90)
+# Границы стажа в годах: <1, 1-3, 3-5, 5-10, 10+
+TENURE_YEARS = (1, 3, 5, 10)
+
+
+def tenure_labels() -> list[str]:
+    bounds = (0, *TENURE_YEARS)
+    labels = [f'{low}-{high}' for low, high in zip(bounds, TENURE_YEARS, strict=False)]
+    return [*labels, f'{TENURE_YEARS[-1]}+']
+
+
+def _years_ago(today: date, years: int) -> date:
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # 29 февраля
+        return today.replace(year=today.year - years, day=28)
+
+
+def _percentile(values: Sequence[int], percent: float) -> float:
+    """Процентиль с линейной интерполяцией по отсортированным значениям"""
+
+    position = (len(values) - 1) * percent / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def department_analytics(root: Department, today: date | None = None) -> dict:
+    """Показатели каждого узла поддерева ``root`` с учётом потомков"""
+
+    today = today or date.today()
+    # Даты приёма, начиная с которых стаж меньше 10, 5, 3, 1 года
+    cutoffs = [_years_ago(today, years) for years in reversed(TENURE_YEARS)]
+    buckets = len(TENURE_YEARS) + 1
+
+    bounds = {'tree_id': root.tree_id, 'lft__range': (root.lft, root.rght)}
+    departments = list(
+        Department.objects.filter(**bounds)
+        .order_by('lft')
+        .values_list('id', 'parent_id', 'name', 'level')
+    )
+
+    salaries = {pk: [] for pk, *_ in departments}
+    counts = dict.fromkeys(salaries, 0)
+    payroll = dict.fromkeys(salaries, 0)
+    tenure = {pk: [0] * buckets for pk in salaries}
+    # Методы append списков подразделения и всех его предков в поддереве
+    appenders = {}
+    for pk, parent_id, _, _ in departments:
+        appenders[pk] = [*appenders.get(parent_id, ()), salaries[pk].append]
+
+    employees = (
+        Employee.objects.filter(
+            **{f'department__{key}': value for key, value in bounds.items()}
+        )
+        .order_by('salary')
+        .values_list(
+            'department_id', Cast(F('salary') * 100, BigIntegerField()), 'hire_date'
+        )
+    )
+    for department_id, cents, hire_date in employees.iterator(chunk_size=10000):
+        for append in appenders[department_id]:
+            append(cents)
+        counts[department_id] += 1
+        payroll[department_id] += cents
+        tenure[department_id][buckets - 1 - bisect_left(cutoffs, hire_date)] += 1
+
+    # В порядке, обратном lft, потомки учитываются раньше предков
+    for pk, parent_id, _, _ in reversed(departments):
+        if pk == root.pk:
+            continue
+        counts[parent_id] += counts[pk]
+        payroll[parent_id] += payroll[pk]
+        for bucket, value in enumerate(tenure[pk]):
+            tenure[parent_id][bucket] += value
+
+    nodes = []
+    for pk, parent_id, name, level in departments:
+        values = salaries[pk]
+        node = {
+            'id': pk,
+            'parent_id': parent_id,
+            'name': name,
+            'level': level,
+            'headcount': counts[pk],
+            'payroll': payroll[pk] / 100,
+            'salary_mean': None,
+            'salary_median': None,
+            'salary_percentiles': dict.fromkeys(
+                (f'p{percent}' for percent in PERCENTILES), None
+            ),
+            'tenure': tenure[pk],
+        }
+        if values:
+            node['salary_mean'] = round(payroll[pk] / len(values) / 100, 2)
+            node['salary_median'] = round(_percentile(values, 50) / 100, 2)
+            for percent in PERCENTILES:
+                value = _percentile(values, percent) / 100
+                node['salary_percentiles'][f'p{percent}'] = round(value, 2)
+        nodes.append(node)
+
+    return {
+        'root': root.pk,
+        'as_of': today.isoformat(),
+        'tenure_buckets': tenure_labels(),
+        'nodes': nodes,
+    }
+
+
+class DepartmentAnalyticsSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """Аналитика поддерева подразделения"""
+
+    def to_representation(self, instance: Department) -> dict:
+        return department_analytics(instance)
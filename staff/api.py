@@ -1,15 +1,420 @@
-from rest_framework.authentication import SessionAuthentication
-from rest_framework.generics import RetrieveAPIView
-from rest_framework.permissions import IsAuthenticated
+from datetime import date
 
-from staff.models import Department
-from staff.serializers import DepartmentDetailsSerializer
+from django.http import Http404
 
+from rest_framework import status
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-class DepartmentDataAPIView(RetrieveAPIView):
+from staff.analytics import DepartmentAnalyticsSerializer
+from staff.archive import Archive, ArchiveError, archive_for, diff, list_archives
+from staff.cache import CachedDepartmentResponseMixin, counters
+from staff.changelog import ChangesResetError, changes_since
+from staff.columnar import EMPLOYEE_COLUMNS, ColumnarFormatMixin, employee_columns
+from staff.models import Department, DepartmentStats, Employee
+from staff.pagination import EmployeeKeysetPagination
+from staff.reorganization import DepartmentChange, ReorganizationError, reorganize
+from staff.search import search_employees
+from staff.serializers import (
+    BranchSerializer,
+    DepartmentDetailsSerializer,
+    DepartmentStatsSerializer,
+    EmployeeSerializer,
+)
+from staff.snapshot import SnapshotChildrenMixin
+from staff.stats import BRANCH_ORDERINGS, largest_branches
+from staff.tree import DepartmentSubtreeSerializer, department_paths
+
+
+class DepartmentDataAPIView(
+    ColumnarFormatMixin,
+    CachedDepartmentResponseMixin,
+    SnapshotChildrenMixin,
+    RetrieveAPIView,
+):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = DepartmentDetailsSerializer
+    replica_reads = True
+    cache_namespace = 'department-data'
+    cache_query_params = ('employees', 'format')
+
+    def include_employees(self) -> bool:
+        return self.request.query_params.get('employees') != '0'
+
+    def get_queryset(self):
+        # Колоночный формат читает сотрудников через values_list()
+        if self.include_employees() and not self.is_columnar():
+            return Department.objects.prefetch_related('employees')
+        return Department.objects.all()
+
+    def get_serializer_context(self) -> dict:
+        context = super().get_serializer_context()
+        context['include_employees'] = self.include_employees()
+        context['columnar'] = self.is_columnar()
+        return context
+
+
+class DepartmentEmployeesAPIView(ColumnarFormatMixin, ListAPIView):
+    """
+    Постраничный список сотрудников подразделения (keyset-пагинация).
+
+    С ``?format=columnar`` страница отдаётся в колоночном формате.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = EmployeeSerializer
+    pagination_class = EmployeeKeysetPagination
 
     def get_queryset(self):
-        return Department.objects.prefetch_related('employees')
+        department_id = self.kwargs['pk']
+        if not Department.objects.filter(pk=department_id).exists():
+            raise Http404
+        return Employee.objects.filter(department_id=department_id)
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        if not self.is_columnar():
+            return super().list(request, *args, **kwargs)
+        queryset = self.get_queryset().values_list(*EMPLOYEE_COLUMNS, named=True)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(employee_columns(page))
+
+
+class DepartmentStatsAPIView(CachedDepartmentResponseMixin, RetrieveAPIView):
+    """Агрегаты по сотрудникам подразделения и его поддерева"""
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = DepartmentStatsSerializer
+    queryset = DepartmentStats.objects.all()
+    cache_namespace = 'department-stats'
+
+
+class DepartmentSubtreeAPIView(CachedDepartmentResponseMixin, RetrieveAPIView):
+    """
+    Всё поддерево подразделения за один запрос.
+
+    Параметры: ``depth`` - ограничение глубины относительно подразделения,
+    ``employees=1`` - включить сотрудников каждого узла.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = DepartmentSubtreeSerializer
+    queryset = Department.objects.all()
+    cache_namespace = 'department-tree'
+    cache_query_params = ('depth', 'employees')
+
+    def get_serializer_context(self) -> dict:
+        context = super().get_serializer_context()
+        depth = self.request.query_params.get('depth')
+        if depth is not None:
+            if not depth.isdigit():
+                raise ValidationError({'depth': 'Ожидается неотрицательное целое'})
+            depth = int(depth)
+        context['depth'] = depth
+        context['include_employees'] = self.request.query_params.get('employees') == '1'
+        return context
+
+
+class DepartmentAnalyticsAPIView(CachedDepartmentResponseMixin, RetrieveAPIView):
+    """
+    Численность, фонд оплаты, средняя и медианная зарплата, процентили
+    и распределение по стажу для каждого узла поддерева.
+
+    Для всего дерева достаточно передать корневое подразделение.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = DepartmentAnalyticsSerializer
+    queryset = Department.objects.all()
+    replica_reads = True
+    cache_namespace = 'department-analytics'
+
+    def get_cache_variant(self, request: Request) -> str:
+        # Стаж зависит от текущей даты
+        return f'as_of={date.today().isoformat()}'
+
+
+class EmployeeSearchAPIView(APIView):
+    """
+    Поиск сотрудников для автодополнения.
+
+    Параметры: ``q`` - строка поиска, ``root`` - ограничить поиск
+    поддеревом подразделения, ``limit`` - число результатов (до 100).
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request: Request) -> Response:
+        root = None
+        root_id = request.query_params.get('root')
+        if root_id:
+            if not root_id.isdigit():
+                raise ValidationError({'root': 'Ожидается id подразделения'})
+            root = Department.objects.filter(pk=root_id).first()
+            if root is None:
+                raise Http404
+        limit = request.query_params.get('limit', '20')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() else 20
+
+        results = search_employees(request.query_params.get('q', ''), root, limit)
+        return Response({'results': results})
+
+
+class DepartmentPathsAPIView(APIView):
+    """
+    Пути подразделений по материализованному пути.
+
+    ``ids=1,2,3`` - путь от корня (id и названия) для каждого из
+    подразделений; ``under=<id>`` - подразделение и все его потомки
+    в порядке обхода дерева, не больше ``limit``.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_ids = 1000
+    max_limit = 10000
+
+    def get(self, request: Request) -> Response:
+        if ids := request.query_params.get('ids'):
+            ids = ids.split(',')
+            if len(ids) > self.max_ids or not all(pk.isdigit() for pk in ids):
+                raise ValidationError(
+                    {'ids': f'Ожидается до {self.max_ids} id через запятую'}
+                )
+            paths = department_paths(Department.objects.filter(pk__in=ids).only('path'))
+            return Response({'results': paths})
+
+        under = request.query_params.get('under', '')
+        if not under.isdigit():
+            raise ValidationError({'under': 'Ожидается id подразделения'})
+        path = (
+            Department.objects.filter(pk=under).values_list('path', flat=True).first()
+        )
+        if path is None:
+            raise Http404
+        limit = request.query_params.get('limit', '1000')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() else 1000
+        rows = list(
+            Department.objects.under(path)
+            .order_by('tree_id', 'lft')
+            .values('id', 'parent_id', 'name', 'level', 'name_path')[: limit + 1]
+        )
+        return Response({'results': rows[:limit], 'truncated': len(rows) > limit})
+
+
+class LargestBranchesAPIView(APIView):
+    """
+    Крупнейшие подразделения по итогам поддерева из агрегатов.
+
+    Параметры: ``sort`` - headcount (по умолчанию) или payroll, ``root`` -
+    только потомки подразделения, ``level`` - только уровень дерева,
+    ``limit`` - до 100 (по умолчанию 20). У каждого подразделения - путь
+    от корня для перехода к нему в дереве.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request: Request) -> Response:
+        order = request.query_params.get('sort', 'headcount')
+        if order not in BRANCH_ORDERINGS:
+            raise ValidationError(
+                {'sort': f'Ожидается одно из: {", ".join(BRANCH_ORDERINGS)}'}
+            )
+        params = {}
+        for name in ('root', 'level', 'limit'):
+            value = request.query_params.get(name)
+            if value is not None:
+                if not value.isdigit():
+                    raise ValidationError({name: 'Ожидается неотрицательное целое'})
+                params[name] = int(value)
+        root = None
+        if 'root' in params:
+            root = Department.objects.filter(pk=params['root']).first()
+            if root is None:
+                raise Http404
+
+        limit = max(min(params.get('limit', 20), self.max_limit), 1)
+        branches = largest_branches(order, limit, root, params.get('level'))
+        context = {'paths': department_paths(branches)}
+        return Response(
+            {'results': BranchSerializer(branches, many=True, context=context).data}
+        )
+
+
+class DepartmentReorganizationAPIView(APIView):
+    """
+    Пакетное перемещение и переименование подразделений.
+
+    Тело: ``{"changes": [{"id": 1, "parent": 2, "name": "..."}],
+    "dry_run": false}``. ``parent: null`` делает подразделение корнем.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request: Request) -> Response:
+        changes = request.data.get('changes')
+        if not isinstance(changes, list) or not changes:
+            raise ValidationError({'changes': 'Ожидается непустой список изменений'})
+        try:
+            result = reorganize(
+                [DepartmentChange.from_dict(item) for item in changes],
+                dry_run=request.data.get('dry_run') is True,
+            )
+        except ReorganizationError as error:
+            raise ValidationError({'changes': str(error)}) from error
+        return Response(
+            {
+                'moved': result.moved,
+                'renamed': result.renamed,
+                'updated': result.updated,
+                'tree_ids': result.tree_ids,
+            }
+        )
+
+
+class CacheStatsAPIView(APIView):
+    """Счётчики кэша API текущего процесса (для мониторинга)"""
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: Request) -> Response:
+        return Response(counters.snapshot())
+
+
+class ChangeFeedAPIView(APIView):
+    """
+    Журнал изменений подразделений и сотрудников (staff.changelog).
+
+    Параметры: ``since`` - номер последнего обработанного изменения
+    (0 - с начала), ``limit`` - размер пачки (до 10000). В ответе
+    ``next`` - значение ``since`` для следующего запроса, ``more`` - в
+    журнале есть ещё записи. Если журнал очищался после ``since``,
+    ответ 410 с номером очистки ``reset``: после полной синхронизации
+    чтение продолжается с него.
+    """
+
+    # Basic - для сервисных учётных записей потребителей
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAdminUser]
+    max_limit = 10000
+
+    def get(self, request: Request) -> Response:
+        since = request.query_params.get('since', '')
+        if not since.isdigit():
+            raise ValidationError({'since': 'Ожидается номер изменения'})
+        limit = request.query_params.get('limit', '1000')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() else 1000
+        since = int(since)
+
+        try:
+            changes, more = changes_since(since, max(limit, 1))
+        except ChangesResetError as reset:
+            return Response(
+                {'detail': str(reset), 'reset': reset.reset},
+                status=status.HTTP_410_GONE,
+            )
+        return Response(
+            {
+                'changes': changes,
+                'next': changes[-1]['sequence'] if changes else since,
+                'more': more,
+            }
+        )
+
+
+def _archive_for(request: Request, param: str) -> Archive:
+    """Срез на дату из параметра ``param`` (YYYY-MM-DD)"""
+
+    try:
+        day = date.fromisoformat(request.query_params.get(param, ''))
+    except ValueError:
+        raise ValidationError({param: 'Ожидается дата YYYY-MM-DD'}) from None
+    path = archive_for(day)
+    if path is None:
+        raise Http404(f'Нет среза структуры на {day.isoformat()}')
+    return Archive(path)
+
+
+class ArchiveListAPIView(APIView):
+    """
+    Срезы структуры в архиве (staff.archive). Повреждённый файл не прерывает
+    список: он возвращается с именем, размером и ключом ``error``.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: Request) -> Response:
+        archives = []
+        for path in list_archives():
+            entry = {'name': path.name, 'size': path.stat().st_size}
+            try:
+                with Archive(path) as archive:
+                    entry |= archive.meta
+            except ArchiveError:
+                entry['error'] = 'Файл повреждён или не является срезом структуры'
+            archives.append(entry)
+        return Response(archives)
+
+
+class ArchiveTreeAPIView(APIView):
+    """
+    Дерево подразделений из среза на дату ``date`` - последнего сделанного
+    не позже конца этого дня. ``root`` - только поддерево подразделения,
+    ``depth`` - ограничение глубины. У узлов - численность и ФОТ поддерева.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: Request) -> Response:
+        params = {}
+        for name in ('root', 'depth'):
+            value = request.query_params.get(name)
+            if value is not None:
+                if not value.isdigit():
+                    raise ValidationError({name: 'Ожидается неотрицательное целое'})
+                params[name] = int(value)
+        with _archive_for(request, 'date') as archive:
+            try:
+                roots = archive.tree(**params)
+            except LookupError:
+                raise Http404('Подразделения нет в срезе') from None
+            return Response({'taken_at': archive.meta['taken_at'], 'roots': roots})
+
+
+class ArchiveDiffAPIView(APIView):
+    """
+    Различия срезов на даты ``from`` и ``to``: подразделения (созданные,
+    удалённые, перемещённые, переименованные), принятые, уволенные и
+    переведённые сотрудники (не больше ``limit`` в каждом списке, по
+    умолчанию 100) и изменение численности и ФОТ по подразделениям.
+    """
+
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_limit = 10000
+
+    def get(self, request: Request) -> Response:
+        limit = request.query_params.get('limit', '100')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() else 100
+        with (
+            _archive_for(request, 'from') as old,
+            _archive_for(request, 'to') as new,
+        ):
+            return Response(diff(old, new).as_dict(limit))
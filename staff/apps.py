@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class StaffConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'staff'
+
+    def ready(self) -> None:
+        from django.db import connections
+
+        from . import checks, signals  # noqa: F401
+        from .instrumentation import install_query_recorder
+
+        # Соединения, открытые до загрузки приложения; новые
+        # подключаются обработчиком connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
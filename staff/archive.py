@@ -0,0 +1,608 @@
+"""
+Архив структуры: срезы дерева подразделений и назначений сотрудников
+на момент времени в сжатых файлах.
+
+Срез - один файл в ``STAFF_ARCHIVE_DIR``: заголовок с оглавлением и
+столбцы, каждый сжат отдельно (zlib). Файл отображается в память
+(mmap) и распаковываются только нужные столбцы: дерево строится по
+столбцам подразделений, сравнение сотрудников - по столбцам id и
+подразделения. Значения хранятся в типизированных массивах (array),
+а не в объектах Python на строку.
+
+Формат: ``MAGIC``, длина заголовка (uint32 LE), заголовок JSON, блоки
+столбцов. Числа - little-endian, зарплаты - в копейках, даты - порядковый
+номер дня, строки - конкатенация UTF-8 и массив концов строк. id
+сотрудников идут по возрастанию и хранятся разностями.
+"""
+
+import json
+import mmap
+import os
+import sys
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import ExitStack
+from dataclasses import dataclass
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from heapq import merge
+from itertools import accumulate, count
+from operator import itemgetter
+from pathlib import Path
+from typing import Self
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Department, Employee
+from .sharding import tree_databases
+
+MAGIC = b'STFARC01'
+SUFFIX = '.stfa'
+NAME_FORMAT = 'structure-%Y%m%dT%H%M%SZ'
+CHUNK_SIZE = 10000
+
+_LENGTH = 4
+_SWAP = sys.byteorder != 'little'
+
+
+class ArchiveError(Exception):
+    """Файл не является срезом структуры или повреждён"""
+
+
+def _kopecks(salary: Decimal) -> int:
+    return int(salary.scaleb(2))
+
+
+def _money(kopecks: int) -> str:
+    return str(Decimal(kopecks).scaleb(-2))
+
+
+class _StringColumn:
+    """Строковый столбец: строка декодируется только при обращении"""
+
+    def __init__(
+        self, data: bytearray | memoryview | None = None, ends: array | None = None
+    ) -> None:
+        self.data = bytearray() if data is None else data
+        self.ends = array('q') if ends is None else ends
+
+    def append(self, value: str) -> None:
+        self.data += value.encode()
+        self.ends.append(len(self.data))
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, index: int) -> str:
+        start = self.ends[index - 1] if index else 0
+        return str(self.data[start : self.ends[index]], 'utf-8')
+
+
+class _Dictionary:
+    """Столбец с небольшим числом различных значений: коды и словарь"""
+
+    def __init__(self) -> None:
+        self.codes = array('i')
+        self.values = _StringColumn()
+        self._index: dict[str, int] = {}
+
+    def append(self, value: str) -> None:
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+
+def archive_dir() -> Path:
+    return Path(settings.STAFF_ARCHIVE_DIR)
+
+
+def _name_key(path: Path) -> tuple[datetime, int]:
+    """
+    Время и номер среза по имени файла. Срезы, сделанные в ту же секунду,
+    получают номер после ``_``: ``structure-20260101T090000Z_1.stfa``.
+    """
+
+    moment, _, number = path.stem.partition('_')
+    return datetime.strptime(moment, NAME_FORMAT).replace(tzinfo=UTC), int(number or 0)
+
+
+def taken_at(path: Path) -> datetime:
+    """Время среза по имени файла"""
+
+    return _name_key(path)[0]
+
+
+def list_archives() -> list[Path]:
+    """Срезы по возрастанию времени; файлы с чужими именами пропускаются"""
+
+    directory = archive_dir()
+    if not directory.is_dir():
+        return []
+    keys = {}
+    for path in directory.glob(f'structure-*{SUFFIX}'):
+        try:
+            keys[path] = _name_key(path)
+        except ValueError:
+            continue
+    return sorted(keys, key=keys.__getitem__)
+
+
+def archive_for(day: date) -> Path | None:
+    """Последний срез, сделанный не позже конца дня ``day`` (местное время)"""
+
+    found = None
+    for path in list_archives():
+        if timezone.localtime(taken_at(path)).date() > day:
+            break
+        found = path
+    return found
+
+
+def _department_rows(using: str) -> Iterator[tuple]:
+    yield from (
+        Department.objects.using(using)
+        .order_by('tree_id', 'lft')
+        .values_list('id', 'parent_id', 'name', 'tree_id', 'lft', 'rght', 'level')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def _employee_rows(using: str) -> Iterator[tuple]:
+    """Сотрудники базы по возрастанию id, пачками по ключу"""
+
+    employees = (
+        Employee.objects.using(using)
+        .order_by('id')
+        .values_list(
+            'id', 'department_id', 'full_name', 'position', 'salary', 'hire_date'
+        )
+    )
+    last_id = 0
+    while chunk := list(employees.filter(id__gt=last_id)[:CHUNK_SIZE]):
+        yield from chunk
+        last_id = chunk[-1][0]
+
+
+def capture(directory: Path | None = None) -> Path:
+    """
+    Срез текущей структуры, возвращает путь к файлу.
+
+    Каждая база читается в своей транзакции: в MariaDB (REPEATABLE READ)
+    все чтения транзакции видят одно состояние базы. Сотрудники баз
+    филиалов сливаются по id, агрегаты подразделений считаются по
+    прочитанным сотрудникам.
+    """
+
+    moment = timezone.now().replace(microsecond=0)
+    departments = {
+        'id': array('q'),
+        'parent_id': array('q'),  # 0 у корня
+        'tree_id': array('q'),
+        'lft': array('q'),
+        'rght': array('q'),
+        'level': array('i'),
+        'name': _StringColumn(),
+    }
+    employees = {
+        'id': array('q'),
+        'department_id': array('q'),
+        'salary': array('q'),
+        'hire_date': array('i'),
+        'full_name': _StringColumn(),
+        'position': _Dictionary(),
+    }
+
+    with ExitStack() as stack:
+        aliases = tree_databases()
+        for alias in aliases:
+            stack.enter_context(transaction.atomic(using=alias))
+        for alias in aliases:
+            for pk, parent_id, name, tree_id, lft, rght, level in _department_rows(
+                alias
+            ):
+                departments['id'].append(pk)
+                departments['parent_id'].append(parent_id or 0)
+                departments['name'].append(name)
+                departments['tree_id'].append(tree_id)
+                departments['lft'].append(lft)
+                departments['rght'].append(rght)
+                departments['level'].append(level)
+        positions = {pk: number for number, pk in enumerate(departments['id'])}
+        direct_count = array('q', [0]) * len(positions)
+        direct_payroll = array('q', [0]) * len(positions)
+        rows = merge(*map(_employee_rows, aliases), key=itemgetter(0))
+        for pk, department_id, full_name, position, salary, hire_date in rows:
+            kopecks = _kopecks(salary)
+            employees['id'].append(pk)
+            employees['department_id'].append(department_id)
+            employees['salary'].append(kopecks)
+            employees['hire_date'].append(hire_date.toordinal())
+            employees['full_name'].append(full_name)
+            employees['position'].append(position)
+            number = positions[department_id]
+            direct_count[number] += 1
+            direct_payroll[number] += kopecks
+
+    # Агрегаты поддерева: в порядке (tree_id, lft) потомки идут после
+    # родителя, обратный проход накапливает суммы снизу вверх
+    headcount, payroll = array('q', direct_count), array('q', direct_payroll)
+    for number in range(len(positions) - 1, -1, -1):
+        parent_id = departments['parent_id'][number]
+        if parent_id:
+            headcount[positions[parent_id]] += headcount[number]
+            payroll[positions[parent_id]] += payroll[number]
+
+    columns = {f'department.{name}': column for name, column in departments.items()}
+    columns |= {
+        'department.direct_headcount': direct_count,
+        'department.direct_payroll': direct_payroll,
+        'department.headcount': headcount,
+        'department.payroll': payroll,
+    }
+    columns |= {f'employee.{name}': column for name, column in employees.items()}
+
+    directory = directory or archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    return _write(
+        directory / moment.astimezone(UTC).strftime(NAME_FORMAT),
+        columns,
+        {
+            'taken_at': moment.isoformat(),
+            'departments': len(positions),
+            'employees': len(employees['id']),
+        },
+    )
+
+
+def _blocks(
+    name: str, column: array | _StringColumn | _Dictionary
+) -> Iterator[tuple[str, array, bool]]:
+    """Массивы столбца для записи: (имя блока, массив, хранить разности)"""
+
+    if isinstance(column, _Dictionary):
+        yield name, column.codes, False
+        yield from _blocks(f'{name}:values', column.values)
+    elif isinstance(column, _StringColumn):
+        yield name, array('B', column.data), False
+        yield f'{name}:ends', column.ends, True
+    else:
+        yield name, column, name == 'employee.id'
+
+
+def _write(base: Path, columns: dict, meta: dict) -> Path:
+    """
+    Запись во временный файл и атомарное создание среза под свободным
+    именем: существующий срез той же секунды не перезаписывается.
+    """
+
+    blocks, directory, offset = [], {}, 0
+    for name, column in columns.items():
+        for block, values, delta in _blocks(name, column):
+            if delta and values:
+                values = array(values.typecode, [values[0]]) + array(
+                    values.typecode, map(int.__sub__, values[1:], values)
+                )
+            if _SWAP:
+                values = array(values.typecode, values)
+                values.byteswap()
+            data = zlib.compress(values.tobytes())
+            directory[block] = {
+                'type': values.typecode,
+                'offset': offset,
+                'size': len(data),
+                'length': len(values),
+                'delta': delta,
+            }
+            blocks.append(data)
+            offset += len(data)
+
+    header = json.dumps({**meta, 'columns': directory}).encode()
+    descriptor, temporary = tempfile.mkstemp(dir=base.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(MAGIC)
+            file.write(len(header).to_bytes(_LENGTH, 'little'))
+            file.write(header)
+            for data in blocks:
+                file.write(data)
+        for number in count():
+            name = f'{base.name}_{number}' if number else base.name
+            path = base.with_name(f'{name}{SUFFIX}')
+            try:
+                # link, в отличие от replace, не заменяет существующий файл
+                os.link(temporary, path)
+            except FileExistsError:
+                continue
+            return path
+    finally:
+        os.unlink(temporary)
+
+
+class Archive:
+    """
+    Срез, открытый для чтения.
+
+    Столбцы распаковываются при первом обращении и кэшируются в объекте;
+    файл закрывается через ``close()`` или контекстный менеджер.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._cache: dict[str, array] = {}
+        with open(path, 'rb') as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ArchiveError(f'{path}: пустой файл') from None
+        self._view = memoryview(self._map)
+        start = len(MAGIC) + _LENGTH
+        try:
+            if self._view[: len(MAGIC)] != MAGIC:
+                raise ValueError
+            length = int.from_bytes(self._view[len(MAGIC) : start], 'little')
+            header = json.loads(bytes(self._view[start : start + length]))
+            self._columns = header.pop('columns')
+        except (ValueError, KeyError):
+            self.close()
+            raise ArchiveError(f'{path}: не срез структуры') from None
+        self._data = start + length
+        self.meta = header
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._cache.clear()
+        self._view.release()
+        self._map.close()
+
+    @property
+    def taken_at(self) -> datetime:
+        return datetime.fromisoformat(self.meta['taken_at'])
+
+    def column(self, name: str) -> array:
+        if name not in self._cache:
+            try:
+                spec = self._columns[name]
+            except KeyError:
+                raise ArchiveError(f'{self.path}: нет столбца {name}') from None
+            start = self._data + spec['offset']
+            values = array(spec['type'])
+            values.frombytes(zlib.decompress(self._view[start : start + spec['size']]))
+            if _SWAP:
+                values.byteswap()
+            if spec['delta']:
+                values = array(spec['type'], accumulate(values))
+            if len(values) != spec['length']:
+                raise ArchiveError(f'{self.path}: повреждён столбец {name}')
+            self._cache[name] = values
+        return self._cache[name]
+
+    def strings(self, name: str) -> _StringColumn:
+        # Строки читаются из распакованного массива без копирования
+        return _StringColumn(memoryview(self.column(name)), self.column(f'{name}:ends'))
+
+    def dictionary(self, name: str) -> _Dictionary:
+        column = _Dictionary()
+        column.codes = self.column(name)
+        column.values = self.strings(f'{name}:values')
+        return column
+
+    def department_positions(self) -> dict[int, int]:
+        return {pk: number for number, pk in enumerate(self.column('department.id'))}
+
+    def tree(self, root: int | None = None, depth: int | None = None) -> list[dict]:
+        """
+        Корни (или подразделение ``root``) с поддеревьями, как
+        build_subtree, с численностью и ФОТ поддерева.
+
+        Поддерево в порядке (tree_id, lft) - непрерывный отрезок массивов
+        длиной (rght - lft + 1) / 2.
+        """
+
+        ids = self.column('department.id')
+        lft, rght = self.column('department.lft'), self.column('department.rght')
+        level = self.column('department.level')
+        parents = self.column('department.parent_id')
+        headcount = self.column('department.headcount')
+        payroll = self.column('department.payroll')
+        names = self.strings('department.name')
+
+        if root is None:
+            start, stop, top = 0, len(ids), 0
+        else:
+            try:
+                start = self.department_positions()[root]
+            except KeyError:
+                raise LookupError(root) from None
+            stop = start + (rght[start] - lft[start] + 1) // 2
+            top = level[start]
+
+        nodes, roots = {}, []
+        for number in range(start, stop):
+            if depth is not None and level[number] > top + depth:
+                continue
+            node = {
+                'id': ids[number],
+                'name': names[number],
+                'has_children': rght[number] - lft[number] > 1,
+                'headcount': headcount[number],
+                'payroll': _money(payroll[number]),
+            }
+            if depth is None or level[number] < top + depth:
+                node['children'] = []
+            nodes[ids[number]] = node
+            if level[number] == top:
+                roots.append(node)
+            else:
+                nodes[parents[number]]['children'].append(node)
+        return roots
+
+
+@dataclass
+class ArchiveDiff:
+    """
+    Различия двух срезов.
+
+    Сотрудники - позиции в массивах срезов: принятые и переведённые - в
+    новом срезе, уволенные - в старом.
+    """
+
+    old: Archive
+    new: Archive
+    hires: array
+    leavers: array
+    moves: array
+
+    def _employee(self, archive: Archive, number: int) -> dict:
+        return {
+            'id': archive.column('employee.id')[number],
+            'full_name': archive.strings('employee.full_name')[number],
+            'position': archive.dictionary('employee.position')[number],
+            'department_id': archive.column('employee.department_id')[number],
+        }
+
+    def departments(self) -> dict[str, list[dict]]:
+        old, new = self.old.department_positions(), self.new.department_positions()
+        old_parents = self.old.column('department.parent_id')
+        new_parents = self.new.column('department.parent_id')
+        old_names = self.old.strings('department.name')
+        new_names = self.new.strings('department.name')
+        changes = {'created': [], 'removed': [], 'moved': [], 'renamed': []}
+        for pk, number in new.items():
+            parent_id = new_parents[number] or None
+            if pk not in old:
+                changes['created'].append(
+                    {'id': pk, 'name': new_names[number], 'parent_id': parent_id}
+                )
+                continue
+            was = old[pk]
+            if old_parents[was] != new_parents[number]:
+                changes['moved'].append(
+                    {
+                        'id': pk,
+                        'name': new_names[number],
+                        'from': old_parents[was] or None,
+                        'to': parent_id,
+                    }
+                )
+            if old_names[was] != new_names[number]:
+                changes['renamed'].append(
+                    {'id': pk, 'from': old_names[was], 'to': new_names[number]}
+                )
+        for pk, number in old.items():
+            if pk not in new:
+                changes['removed'].append({'id': pk, 'name': old_names[number]})
+        return changes
+
+    def payroll(self) -> list[dict]:
+        """Подразделения, у которых изменились численность или ФОТ поддерева"""
+
+        old, new = self.old.department_positions(), self.new.department_positions()
+        old_count = self.old.column('department.headcount')
+        new_count = self.new.column('department.headcount')
+        old_payroll = self.old.column('department.payroll')
+        new_payroll = self.new.column('department.payroll')
+        old_names = self.old.strings('department.name')
+        new_names = self.new.strings('department.name')
+        changes = []
+        for pk in dict.fromkeys([*new, *old]):
+            before = (old_count[old[pk]], old_payroll[old[pk]]) if pk in old else (0, 0)
+            after = (new_count[new[pk]], new_payroll[new[pk]]) if pk in new else (0, 0)
+            if before == after:
+                continue
+            changes.append(
+                {
+                    'id': pk,
+                    'name': new_names[new[pk]] if pk in new else old_names[old[pk]],
+                    'headcount': [before[0], after[0]],
+                    'payroll': [_money(before[1]), _money(after[1])],
+                    'delta': _money(after[1] - before[1]),
+                }
+            )
+        return changes
+
+    def as_dict(self, limit: int | None = None) -> dict:
+        """Сводка; списки сотрудников - не больше ``limit`` записей"""
+
+        old_departments = self.old.column('employee.department_id')
+        ids = self.old.column('employee.id')
+        new_ids = self.new.column('employee.id')
+        moves = []
+        for number in self.moves[:limit]:
+            moved = self._employee(self.new, number)
+            # Позиция в старом срезе - по id, массив упорядочен
+            was = bisect_left(ids, new_ids[number])
+            moves.append({**moved, 'moved_from': old_departments[was]})
+        return {
+            'from': self.old.meta['taken_at'],
+            'to': self.new.meta['taken_at'],
+            'departments': self.departments(),
+            'hires': {
+                'count': len(self.hires),
+                'items': [self._employee(self.new, n) for n in self.hires[:limit]],
+            },
+            'leavers': {
+                'count': len(self.leavers),
+                'items': [self._employee(self.old, n) for n in self.leavers[:limit]],
+            },
+            'moves': {'count': len(self.moves), 'items': moves},
+            'payroll': self.payroll(),
+        }
+
+
+def diff(old: Archive, new: Archive) -> ArchiveDiff:
+    """
+    Сравнение срезов одним проходом слиянием упорядоченных id.
+
+    Читаются только столбцы id и подразделений сотрудников; если состав
+    сотрудников не менялся, сравнение массивов выполняется целиком в C.
+    """
+
+    old_ids, new_ids = old.column('employee.id'), new.column('employee.id')
+    old_departments = old.column('employee.department_id')
+    new_departments = new.column('employee.department_id')
+    hires, leavers, moves = array('q'), array('q'), array('q')
+
+    if old_ids == new_ids:
+        if old_departments != new_departments:
+            moves.extend(
+                number
+                for number, (was, now) in enumerate(
+                    zip(old_departments, new_departments, strict=True)
+                )
+                if was != now
+            )
+        return ArchiveDiff(old, new, hires, leavers, moves)
+
+    i = j = 0
+    old_count, new_count = len(old_ids), len(new_ids)
+    while i < old_count and j < new_count:
+        was, now = old_ids[i], new_ids[j]
+        if was == now:
+            if old_departments[i] != new_departments[j]:
+                moves.append(j)
+            i += 1
+            j += 1
+        elif was < now:
+            leavers.append(i)
+            i += 1
+        else:
+            hires.append(j)
+            j += 1
+    leavers.extend(range(i, old_count))
+    hires.extend(range(j, new_count))
+    return ArchiveDiff(old, new, hires, leavers, moves)
@@ -0,0 +1,149 @@
+"""
+Асинхронные варианты API подразделений для развёртывания под ASGI.
+
+DRF не поддерживает async-представления, поэтому здесь обычные
+представления Django поверх асинхронного ORM: один ASGI-воркер
+обслуживает много одновременных раскрытий узлов, не занимая поток на
+каждый запрос. Формат ответов, кэш и ETag общие с синхронными
+представлениями из staff.api.
+"""
+
+from collections.abc import Callable
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified, JsonResponse
+
+from rest_framework.exceptions import MethodNotAllowed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+
+from asgiref.sync import sync_to_async
+
+from .cache import (
+    aresponse_key,
+    cache_headers,
+    cache_variant,
+    counters,
+    etag_for,
+    fresh_reads,
+    get_cache,
+)
+from .columnar import EMPLOYEE_COLUMNS, ColumnarJSONRenderer, employee_columns
+from .models import Department, Employee
+from .pagination import EmployeeKeysetPagination
+from .replicas import replica_reads
+from .serializers import DepartmentSerializer, EmployeeSerializer, department_children
+from .snapshot import snapshot_children
+
+JSON_PARAMS = {'ensure_ascii': False}
+
+
+def _error(status: int, detail: object) -> JsonResponse:
+    return JsonResponse(
+        {'detail': str(detail)}, status=status, json_dumps_params=JSON_PARAMS
+    )
+
+
+async def _is_authenticated(request: HttpRequest) -> bool:
+    # request.auser() появился только в Django 5.0
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+def async_api_view(view: Callable) -> Callable:
+    """GET-представление с той же проверкой доступа, что и в staff.api"""
+
+    @wraps(view)
+    async def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if request.method != 'GET':
+            detail = MethodNotAllowed.default_detail.format(method=request.method)
+            return _error(405, detail)
+        if not await _is_authenticated(request):
+            return _error(403, NotAuthenticated.default_detail)
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _is_columnar(request: HttpRequest) -> bool:
+    return request.GET.get('format') == ColumnarJSONRenderer.format
+
+
+async def _department_details(
+    department: Department, include_employees: bool, columnar: bool
+) -> dict:
+    children = [child async for child in department_children(department)]
+    data = {'children': DepartmentSerializer(children, many=True).data}
+    if include_employees and columnar:
+        rows = department.employees.values_list(*EMPLOYEE_COLUMNS)
+        data['employees'] = employee_columns([row async for row in rows])
+    elif include_employees:
+        employees = [employee async for employee in department.employees.all()]
+        data['employees'] = EmployeeSerializer(employees, many=True).data
+    return data
+
+
+@replica_reads
+@async_api_view
+async def department_data(request: HttpRequest, pk: int) -> HttpResponse:
+    """Асинхронный вариант DepartmentDataAPIView"""
+
+    namespace = 'department-data'
+    variant = cache_variant(request.GET, ('employees', 'format'))
+    key = await aresponse_key(namespace, pk, variant)
+    etag = etag_for(key)
+    headers = cache_headers(etag)
+
+    if etag in request.headers.get('If-None-Match', ''):
+        counters.increment(namespace, 'not_modified')
+        return HttpResponseNotModified(headers=headers)
+
+    cache = get_cache()
+    data = await cache.aget(key)
+    if data is None:
+        counters.increment(namespace, 'miss')
+        include_employees = request.GET.get('employees') != '0'
+        children = None
+        if not include_employees:
+            children = await sync_to_async(snapshot_children)(pk)
+        if children is not None:
+            data = {'children': children}
+        else:
+            with await sync_to_async(fresh_reads)(pk):
+                department = await Department.objects.filter(pk=pk).afirst()
+                if department is None:
+                    return _error(404, NotFound.default_detail)
+                data = await _department_details(
+                    department,
+                    include_employees=include_employees,
+                    columnar=_is_columnar(request),
+                )
+        await cache.aset(key, data, timeout=settings.STAFF_CACHE_TIMEOUT)
+    else:
+        counters.increment(namespace, 'hit')
+    return JsonResponse(data, headers=headers, json_dumps_params=JSON_PARAMS)
+
+
+@async_api_view
+async def department_employees(request: HttpRequest, pk: int) -> HttpResponse:
+    """Асинхронный вариант DepartmentEmployeesAPIView"""
+
+    if not await Department.objects.filter(pk=pk).aexists():
+        return _error(404, NotFound.default_detail)
+
+    queryset = Employee.objects.filter(department_id=pk)
+    if _is_columnar(request):
+        queryset = queryset.values_list(*EMPLOYEE_COLUMNS, named=True)
+    paginator = EmployeeKeysetPagination()
+    try:
+        page = await paginator.apaginate_queryset(queryset, Request(request))
+    except NotFound as error:
+        return _error(404, error.detail)
+
+    if _is_columnar(request):
+        results = employee_columns(page)
+    else:
+        results = EmployeeSerializer(page, many=True).data
+    return JsonResponse(
+        {'next': paginator.get_next_link(), 'results': results},
+        json_dumps_params=JSON_PARAMS,
+    )
@@ -0,0 +1,252 @@
+"""
+Кэш ответов API подразделений.
+
+Ключ ответа включает версию формата, общее поколение кэша и поколение
+конкретного подразделения. Инвалидация не удаляет записи, а сдвигает
+поколения подразделения и его предков: старые ключи становятся
+недостижимыми и вытесняются бэкендом. Поколение же служит ETag.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from contextlib import AbstractContextManager, nullcontext
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.utils.http import urlencode
+
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from asgiref.sync import sync_to_async
+
+from .models import Department
+from .replicas import primary_reads, replicas_enabled
+
+# Увеличивается при любом изменении формата кэшируемых ответов
+SERIALIZER_VERSION = 2
+
+GLOBAL_GENERATION_KEY = 'staff:gen:all'
+# Состав, названия и перемещения подразделений (снимок дерева, staff.snapshot)
+TREE_GENERATION_KEY = 'staff:gen:tree'
+
+
+class CacheCounters:
+    """Счётчики попаданий и промахов в пределах процесса"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def increment(self, namespace: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[namespace, outcome] += 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            result = {}
+            for (namespace, outcome), value in self._counts.items():
+                result.setdefault(namespace, {})[outcome] = value
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+counters = CacheCounters()
+
+
+def get_cache() -> BaseCache:
+    return caches[settings.STAFF_CACHE_ALIAS]
+
+
+def _generation_key(department_id: int) -> str:
+    return f'staff:gen:{department_id}'
+
+
+def _new_generation() -> int:
+    # Значение по времени не повторяет поколения, вытесненные из кэша
+    return time.time_ns()
+
+
+def _get_generations(keys: list[str]) -> list[int]:
+    cache = get_cache()
+    values = cache.get_many(keys)
+    missing = {name: _new_generation() for name in keys if name not in values}
+    for name, value in missing.items():
+        # add() не перезапишет значение, успевшее появиться параллельно
+        cache.add(name, value, timeout=None)
+    if missing:
+        values = cache.get_many(keys)
+    return [values.get(name, 0) for name in keys]
+
+
+def _generations(department_id: int) -> tuple[int, int]:
+    global_generation, generation = _get_generations(
+        [GLOBAL_GENERATION_KEY, _generation_key(department_id)]
+    )
+    return global_generation, generation
+
+
+def last_change(department_id: int | None = None) -> int:
+    """
+    Время (нс) последней инвалидации ответов подразделения
+    ``department_id``, без него - структуры дерева (см. invalidate_tree).
+    """
+
+    if department_id is not None:
+        return max(_generations(department_id))
+    return max(_get_generations([GLOBAL_GENERATION_KEY, TREE_GENERATION_KEY]))
+
+
+def departments_last_change(department_ids: Iterable[int]) -> int:
+    """Время (нс) последней инвалидации ответов любого из подразделений"""
+
+    return max(
+        _get_generations([GLOBAL_GENERATION_KEY, *map(_generation_key, department_ids)])
+    )
+
+
+def response_key(namespace: str, department_id: int, variant: str = '') -> str:
+    global_generation, generation = _generations(department_id)
+    return (
+        f'staff:{namespace}:v{SERIALIZER_VERSION}:{global_generation}:'
+        f'{department_id}:{generation}:{variant}'
+    )
+
+
+async def aresponse_key(namespace: str, department_id: int, variant: str = '') -> str:
+    return await sync_to_async(response_key)(namespace, department_id, variant)
+
+
+def fresh_reads(department_id: int) -> AbstractContextManager:
+    """
+    Чтения для ответа, который будет закэширован.
+
+    Пока реплики могут не догнать последнюю инвалидацию подразделения,
+    ответ строится по default: иначе под новым поколением закэшируются
+    данные, ещё не дошедшие до реплики.
+    """
+
+    if not replicas_enabled():
+        return nullcontext()
+    age = time.time_ns() - max(_generations(department_id))
+    if age < settings.STAFF_REPLICA_LAG_SECONDS * 10**9:
+        return primary_reads()
+    return nullcontext()
+
+
+def cache_variant(query_params: Mapping[str, str], names: Iterable[str]) -> str:
+    """Часть ключа из параметров запроса, влияющих на содержимое ответа"""
+
+    return urlencode(
+        sorted((name, query_params[name]) for name in names if name in query_params)
+    )
+
+
+def etag_for(key: str) -> str:
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+
+def _bump(department_ids: Iterable[int]) -> None:
+    generation = _new_generation()
+    get_cache().set_many(
+        {_generation_key(pk): generation for pk in department_ids}, timeout=None
+    )
+
+
+def invalidate_departments(department_ids: Iterable[int]) -> None:
+    """
+    Инвалидация ответов указанных подразделений.
+
+    Поколения сдвигаются сразу и ещё раз после фиксации транзакции:
+    иначе параллельный запрос может успеть закэшировать старые данные
+    под новым поколением.
+    """
+
+    department_ids = set(department_ids)
+    if not department_ids:
+        return
+    _bump(department_ids)
+    transaction.on_commit(lambda: _bump(department_ids))
+
+
+def _bump_tree() -> None:
+    get_cache().set(TREE_GENERATION_KEY, _new_generation(), timeout=None)
+
+
+def invalidate_tree() -> None:
+    """Изменилась структура дерева: сейчас и ещё раз после фиксации"""
+
+    _bump_tree()
+    transaction.on_commit(_bump_tree)
+
+
+def invalidate_department_chain(department_id: int | None) -> None:
+    """Инвалидация подразделения и всех его предков"""
+
+    if department_id is None:
+        return
+    department = Department.objects.filter(pk=department_id).first()
+    if department is None:
+        return
+    invalidate_departments(
+        department.get_ancestors(include_self=True).values_list('pk', flat=True)
+    )
+
+
+def invalidate_all() -> None:
+    """Сброс всего кэша API, например после массовой загрузки данных"""
+
+    get_cache().set(GLOBAL_GENERATION_KEY, _new_generation(), timeout=None)
+
+
+class CachedDepartmentResponseMixin:
+    """
+    Кэширование ответа retrieve() для подразделения из URL.
+
+    В ключ попадают только параметры ``cache_query_params``, влияющие
+    на содержимое ответа. Поддерживается ``If-None-Match``: при
+    совпадении ETag ответ 304 отдаётся без обращения к базе.
+    """
+
+    cache_namespace = ''
+    cache_query_params = ()
+
+    def get_cache_variant(self, request: Request) -> str:
+        return cache_variant(request.query_params, self.cache_query_params)
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        key = response_key(
+            self.cache_namespace, self.kwargs['pk'], self.get_cache_variant(request)
+        )
+        etag = etag_for(key)
+        headers = cache_headers(etag)
+
+        if etag in request.headers.get('If-None-Match', ''):
+            counters.increment(self.cache_namespace, 'not_modified')
+            return Response(status=304, headers=headers)
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            counters.increment(self.cache_namespace, 'miss')
+            with fresh_reads(self.kwargs['pk']):
+                response = super().retrieve(request, *args, **kwargs)
+            cache.set(key, response.data, timeout=settings.STAFF_CACHE_TIMEOUT)
+        else:
+            counters.increment(self.cache_namespace, 'hit')
+            response = Response(data)
+
+        for name, value in headers.items():
+            response[name] = value
+        return response
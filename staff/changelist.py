@@ -0,0 +1,193 @@
+"""
+Список сотрудников в админке для таблицы в миллионы строк.
+
+Стандартный ChangeList на каждой странице считает COUNT(*) по таблице
+и листает через OFFSET, а TreeRelatedFieldListFilter строит варианты
+через IN по всем подразделениям. Здесь:
+
+- без фильтров и поиска число строк берётся из статистики таблицы
+  (оценка, показывается с «≈»), с фильтрами считается точно;
+- ссылка «Дальше» выбирает следующую страницу по ключу (full_name, id)
+  последней строки, как EmployeeKeysetPagination в API; номера страниц
+  показываются только до ``STAFF_ADMIN_MAX_OFFSET`` строк;
+- фильтр по подразделению - одно условие по диапазону lft/rght
+  подразделения в JOIN, варианты фильтра - один запрос.
+"""
+
+from django.conf import settings
+from django.contrib.admin import ModelAdmin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Field, Model, QuerySet
+from django.http import HttpRequest
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language_bidi
+
+from mptt.admin import TreeRelatedFieldListFilter
+
+from .models import Department
+from .pagination import KEYSET_ORDERING, after_position, decode_cursor, encode_cursor
+
+CURSOR_VAR = 'after'
+
+
+def estimated_rows(model: type[Model], using: str) -> int | None:
+    """
+    Число строк таблицы по статистике InnoDB (information_schema).
+
+    Оценка обновляется вместе со статистикой таблицы и может отличаться
+    от точного значения на десятки процентов. None - база без статистики.
+    """
+
+    connection = connections[using]
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EmployeePaginator(Paginator):
+    """Оценка числа строк без фильтров и номера страниц в пределах OFFSET"""
+
+    # Число строк - оценка по статистике таблицы
+    estimated = False
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if (
+                estimate is not None
+                and estimate >= settings.STAFF_ADMIN_ESTIMATED_COUNT
+            ):
+                self.estimated = True
+                return estimate
+        return super().count
+
+    @property
+    def offset_pages(self) -> int:
+        """Последняя страница, которая открывается по номеру"""
+
+        return max(1, settings.STAFF_ADMIN_MAX_OFFSET // self.per_page)
+
+    def get_elided_page_range(
+        self, number: int = 1, *, on_each_side: int = 3, on_ends: int = 2
+    ):
+        # Диапазон строится по усечённому числу страниц: дальние страницы
+        # открываются только курсором
+        pages = Paginator(range(min(self.num_pages, self.offset_pages)), 1)
+        return pages.get_elided_page_range(
+            min(number, pages.num_pages), on_each_side=on_each_side, on_ends=on_ends
+        )
+
+
+class EmployeeChangeList(ChangeList):
+    """
+    Страницы сотрудников по курсору.
+
+    Курсор (параметр ``after``) - ключ последней строки предыдущей
+    страницы; действует при порядке по умолчанию (full_name, id), при
+    сортировке по другим столбцам страницы листаются номерами.
+    """
+
+    def __init__(self, request: HttpRequest, *args, **kwargs) -> None:
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.next_url = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        # Курсор относится только к текущей странице: в ссылки фильтров,
+        # сортировки и номеров страниц он не переносится
+        self.params.pop(CURSOR_VAR, None)
+        return super().get_queryset(request)
+
+    def keyset_ordered(self) -> bool:
+        # Порядок ModelAdmin.get_queryset() ChangeList дописывает ещё раз
+        return tuple(dict.fromkeys(self.queryset.query.order_by)) == KEYSET_ORDERING
+
+    def get_results(self, request: HttpRequest) -> None:
+        if not self.cursor or self.show_all or not self.keyset_ordered():
+            super().get_results(request)
+        else:
+            try:
+                position = decode_cursor(self.cursor)
+            except ValueError:
+                raise IncorrectLookupParameters from None
+            # Номер страницы при курсоре только для отображения: по оценке
+            # числа строк он может оказаться за последней страницей
+            page_num, self.page_num = self.page_num, 1
+            super().get_results(request)
+            self.page_num = page_num
+            self.result_list = after_position(self.queryset, position)[
+                : self.list_per_page
+            ]
+        self.next_url = self.get_next_url()
+
+    def get_next_url(self) -> str | None:
+        if not self.multi_page or self.show_all or not self.keyset_ordered():
+            return None
+        # result_list остаётся QuerySet: строки кэшируются в нём для шаблона
+        rows = list(self.result_list)
+        if len(rows) < self.list_per_page:
+            return None
+        last = rows[-1]
+        return self.get_query_string(
+            {
+                PAGE_VAR: self.page_num + 1,
+                CURSOR_VAR: encode_cursor((last.full_name, last.id)),
+            }
+        )
+
+
+class DepartmentTreeFilter(TreeRelatedFieldListFilter):
+    """
+    Сотрудники подразделения вместе с поддеревом: условие по tree_id и
+    диапазону lft подразделения сотрудника вместо списка потомков.
+    """
+
+    def queryset(self, request: HttpRequest, queryset: QuerySet) -> QuerySet:
+        if not self.lookup_val:
+            return super().queryset(request, queryset)
+        try:
+            tree_id, lft, rght = Department.objects.values_list(
+                'tree_id', 'lft', 'rght'
+            ).get(pk=self.lookup_val)
+        except (Department.DoesNotExist, ValueError, ValidationError) as error:
+            raise IncorrectLookupParameters(error) from None
+        params = {
+            name: value
+            for name, value in self.used_parameters.items()
+            if name != self.changed_lookup_kwarg
+        }
+        return queryset.filter(
+            **{
+                f'{self.field_path}__tree_id': tree_id,
+                f'{self.field_path}__lft__range': (lft, rght),
+            },
+            **params,
+        )
+
+    def field_choices(
+        self, field: Field, request: HttpRequest, model_admin: ModelAdmin
+    ) -> list[tuple]:
+        # Названия и уровни одним запросом в порядке дерева, без IN по
+        # всем подразделениям
+        indent = getattr(model_admin, 'mptt_level_indent', self.mptt_level_indent)
+        side = 'right' if get_language_bidi() else 'left'
+        return [
+            (pk, name, mark_safe(f' style="padding-{side}:{indent * level}px"'))
+            for pk, name, level in Department.objects.order_by(
+                'tree_id', 'lft'
+            ).values_list('id', 'name', 'level')
+        ]
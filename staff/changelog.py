@@ -0,0 +1,180 @@
+"""
+Журнал изменений подразделений и сотрудников для инкрементальной
+синхронизации: HR-система, кэши и поисковый индекс читают изменения
+после запомненного номера вместо полного чтения таблиц.
+
+Создание, изменение, перемещение и удаление пишутся в staff_change в
+транзакции самого изменения: сохранения и удаления через ORM - из
+сигналов (staff.signals), массовые операции staff (import_staff,
+reorganize()) - пачками. Номера выдаёт счётчик ChangeSequence, строка
+которого заблокирована до фиксации, поэтому номера идут без пропусков в
+порядке фиксации. Цена - пишущие транзакции staff фиксируются по очереди.
+
+Полная замена данных (seed_db) очищает журнал: читателю с номером
+меньше номера очистки нужна полная синхронизация (ChangesResetError).
+Изменения в обход ORM и staff (прямой SQL) в журнал не попадают.
+
+Журнал один на все базы и ведётся в default. Изменения деревьев из
+баз филиалов (staff.sharding) записываются в него после фиксации
+транзакции филиала: откаченные изменения в журнал не попадают, но при
+сбое между двумя фиксациями запись может потеряться.
+"""
+
+from collections.abc import Iterable
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from .models import Change, ChangeSequence, Department, Employee
+
+DEPARTMENT_FIELDS = ('name', 'parent_id')
+EMPLOYEE_FIELDS = ('full_name', 'position', 'salary', 'hire_date', 'department_id')
+BATCH_SIZE = 1000
+
+
+class ChangesResetError(Exception):
+    """Журнал очищен после запрошенного номера"""
+
+    def __init__(self, reset: int) -> None:
+        super().__init__(f'Журнал изменений очищен на номере {reset}')
+        self.reset = reset
+
+
+def department_data(department: Department) -> dict:
+    return {field: getattr(department, field) for field in DEPARTMENT_FIELDS}
+
+
+def employee_data(employee: Employee) -> dict:
+    data = {field: getattr(employee, field) for field in EMPLOYEE_FIELDS}
+    # Зарплата - как хранится в базе, даже если присвоено целое число
+    data['salary'] = Decimal(data['salary']).quantize(Decimal('0.01'))
+    return data
+
+
+def _reserve(count: int, using: str) -> int:
+    """
+    Резервирование ``count`` номеров, возвращает последний из них.
+
+    UPDATE блокирует строку счётчика до конца транзакции.
+    """
+
+    sequences = ChangeSequence.objects.using(using)
+    sequences.filter(pk=1).update(last=F('last') + count)
+    return sequences.values_list('last', flat=True).get(pk=1)
+
+
+def record(
+    kind: str,
+    action: str,
+    items: Iterable[tuple[int, dict]],
+    using: str = DEFAULT_DB_ALIAS,
+) -> int:
+    """Запись изменений объектов ``(id, данные)``, возвращает число записей"""
+
+    items = list(items)
+    if not items:
+        return 0
+    with transaction.atomic(using=using, savepoint=False):
+        first = _reserve(len(items), using) - len(items) + 1
+        Change.objects.using(using).bulk_create(
+            [
+                Change(
+                    sequence=first + number,
+                    kind=kind,
+                    object_id=pk,
+                    action=action,
+                    data=data,
+                )
+                for number, (pk, data) in enumerate(items)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+    return len(items)
+
+
+def _record_from(
+    using: str | None, kind: str, action: str, items: Iterable[tuple[int, dict]]
+) -> None:
+    """Запись изменения из базы ``using`` в журнал default"""
+
+    if using in (None, DEFAULT_DB_ALIAS):
+        record(kind, action, items)
+        return
+    items = list(items)
+    if items:
+        transaction.on_commit(lambda: record(kind, action, items), using=using)
+
+
+def log_department(department: Department, action: str, **extra) -> None:
+    _record_from(
+        department._state.db,
+        Change.Kind.DEPARTMENT,
+        action,
+        [(department.pk, {**department_data(department), **extra})],
+    )
+
+
+def log_employee(employee: Employee, action: str, **extra) -> None:
+    _record_from(
+        employee._state.db,
+        Change.Kind.EMPLOYEE,
+        action,
+        [(employee.pk, {**employee_data(employee), **extra})],
+    )
+
+
+def log_department_employees_deleted(department: Department) -> None:
+    """Сотрудники, удаляемые каскадом вместе с подразделением, - одной пачкой"""
+
+    using = department._state.db
+    rows = (
+        Employee.objects.using(using)
+        .filter(department_id=department.pk)
+        .values_list('id', *EMPLOYEE_FIELDS)
+    )
+    _record_from(
+        using,
+        Change.Kind.EMPLOYEE,
+        Change.Action.DELETE,
+        ((pk, dict(zip(EMPLOYEE_FIELDS, values, strict=True))) for pk, *values in rows),
+    )
+
+
+def reset_changes(using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Очистка журнала при полной замене данных, возвращает номер очистки.
+
+    Номер очистки занимает отдельный номер: читатель, дочитавший журнал
+    до конца, тоже узнает об очистке.
+    """
+
+    with transaction.atomic(using=using, savepoint=False):
+        reset = _reserve(1, using)
+        ChangeSequence.objects.using(using).filter(pk=1).update(reset=reset)
+        Change.objects.using(using).all().delete()
+    return reset
+
+
+def changes_since(
+    since: int, limit: int, using: str = DEFAULT_DB_ALIAS
+) -> tuple[list[dict], bool]:
+    """
+    До ``limit`` изменений с номером больше ``since`` и признак того,
+    что в журнале есть ещё записи.
+    """
+
+    reset = (
+        ChangeSequence.objects.using(using).values_list('reset', flat=True).get(pk=1)
+    )
+    if since < reset:
+        raise ChangesResetError(reset)
+    rows = list(
+        Change.objects.using(using)
+        .filter(sequence__gt=since)
+        .order_by('sequence')
+        .values('sequence', 'kind', 'object_id', 'action', 'data', 'created_at')[
+            : limit + 1
+        ]
+    )
+    return rows[:limit], len(rows) > limit
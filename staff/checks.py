@@ -0,0 +1,92 @@
+"""
+Проверки размещения деревьев по базам (staff.sharding).
+
+Читают данные, поэтому выполняются только с базами: перед migrate или
+``manage.py check --database default --database sibir``.
+"""
+
+from itertools import pairwise
+
+from django.conf import settings
+from django.core.checks import CheckMessage, Error, Tags, register
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.db.models import Max, Min, Model
+
+from .models import Department, Employee
+from .sharding import tree_databases
+
+
+@register(Tags.database)
+def check_tree_shards(
+    app_configs: list | None = None, databases: list[str] | None = None, **kwargs
+) -> list[CheckMessage]:
+    if not settings.STAFF_TREE_SHARDS or not databases:
+        return []
+    aliases = [alias for alias in tree_databases() if alias in databases]
+    try:
+        errors = _overlapping_ids(Department, aliases)
+        errors += _overlapping_ids(Employee, aliases)
+        if DEFAULT_DB_ALIAS in databases:
+            errors += _misplaced_roots(databases)
+    except DatabaseError:
+        # Схема ещё не создана: проверка повторится после migrate
+        return []
+    return errors
+
+
+def _overlapping_ids(model: type[Model], aliases: list[str]) -> list[Error]:
+    """Диапазоны id модели в разных базах не должны пересекаться"""
+
+    ranges = []
+    for alias in aliases:
+        bounds = model.objects.using(alias).aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is not None:
+            ranges.append((bounds['low'], bounds['high'], alias))
+    ranges.sort()
+    return [
+        Error(
+            f'id {model._meta.db_table} в базах {first[2]} и {second[2]} '
+            f'пересекаются: {first[0]}-{first[1]} и {second[0]}-{second[1]}',
+            hint=(
+                'Задайте базам непересекающиеся диапазоны автоинкремента: '
+                f'ALTER TABLE {model._meta.db_table} AUTO_INCREMENT = <начало>'
+            ),
+            id='staff.E001',
+        )
+        for first, second in pairwise(ranges)
+        if second[0] <= first[1]
+    ]
+
+
+def _misplaced_roots(databases: list[str]) -> list[Error]:
+    """Корень филиала должен быть корнем в своей базе и отсутствовать в default"""
+
+    shards = {
+        root_id: alias
+        for root_id, alias in settings.STAFF_TREE_SHARDS.items()
+        if alias != DEFAULT_DB_ALIAS
+    }
+    errors = [
+        Error(
+            f'Дерево {root_id} из STAFF_TREE_SHARDS есть и в default',
+            hint='Удалите перенесённое дерево из default',
+            id='staff.E002',
+        )
+        for root_id in Department.objects.using(DEFAULT_DB_ALIAS)
+        .filter(pk__in=shards)
+        .values_list('pk', flat=True)
+        .order_by('pk')
+    ]
+    for root_id, alias in sorted(shards.items()):
+        if alias not in databases:
+            continue
+        roots = Department.objects.using(alias).filter(pk=root_id, parent=None)
+        if not roots.exists():
+            errors.append(
+                Error(
+                    f'В базе {alias} нет корневого подразделения {root_id}',
+                    hint='Ключи STAFF_TREE_SHARDS - id корневых подразделений',
+                    id='staff.E003',
+                )
+            )
+    return errors
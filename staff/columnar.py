@@ -0,0 +1,68 @@
+"""
+Компактный колоночный формат списков сотрудников (``?format=columnar``).
+
+Вместо массива объектов с повторяющимися ключами ответ содержит по
+массиву на каждое поле, а должности закодированы индексами в словаре
+``dictionaries.position``. Данные собираются напрямую из
+``values_list()``: без моделей и полей сериализатора.
+"""
+
+from collections.abc import Iterable
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .instrumentation import serialization
+
+EMPLOYEE_COLUMNS = ('id', 'full_name', 'position', 'salary', 'hire_date')
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер, выбираемый параметром ``?format=columnar``.
+
+    Сам рендерер данных не меняет: представление, видя выбранный формат,
+    сразу строит колоночный ответ.
+    """
+
+    format = 'columnar'
+
+
+class ColumnarFormatMixin:
+    """Поддержка ``?format=columnar`` в представлениях DRF"""
+
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+
+    def is_columnar(self) -> bool:
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return getattr(renderer, 'format', None) == ColumnarJSONRenderer.format
+
+
+def employee_columns(rows: Iterable[tuple]) -> dict:
+    """
+    Колоночное представление сотрудников.
+
+    ``rows`` - кортежи значений в порядке EMPLOYEE_COLUMNS. Зарплата
+    отдаётся числом, дата приёма - строкой ISO.
+    """
+
+    with serialization():
+        return _columns(list(rows))
+
+
+def _columns(rows: list[tuple]) -> dict:
+    if not rows:
+        columns = {name: [] for name in EMPLOYEE_COLUMNS}
+        return {**columns, 'dictionaries': {'position': []}}
+
+    ids, names, positions, salaries, hire_dates = zip(*rows, strict=True)
+    vocabulary = {}
+    codes = [vocabulary.setdefault(position, len(vocabulary)) for position in positions]
+    return {
+        'id': ids,
+        'full_name': names,
+        'position': codes,
+        'salary': [float(salary) for salary in salaries],
+        'hire_date': [hire_date.isoformat() for hire_date in hire_dates],
+        'dictionaries': {'position': list(vocabulary)},
+    }
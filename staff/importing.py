@@ -0,0 +1,384 @@
+"""
+Массовая загрузка подразделений и сотрудников из CSV и NDJSON.
+
+Форматы совпадают с выгрузкой (staff.export). Подразделение задаётся
+путём от корня (``path``) или ссылкой на родителя из того же файла
+(``id`` и ``parent_id``); недостающие узлы пути создаются. Поля MPTT
+пересчитываются один раз в памяти после вставки, а не на каждую запись.
+Сотрудники читаются потоком и вставляются пачками с обновлением по
+ключу (ФИО, подразделение). Новые подразделения, новые и изменившиеся
+сотрудники пишутся в журнал изменений (staff.changelog) пачками.
+
+id новых подразделений выдаёт база: до вставки узлы получают временные
+отрицательные id, вставляются по уровням (родители раньше детей) и
+перенумеровываются, поэтому параллельная вставка не приводит к
+конфликту ключей. Существующие подразделения блокируются на время
+загрузки (select_for_update), как при реорганизации.
+"""
+
+import csv
+import json
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import connection
+
+from .changelog import EMPLOYEE_FIELDS, record
+from .models import PATH_SEPARATOR, Change, Department, Employee
+from .tree import nested_set_fields, path_fields
+
+NAME_LENGTH = 100
+MAX_SALARY = Decimal('99999999.99')
+
+
+class RowError(ValueError):
+    """Ошибка в строке входного файла"""
+
+    def __init__(self, line: int, message: str) -> None:
+        super().__init__(f'строка {line}: {message}')
+        self.line = line
+
+
+def read_rows(path: str, file_format: str | None = None) -> Iterator[tuple[int, dict]]:
+    """Строки файла с номерами; формат определяется по расширению"""
+
+    file_format = file_format or Path(path).suffix.lstrip('.').lower()
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        elif file_format in ('ndjson', 'jsonl'):
+            for line, text in enumerate(file, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except json.JSONDecodeError as error:
+                    raise RowError(line, f'некорректный JSON: {error.msg}') from None
+                if not isinstance(row, dict):
+                    raise RowError(line, 'ожидается JSON-объект')
+                yield line, row
+        else:
+            raise ValueError(f'Неизвестный формат файла: {file_format}')
+
+
+def _text(line: int, row: dict, name: str) -> str:
+    value = str(row.get(name) or '').strip()
+    if not value:
+        raise RowError(line, f'не заполнено поле {name}')
+    if len(value) > NAME_LENGTH:
+        raise RowError(line, f'поле {name} длиннее {NAME_LENGTH} символов')
+    return value
+
+
+def _split_path(line: int, path: str) -> tuple[str, ...]:
+    names = tuple(name.strip() for name in path.split(PATH_SEPARATOR))
+    if not all(names):
+        raise RowError(line, f'некорректный путь: {path}')
+    for name in names:
+        if len(name) > NAME_LENGTH:
+            raise RowError(line, f'название длиннее {NAME_LENGTH} символов: {name}')
+    return names
+
+
+@dataclass
+class DepartmentTree:
+    """
+    Подразделения в памяти: существующие и добавляемые при загрузке.
+
+    Подразделений на порядки меньше, чем сотрудников, поэтому всё
+    дерево держится в памяти целиком.
+    """
+
+    nodes: dict[int, tuple[int | None, str]] = field(default_factory=dict)
+    by_key: dict[tuple[int | None, str], int] = field(default_factory=dict)
+    created: list[int] = field(default_factory=list)
+    # Временный id следующего нового узла
+    next_id: int = -1
+    # Временный id -> id в базе после сохранения
+    saved: dict[int, int] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls) -> 'DepartmentTree':
+        """Дерево из базы; строки блокируются до конца транзакции"""
+
+        tree = cls()
+        for pk, parent_id, name in Department.objects.select_for_update().values_list(
+            'id', 'parent_id', 'name'
+        ):
+            tree.nodes[pk] = (parent_id, name)
+            tree.by_key[parent_id, name] = pk
+        return tree
+
+    def ensure(self, names: Iterable[str]) -> int:
+        """id подразделения по пути; недостающие узлы добавляются"""
+
+        parent_id = None
+        for name in names:
+            pk = self.by_key.get((parent_id, name))
+            if pk is None:
+                pk = self.next_id
+                self.next_id -= 1
+                self.nodes[pk] = (parent_id, name)
+                self.by_key[parent_id, name] = pk
+                self.created.append(pk)
+            parent_id = pk
+        return parent_id
+
+    def renumber(self, saved: dict[int, int]) -> None:
+        """Замена временных id новых узлов на id из базы"""
+
+        def real(pk: int | None) -> int | None:
+            return saved.get(pk, pk)
+
+        self.nodes = {
+            real(pk): (real(parent_id), name)
+            for pk, (parent_id, name) in self.nodes.items()
+        }
+        self.by_key = {
+            (real(parent_id), name): real(pk)
+            for (parent_id, name), pk in self.by_key.items()
+        }
+        self.created = [saved[pk] for pk in self.created]
+        self.saved |= saved
+
+    def paths(self) -> dict[str, int]:
+        """id подразделений по строке пути от корня"""
+
+        return {name_path: pk for pk, (_, name_path) in path_fields(self.nodes).items()}
+
+    def tree_fields(self) -> dict[int, tuple[int, int, int, int]]:
+        """Поля MPTT всех узлов (см. nested_set_fields)"""
+
+        return nested_set_fields(self.nodes)
+
+
+def department_paths(
+    rows: Iterable[tuple[int, dict]],
+) -> list[tuple[int, str | None, tuple[str, ...]]]:
+    """
+    Пути подразделений из строк файла: (строка, id из файла, путь).
+
+    Строка содержит либо ``path``, либо ``name`` с необязательным
+    ``parent_id`` - ссылкой на ``id`` другой строки того же файла.
+    ``id`` из файла нужен, чтобы сотрудники могли ссылаться на него.
+    """
+
+    paths = []
+    references = {}
+    for line, row in rows:
+        source_id = str(row.get('id') or '').strip() or None
+        if row.get('path'):
+            paths.append((line, source_id, _split_path(line, str(row['path']))))
+        elif source_id is None:
+            raise RowError(line, 'ожидается path или id с name')
+        else:
+            parent = str(row.get('parent_id') or '').strip() or None
+            references[source_id] = (line, _text(line, row, 'name'), parent)
+
+    resolved = {}
+
+    def resolve(source_id: str, seen: frozenset = frozenset()) -> tuple:
+        if source_id in resolved:
+            return resolved[source_id]
+        line, name, parent = references[source_id]
+        if source_id in seen:
+            raise RowError(line, f'цикл в ссылках на родителя: {source_id}')
+        if parent is None:
+            resolved[source_id] = (name,)
+        elif parent not in references:
+            raise RowError(line, f'родитель {parent} не найден в файле')
+        else:
+            resolved[source_id] = (*resolve(parent, seen | {source_id}), name)
+        return resolved[source_id]
+
+    for source_id, (line, _, _) in references.items():
+        paths.append((line, source_id, resolve(source_id)))
+    return paths
+
+
+def save_departments(tree: DepartmentTree, batch_size: int) -> int:
+    """
+    Вставка новых узлов и пересчёт полей MPTT, возвращает число изменённых.
+
+    Новые узлы вставляются по уровням: id родителя известен из базы до
+    вставки детей. Пути содержат собственный id узла и дописываются
+    после вставки.
+    """
+
+    levels = {}
+    for pk, (tree_id, lft, rght, level) in tree.tree_fields().items():
+        if pk < 0:
+            levels.setdefault(level, []).append((pk, tree_id, lft, rght))
+    saved = {}
+    for level in sorted(levels):
+        departments = [
+            Department(
+                parent_id=saved.get(tree.nodes[pk][0], tree.nodes[pk][0]),
+                name=tree.nodes[pk][1],
+                tree_id=tree_id,
+                lft=lft,
+                rght=rght,
+                level=level,
+            )
+            for pk, tree_id, lft, rght in levels[level]
+        ]
+        Department.objects.bulk_create(departments, batch_size=batch_size)
+        saved |= {
+            pk: department.pk
+            for (pk, *_), department in zip(levels[level], departments, strict=True)
+        }
+    tree.renumber(saved)
+
+    new = set(tree.created)
+    paths = path_fields(tree.nodes)
+    Department.objects.bulk_update(
+        [
+            Department(id=pk, path=paths[pk][0], name_path=paths[pk][1])
+            for pk in sorted(new)
+        ],
+        ['path', 'name_path'],
+        batch_size=batch_size,
+    )
+    fields = tree.tree_fields()
+    record(
+        Change.Kind.DEPARTMENT,
+        Change.Action.CREATE,
+        (
+            (pk, {'name': tree.nodes[pk][1], 'parent_id': tree.nodes[pk][0]})
+            for pk in sorted(new)
+        ),
+    )
+
+    changed = []
+    for pk, tree_id, lft, rght, level in Department.objects.values_list(
+        'id', 'tree_id', 'lft', 'rght', 'level'
+    ):
+        # Вставленные параллельно после load() в дереве загрузки отсутствуют
+        if pk in new or pk not in fields:
+            continue
+        if fields[pk] != (tree_id, lft, rght, level):
+            new_tree_id, new_lft, new_rght, new_level = fields[pk]
+            changed.append(
+                Department(
+                    id=pk,
+                    tree_id=new_tree_id,
+                    lft=new_lft,
+                    rght=new_rght,
+                    level=new_level,
+                )
+            )
+    Department.objects.bulk_update(
+        changed, ['tree_id', 'lft', 'rght', 'level'], batch_size=batch_size
+    )
+    return len(new) + len(changed)
+
+
+@dataclass
+class EmployeeParser:
+    """Разбор и проверка строк сотрудников"""
+
+    paths: dict[str, int]
+    # Ссылки department_id: id из файла подразделений или из базы
+    references: dict[str, int]
+
+    def parse(self, line: int, row: dict) -> tuple:
+        full_name = _text(line, row, 'full_name')
+        position = _text(line, row, 'position')
+
+        try:
+            salary = Decimal(str(row.get('salary', '')).strip()).quantize(
+                Decimal('0.01')
+            )
+        except InvalidOperation:
+            raise RowError(
+                line, f'некорректная зарплата: {row.get("salary")}'
+            ) from None
+        if not Decimal(0) <= salary <= MAX_SALARY:
+            raise RowError(line, f'зарплата вне допустимого диапазона: {salary}')
+
+        try:
+            hire_date = date.fromisoformat(str(row.get('hire_date', '')).strip())
+        except ValueError:
+            raise RowError(
+                line, f'некорректная дата приёма: {row.get("hire_date")}'
+            ) from None
+
+        if row.get('department_path'):
+            department_id = self.paths.get(str(row['department_path']).strip())
+        else:
+            department_id = self.references.get(
+                str(row.get('department_id') or '').strip()
+            )
+        if department_id is None:
+            raise RowError(line, 'подразделение не найдено')
+        return full_name, position, salary, hire_date, department_id
+
+
+def upsert_employees(rows: list[tuple]) -> None:
+    """
+    Вставка пачки с обновлением существующих по (ФИО, подразделение).
+
+    Повторы ключа внутри пачки схлопываются: побеждает последняя строка.
+    """
+
+    unique = {(row[0], row[4]): row for row in rows}
+    stored = _stored_employees(unique)
+    options = {
+        'update_conflicts': True,
+        'update_fields': ['position', 'salary', 'hire_date'],
+    }
+    # MySQL обновляет по любому уникальному ключу и не принимает unique_fields
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['full_name', 'department']
+    Employee.objects.bulk_create(
+        [
+            Employee(
+                full_name=full_name,
+                position=position,
+                salary=salary,
+                hire_date=hire_date,
+                department_id=department_id,
+            )
+            for full_name, position, salary, hire_date, department_id in unique.values()
+        ],
+        **options,
+    )
+
+    # id новых строк bulk_create с update_conflicts не возвращает
+    created, updated = [], []
+    for key, (pk, *_) in _stored_employees(unique).items():
+        full_name, position, salary, hire_date, department_id = unique[key]
+        data = dict(
+            zip(
+                EMPLOYEE_FIELDS,
+                (full_name, position, salary, hire_date, department_id),
+                strict=True,
+            )
+        )
+        if key not in stored:
+            created.append((pk, data))
+        elif stored[key][1:] != (position, salary, hire_date):
+            updated.append((pk, data))
+    record(Change.Kind.EMPLOYEE, Change.Action.CREATE, created)
+    record(Change.Kind.EMPLOYEE, Change.Action.UPDATE, updated)
+
+
+def _stored_employees(keys: dict[tuple[str, int], tuple]) -> dict[tuple, tuple]:
+    """(id, должность, зарплата, дата приёма) сотрудников пачки по ключу"""
+
+    names = {full_name for full_name, _ in keys}
+    departments = {department_id for _, department_id in keys}
+    return {
+        (full_name, department_id): tuple(values)
+        for full_name, department_id, *values in Employee.objects.filter(
+            full_name__in=names, department_id__in=departments
+        ).values_list(
+            'full_name', 'department_id', 'id', 'position', 'salary', 'hire_date'
+        )
+        if (full_name, department_id) in keys
+    }
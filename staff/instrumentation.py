@@ -0,0 +1,304 @@
+"""
+Встроенная инструментация запросов.
+
+Для выборки запросов (доля ``STAFF_METRICS_SAMPLE_RATE``) middleware
+считает число SQL-запросов, время в базе, время сериализации и полное
+время ответа по каждому представлению. Значения копятся в гистограммах
+в памяти процесса и отдаются в текстовом формате Prometheus; в базу
+ничего не пишется, поэтому инструментацию можно держать включённой
+в production.
+"""
+
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.http import HttpRequest, HttpResponse
+
+from rest_framework import serializers
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .cache import counters as cache_counters
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HISTOGRAMS = {
+    'staff_request_duration_seconds': ('Полное время ответа', LATENCY_BUCKETS),
+    'staff_request_db_seconds': ('Время выполнения SQL-запросов', LATENCY_BUCKETS),
+    'staff_request_serialize_seconds': (
+        'Время сериализации и рендеринга ответа, включая ленивые SQL-запросы',
+        LATENCY_BUCKETS,
+    ),
+    'staff_request_queries': ('Число SQL-запросов', QUERY_BUCKETS),
+}
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин"""
+
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterator[tuple[str, int]]:
+        total = 0
+        for bound, value in zip((*self.buckets, '+Inf'), self.counts, strict=True):
+            total += value
+            yield str(bound), total
+
+
+class MetricsRegistry:
+    """Метрики запросов в пределах процесса"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._requests = Counter()
+
+    def count_request(self, view: str, status: int) -> None:
+        with self._lock:
+            self._requests[view, status] += 1
+
+    def observe(self, view: str, values: dict[str, float]) -> None:
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+                self._histograms[key].observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+    def render(self) -> str:
+        """Метрики процесса в текстовом формате Prometheus"""
+
+        lines = [
+            '# HELP staff_requests_total Число обработанных запросов',
+            '# TYPE staff_requests_total counter',
+        ]
+        with self._lock:
+            for (view, status), value in sorted(self._requests.items()):
+                labels = _labels(view=view, status=status)
+                lines.append(f'staff_requests_total{{{labels}}} {value}')
+
+            for name, (description, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, value in histogram.cumulative():
+                        labels = _labels(view=view, le=bound)
+                        lines.append(f'{name}_bucket{{{labels}}} {value}')
+                    labels = _labels(view=view)
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+        lines.append('# HELP staff_cache_requests_total Обращения к кэшу API')
+        lines.append('# TYPE staff_cache_requests_total counter')
+        for namespace, outcomes in sorted(cache_counters.snapshot().items()):
+            for outcome, value in sorted(outcomes.items()):
+                labels = _labels(namespace=namespace, outcome=outcome)
+                lines.append(f'staff_cache_requests_total{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+def _labels(**labels: object) -> str:
+    def escape(value: object) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+class RequestTimings:
+    """Замеры одного запроса"""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar(
+    'staff_request_timings', default=None
+)
+
+
+def record_query(
+    execute: Callable, sql: str, params: object, many: bool, context: dict
+) -> object:
+    """
+    Обёртка выполнения SQL, постоянно установленная на соединения.
+
+    Запросы учитываются в замерах текущего запроса из контекстной
+    переменной: она доступна и в потоках sync_to_async, где выполняются
+    запросы асинхронного ORM.
+    """
+
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+def install_query_recorder(connection: BaseDatabaseWrapper) -> None:
+    # В начало списка: execute_wrapper() снимает обёртки с конца
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def serialization() -> Iterator[None]:
+    """
+    Учёт времени сериализации текущего запроса.
+
+    Вложенные вызовы (сериализаторы внутри сериализаторов) не
+    учитываются повторно.
+    """
+
+    timings = _current.get()
+    if timings is None or timings.serializing:
+        yield
+        return
+    timings.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize += time.perf_counter() - start
+        timings.serializing = False
+
+
+class TimedSerializerMixin:
+    """Сериализатор, время получения ``data`` которого попадает в метрики"""
+
+    @property
+    def data(self) -> object:
+        with serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+def view_name(request: HttpRequest) -> str:
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class InstrumentationMiddleware:
+    """
+    Сбор метрик по запросам.
+
+    Должна стоять первой в MIDDLEWARE, чтобы полное время включало
+    остальные middleware. Работает и в синхронном, и в асинхронном
+    режиме: под ASGI не переводит async-представления в поток. При
+    ``STAFF_METRICS_SERVER_TIMING`` замеры возвращаются клиенту
+    в заголовке ``Server-Timing``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        if not settings.STAFF_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= settings.STAFF_METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+        else:
+            token = _current.set(RequestTimings())
+            try:
+                response = self.get_response(request)
+            finally:
+                timings = _current.get()
+                _current.reset(token)
+            self.record(request, response, timings)
+        metrics.count_request(view_name(request), response.status_code)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if random.random() >= settings.STAFF_METRICS_SAMPLE_RATE:
+            response = await self.get_response(request)
+        else:
+            token = _current.set(RequestTimings())
+            try:
+                response = await self.get_response(request)
+            finally:
+                timings = _current.get()
+                _current.reset(token)
+            self.record(request, response, timings)
+        metrics.count_request(view_name(request), response.status_code)
+        return response
+
+    def record(
+        self, request: HttpRequest, response: HttpResponse, timings: RequestTimings
+    ) -> None:
+        total = time.perf_counter() - timings.start
+        metrics.observe(
+            view_name(request),
+            {
+                'staff_request_duration_seconds': total,
+                'staff_request_db_seconds': timings.db,
+                'staff_request_serialize_seconds': timings.serialize,
+                'staff_request_queries': timings.queries,
+            },
+        )
+        if settings.STAFF_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries", '
+                f'serialize;dur={timings.serialize * 1000:.2f}, '
+                f'total;dur={total * 1000:.2f}'
+            )
+
+    def process_template_response(
+        self, request: HttpRequest, response: HttpResponse
+    ) -> HttpResponse:
+        # Рендеринг (JSON, шаблон) выполняется после представления
+        timings = _current.get()
+        if timings is not None:
+            start = time.perf_counter()
+
+            def rendered(_: HttpResponse) -> None:
+                timings.serialize += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
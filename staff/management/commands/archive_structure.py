@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from staff.archive import Archive, capture, list_archives
+
+
+class Command(BaseCommand):
+    help = 'Срез структуры (подразделения и сотрудники) в архив STAFF_ARCHIVE_DIR'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--keep',
+            type=int,
+            help='Оставить только столько последних срезов (для запуска по cron)',
+        )
+        parser.add_argument(
+            '--directory', type=Path, help='Каталог вместо STAFF_ARCHIVE_DIR'
+        )
+
+    def handle(self, *args, **options):
+        if options['keep'] is not None and options['keep'] < 1:
+            raise CommandError('--keep должен быть не меньше 1')
+        path = capture(options['directory'])
+        with Archive(path) as archive:
+            meta = archive.meta
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Срез записан в {path}: подразделений {meta["departments"]}, '
+                f'сотрудников {meta["employees"]}, {path.stat().st_size} байт'
+            )
+        )
+        if options['keep'] is not None and options['directory'] is None:
+            for old in list_archives()[: -options['keep']]:
+                old.unlink()
+                self.stdout.write(f'Удалён срез {old}')
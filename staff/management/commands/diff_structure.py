@@ -0,0 +1,44 @@
+import json
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from staff.archive import Archive, ArchiveError, archive_for, diff
+
+
+def _path(value: str) -> Path:
+    """Файл среза или дата YYYY-MM-DD (последний срез не позже этого дня)"""
+
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return Path(value)
+    path = archive_for(day)
+    if path is None:
+        raise CommandError(f'Нет среза структуры на {value}')
+    return path
+
+
+class Command(BaseCommand):
+    help = 'Различия двух срезов структуры в JSON'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('old', help='Файл среза или дата YYYY-MM-DD')
+        parser.add_argument('new', help='Файл среза или дата YYYY-MM-DD')
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Не больше стольких сотрудников в каждом списке (по умолчанию все)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with (
+                Archive(_path(options['old'])) as old,
+                Archive(_path(options['new'])) as new,
+            ):
+                changes = diff(old, new).as_dict(options['limit'])
+        except (OSError, ArchiveError) as error:
+            raise CommandError(error) from None
+        self.stdout.write(json.dumps(changes, ensure_ascii=False, indent=2))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from staff.export import EXPORTS, FORMATS, export_stream
+from staff.models import Department
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка подразделений или сотрудников в CSV/NDJSON'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument(
+            '--root', type=int, help='Выгрузить только поддерево подразделения'
+        )
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        root = None
+        if options['root'] is not None:
+            root = Department.objects.filter(pk=options['root']).first()
+            if root is None:
+                raise CommandError(f'Подразделение {options["root"]} не найдено')
+
+        chunks = export_stream(options['kind'], options['format'], root)
+        if options['output'] is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stderr.write(
+            self.style.SUCCESS(f'Выгрузка записана в {options["output"]}')
+        )
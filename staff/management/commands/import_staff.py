@@ -0,0 +1,127 @@
+import time
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from staff.cache import invalidate_all
+from staff.importing import (
+    DepartmentTree,
+    EmployeeParser,
+    RowError,
+    department_paths,
+    read_rows,
+    save_departments,
+    upsert_employees,
+)
+from staff.models import Department
+from staff.stats import rebuild_department_stats
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Загрузка подразделений и сотрудников из CSV/NDJSON с обновлением'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--departments', help='Файл подразделений')
+        parser.add_argument('--employees', help='Файл сотрудников')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='Формат файлов (по умолчанию по расширению)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, help='Размер пакета вставки'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить файлы, ничего не записывая',
+        )
+
+    def handle(self, *args, **options):
+        if settings.STAFF_TREE_SHARDS:
+            raise CommandError(
+                'Команда работает только с одной базой: уберите STAFF_TREE_SHARDS'
+            )
+        if not options['departments'] and not options['employees']:
+            raise CommandError('Укажите --departments и/или --employees')
+
+        started = time.perf_counter()
+        self.errors = []
+        try:
+            with transaction.atomic():
+                rows = self.run_import(options)
+                if self.errors or options['dry_run']:
+                    transaction.set_rollback(True)
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error)) from error
+
+        elapsed = time.perf_counter() - started
+        for message in self.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(message)
+        if len(self.errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f'... и ещё {len(self.errors) - MAX_REPORTED_ERRORS}')
+        if self.errors:
+            raise CommandError(f'Ошибок: {len(self.errors)}, изменения не сохранены')
+
+        rate = rows / elapsed if elapsed else 0
+        result = 'Проверка пройдена' if options['dry_run'] else 'Загрузка завершена'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{result}: {rows:,} строк за {elapsed:.1f} с ({rate:,.0f} строк/с)'
+            )
+        )
+
+    def run_import(self, options: dict) -> int:
+        tree = DepartmentTree.load()
+        references = {str(pk): pk for pk in tree.nodes}
+        rows = 0
+
+        if options['departments']:
+            paths = department_paths(
+                read_rows(options['departments'], options['format'])
+            )
+            for _, source_id, names in paths:
+                pk = tree.ensure(names)
+                if source_id is not None:
+                    references[source_id] = pk
+            rows += len(paths)
+            self.stdout.write(f'Новых подразделений: {len(tree.created)}')
+            if not options['dry_run']:
+                save_departments(tree, options['batch_size'])
+                # Ссылки на новые подразделения - по id, выданным базой
+                references = {
+                    source_id: tree.saved.get(pk, pk)
+                    for source_id, pk in references.items()
+                }
+
+        if options['employees']:
+            parser = EmployeeParser(tree.paths(), references)
+            employees = self.parse_employees(
+                parser, read_rows(options['employees'], options['format'])
+            )
+            while batch := list(islice(employees, options['batch_size'])):
+                rows += len(batch)
+                if not options['dry_run'] and not self.errors:
+                    upsert_employees(batch)
+                self.stdout.write(f'   ...обработано {rows:,} строк')
+
+        if not options['dry_run'] and not self.errors:
+            # Вставка пачками обходит сигналы: агрегаты и кэш пересчитываются целиком
+            rebuild_department_stats()
+            invalidate_all()
+            self.stdout.write(f'Подразделений в базе: {Department.objects.count()}')
+        return rows
+
+    def parse_employees(
+        self, parser: EmployeeParser, rows: Iterable[tuple[int, dict]]
+    ) -> Iterator[tuple]:
+        for line, row in rows:
+            try:
+                yield parser.parse(line, row)
+            except RowError as error:
+                self.errors.append(str(error))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from staff.cache import invalidate_all
+from staff.sharding import tree_databases, using_database
+from staff.stats import rebuild_department_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Полный пересчёт агрегатов по сотрудникам подразделений '
+        '(в default и базах филиалов)'
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--tree-id',
+            type=int,
+            action='append',
+            dest='tree_ids',
+            help='Пересчитать только указанное дерево (можно повторять)',
+        )
+
+    def handle(self, *args, **options):
+        count = 0
+        for alias in tree_databases():
+            with using_database(alias):
+                count += rebuild_department_stats(options['tree_ids'])
+        invalidate_all()
+        self.stdout.write(
+            self.style.SUCCESS(f'Агрегаты пересчитаны. Подразделений: {count}')
+        )
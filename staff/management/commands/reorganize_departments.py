@@ -0,0 +1,52 @@
+import json
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from staff.reorganization import DepartmentChange, ReorganizationError, reorganize
+
+
+class Command(BaseCommand):
+    help = 'Пакетное перемещение и переименование подразделений'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            'file',
+            help='JSON-массив изменений {"id", "parent", "name"}; "-" - stdin',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить изменения, ничего не записывая',
+        )
+
+    def handle(self, *args, **options):
+        if settings.STAFF_TREE_SHARDS:
+            raise CommandError(
+                'Команда работает только с одной базой: уберите STAFF_TREE_SHARDS'
+            )
+        started = time.perf_counter()
+        try:
+            if options['file'] == '-':
+                data = json.load(sys.stdin)
+            else:
+                with open(options['file'], encoding='utf-8') as file:
+                    data = json.load(file)
+            if not isinstance(data, list):
+                raise ReorganizationError('Ожидается JSON-массив изменений')
+            changes = [DepartmentChange.from_dict(item) for item in data]
+            result = reorganize(changes, dry_run=options['dry_run'])
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error)) from error
+
+        elapsed = time.perf_counter() - started
+        action = 'Проверка пройдена' if options['dry_run'] else 'Готово'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action}: перемещено {result.moved}, переименовано '
+                f'{result.renamed}, строк к записи {result.updated} '
+                f'за {elapsed:.2f} с'
+            )
+        )
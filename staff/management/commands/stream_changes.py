@@ -0,0 +1,59 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+
+from staff.changelog import ChangesResetError, changes_since
+
+
+class Command(BaseCommand):
+    help = 'Журнал изменений подразделений и сотрудников после номера в NDJSON'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=0,
+            help='Номер последнего обработанного изменения (0 - с начала)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='Размер пачки чтения'
+        )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Ждать новых изменений после конца журнала',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Пауза между опросами журнала в режиме --follow, с',
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        since = options['since']
+        while True:
+            try:
+                changes, more = changes_since(
+                    since, max(options['batch_size'], 1), options['database']
+                )
+            except ChangesResetError as reset:
+                raise CommandError(
+                    f'{reset}: нужна полная синхронизация, затем --since {reset.reset}'
+                ) from None
+            for change in changes:
+                self.stdout.write(
+                    json.dumps(change, cls=DjangoJSONEncoder, ensure_ascii=False)
+                )
+            if changes:
+                since = changes[-1]['sequence']
+                self.stdout.flush()
+            if more:
+                continue
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
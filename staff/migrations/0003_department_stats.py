@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    # Как staff.stats.rebuild_department_stats: прямые значения одним
+    # GROUP BY, накопительные сворачиваются снизу вверх в памяти
+    Department = apps.get_model('staff', 'Department')
+    DepartmentStats = apps.get_model('staff', 'DepartmentStats')
+    Employee = apps.get_model('staff', 'Employee')
+    alias = schema_editor.connection.alias
+
+    nodes = list(
+        Department.objects.using(alias)
+        .order_by('-level')
+        .values_list('id', 'parent_id')
+    )
+    stats = {pk: DepartmentStats(department_id=pk) for pk, _ in nodes}
+    direct = (
+        Employee.objects.using(alias)
+        .values('department_id')
+        .annotate(
+            count=Count('id'), total=Sum('salary'), low=Min('salary'), high=Max('salary')
+        )
+    )
+    for row in direct:
+        item = stats[row['department_id']]
+        item.direct_count = item.cumulative_count = row['count']
+        item.direct_salary_sum = item.salary_sum = row['total']
+        item.salary_min = row['low']
+        item.salary_max = row['high']
+
+    # Узлы отсортированы по убыванию уровня: дети учтены раньше родителей
+    for pk, parent_id in nodes:
+        if parent_id is None:
+            continue
+        parent, child = stats[parent_id], stats[pk]
+        parent.cumulative_count += child.cumulative_count
+        parent.salary_sum += child.salary_sum
+        lows = [v for v in (parent.salary_min, child.salary_min) if v is not None]
+        highs = [v for v in (parent.salary_max, child.salary_max) if v is not None]
+        parent.salary_min = min(lows, default=None)
+        parent.salary_max = max(highs, default=None)
+    DepartmentStats.objects.using(alias).bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0002_employee_dept_name_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentStats',
+            fields=[
+                ('department', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='staff.department', verbose_name='Подразделение')),
+                ('direct_count', models.PositiveIntegerField(default=0, verbose_name='Сотрудников в подразделении')),
+                ('direct_salary_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Фонд оплаты подразделения')),
+                ('cumulative_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Сотрудников всего')),
+                ('salary_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Фонд оплаты всего')),
+                ('salary_min', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная зарплата')),
+                ('salary_max', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Максимальная зарплата')),
+            ],
+            options={
+                'verbose_name': 'Статистика подразделения',
+                'verbose_name_plural': 'Статистика подразделений',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+def create_fulltext_index(apps, schema_editor):
+    # Полнотекстовый индекс поддерживается только MariaDB/MySQL
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'CREATE FULLTEXT INDEX employee_fulltext_idx '
+        'ON staff_employee (full_name, position)'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('DROP INDEX employee_fulltext_idx ON staff_employee')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0003_department_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['position'], name='employee_position_idx'),
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    # Родитель в порядке (tree_id, lft) встречается раньше потомков
+    Department = apps.get_model('staff', 'Department')
+    departments = Department.objects.using(schema_editor.connection.alias)
+    paths = {}
+    changed = []
+    for pk, parent_id, name in departments.order_by('tree_id', 'lft').values_list(
+        'id', 'parent_id', 'name'
+    ):
+        path, name_path = paths.get(parent_id, ('', ''))
+        path = f'{path}{pk}/'
+        name_path = f'{name_path} / {name}' if name_path else name
+        paths[pk] = (path, name_path)
+        changed.append(Department(id=pk, path=path, name_path=name_path))
+    departments.bulk_update(changed, ['path', 'name_path'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0005_department_tree_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='name_path',
+            field=models.TextField(default='', editable=False, verbose_name='Путь'),
+        ),
+        migrations.AddField(
+            model_name='department',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Путь (id)'),
+        ),
+        migrations.AddIndex(
+            model_name='department',
+            index=models.Index(fields=['path'], name='department_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
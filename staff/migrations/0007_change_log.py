@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:20
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    # Строка счётчика нужна в каждой базе со схемой staff
+    ChangeSequence = apps.get_model('staff', 'ChangeSequence')
+    ChangeSequence.objects.using(schema_editor.connection.alias).create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0006_department_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('sequence', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Номер')),
+                ('kind', models.CharField(choices=[('department', 'Подразделение'), ('employee', 'Сотрудник')], max_length=10, verbose_name='Объект')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('action', models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('move', 'Перемещение'), ('delete', 'Удаление')], max_length=6, verbose_name='Действие')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0)),
+                ('reset', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Счётчик журнала изменений',
+            },
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
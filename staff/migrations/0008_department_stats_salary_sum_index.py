@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0007_change_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='departmentstats',
+            name='salary_sum',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=16, verbose_name='Фонд оплаты всего'),
+        ),
+    ]
@@ -1,9 +1,38 @@
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import CharField, QuerySet, TextField, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.translation import gettext_lazy as _
 
+from mptt.managers import TreeManager
 from mptt.models import MPTTModel, TreeForeignKey
 
+# Разделители материализованного пути: id ("1/5/12/") и названий
+ID_SEPARATOR = '/'
+PATH_SEPARATOR = ' / '
+
+
+class DepartmentManager(TreeManager):
+    def under(self, path: str) -> QuerySet:
+        """Подразделение с путём ``path`` и все его потомки"""
+
+        # Диапазон вместо LIKE: индекс используется на любой базе
+        upper = path[:-1] + chr(ord(ID_SEPARATOR) + 1)
+        return self.filter(path__gte=path, path__lt=upper)
+
+    def move_node(
+        self,
+        node: 'Department',
+        target: 'Department | None',
+        position: str = 'last-child',
+    ) -> None:
+        # Запоминаем исходного родителя: после перемещения он уже недоступен
+        node._moved_from_parent_id = node.parent_id
+        super().move_node(node, target, position)
+
 
 class Department(MPTTModel):
     """Модель подразделения"""
@@ -23,12 +52,31 @@ class Department(MPTTModel):
         help_text=_('Родительское подразделение в иерархии'),
     )
 
+    # Материализованный путь от корня, включая само подразделение.
+    # Поддерживается в save() (в том числе при move_node) и массовыми
+    # операциями staff: seed_db, import_staff, reorganize()
+    path = models.CharField(
+        verbose_name=_('Путь (id)'), max_length=255, editable=False, default=''
+    )
+    name_path = models.TextField(verbose_name=_('Путь'), editable=False, default='')
+
+    objects = DepartmentManager()
+
     class MPTTMeta:
         order_insertion_by = ['name']
 
     class Meta:
         verbose_name = _('Подразделение')
         verbose_name_plural = _('Подразделения')
+        indexes = [
+            # Запросы вложенных множеств: потомки по (tree_id, lft), предки -
+            # по (tree_id, lft <= x) и (tree_id, rght >= y). Индекс (tree_id,
+            # lft), который mptt добавляет сам, в миграции не попадает
+            models.Index(fields=['tree_id', 'lft'], name='department_tree_lft_idx'),
+            models.Index(fields=['tree_id', 'rght'], name='department_tree_rght_idx'),
+            # Выборка поддерева по префиксу пути
+            models.Index(fields=['path'], name='department_path_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'parent'], name='unique_department_name_per_parent'
@@ -38,6 +86,54 @@ class Department(MPTTModel):
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs) -> None:
+        old_parent_id = self._mptt_cached_fields.get('parent')
+        if self.pk and old_parent_id != self.parent_id:
+            # Исходный родитель нужен для пересчёта агрегатов (staff.signals)
+            self._moved_from_parent_id = old_parent_id
+        # Пути и журнал изменений (staff.signals) пишутся в одной
+        # транзакции с самим подразделением
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            self.update_path()
+
+    def update_path(self) -> None:
+        """Пересчёт материализованного пути узла и его потомков"""
+
+        departments = Department.objects.db_manager(self._state.db)
+        stored = {
+            pk: (path, name_path)
+            for pk, path, name_path in departments.filter(
+                pk__in=[self.pk, self.parent_id]
+            ).values_list('id', 'path', 'name_path')
+        }
+        path, name_path = f'{self.pk}{ID_SEPARATOR}', self.name
+        if self.parent_id is not None:
+            parent_path, parent_names = stored[self.parent_id]
+            path = f'{parent_path}{path}'
+            name_path = f'{parent_names}{PATH_SEPARATOR}{name_path}'
+        old_path, old_name_path = stored[self.pk]
+        self.path, self.name_path = path, name_path
+        if (path, name_path) == (old_path, old_name_path):
+            return
+
+        if old_path:
+            # Потомки: замена префикса одним UPDATE
+            departments.under(old_path).exclude(pk=self.pk).update(
+                path=Concat(
+                    Value(path),
+                    Substr('path', len(old_path) + 1),
+                    output_field=CharField(),
+                ),
+                name_path=Concat(
+                    Value(name_path),
+                    Substr('name_path', len(old_name_path) + 1),
+                    output_field=TextField(),
+                ),
+            )
+        departments.filter(pk=self.pk).update(path=path, name_path=name_path)
+
 
 class Employee(models.Model):
     """Модель сотрудника"""
@@ -72,7 +168,14 @@ class Employee(models.Model):
     class Meta:
         verbose_name = _('Сотрудник')
         verbose_name_plural = _('Сотрудники')
-
+        indexes = [
+            # Keyset-пагинация сотрудников подразделения по (full_name, id)
+            models.Index(
+                fields=['department', 'full_name'], name='employee_dept_name_idx'
+            ),
+            # Префиксный поиск по должности (ФИО индексировано отдельно)
+            models.Index(fields=['position'], name='employee_position_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['full_name', 'department'],
@@ -82,3 +185,136 @@ class Employee(models.Model):
 
     def __str__(self) -> str:
         return f'{self.full_name} ({self.position})'
+
+    def save(self, *args, **kwargs) -> None:
+        # Журнал изменений (staff.signals) пишется в одной транзакции
+        # с самим сотрудником
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class DepartmentStats(models.Model):
+    """
+    Агрегаты по сотрудникам подразделения.
+
+    Прямые значения считаются по сотрудникам самого подразделения,
+    накопительные - по всему поддереву. Поддерживаются инкрементально
+    сигналами (см. staff.signals), полный пересчёт выполняет команда
+    rebuild_department_stats.
+    """
+
+    department = models.OneToOneField(
+        Department,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name=_('Подразделение'),
+    )
+    direct_count = models.PositiveIntegerField(
+        verbose_name=_('Сотрудников в подразделении'), default=0
+    )
+    direct_salary_sum = models.DecimalField(
+        verbose_name=_('Фонд оплаты подразделения'),
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+    )
+    cumulative_count = models.PositiveIntegerField(
+        verbose_name=_('Сотрудников всего'), default=0, db_index=True
+    )
+    salary_sum = models.DecimalField(
+        verbose_name=_('Фонд оплаты всего'),
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+    )
+    salary_min = models.DecimalField(
+        verbose_name=_('Минимальная зарплата'),
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+    )
+    salary_max = models.DecimalField(
+        verbose_name=_('Максимальная зарплата'),
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+    )
+
+    class Meta:
+        verbose_name = _('Статистика подразделения')
+        verbose_name_plural = _('Статистика подразделений')
+
+    def __str__(self) -> str:
+        return f'{self.department_id}: {self.cumulative_count}'
+
+    @property
+    def salary_avg(self) -> Decimal | None:
+        if not self.cumulative_count:
+            return None
+        return (self.salary_sum / self.cumulative_count).quantize(Decimal('0.01'))
+
+
+class Change(models.Model):
+    """
+    Запись журнала изменений подразделений и сотрудников.
+
+    Журнал только дополняется. Номер ``sequence`` выдаётся счётчиком
+    ChangeSequence в транзакции самого изменения, поэтому номера идут
+    без пропусков в порядке фиксации (см. staff.changelog).
+    """
+
+    class Kind(models.TextChoices):
+        DEPARTMENT = 'department', _('Подразделение')
+        EMPLOYEE = 'employee', _('Сотрудник')
+
+    class Action(models.TextChoices):
+        CREATE = 'create', _('Создание')
+        UPDATE = 'update', _('Изменение')
+        MOVE = 'move', _('Перемещение')
+        DELETE = 'delete', _('Удаление')
+
+    sequence = models.BigIntegerField(verbose_name=_('Номер'), primary_key=True)
+    kind = models.CharField(
+        verbose_name=_('Объект'), max_length=10, choices=Kind.choices
+    )
+    object_id = models.BigIntegerField(verbose_name=_('id объекта'))
+    action = models.CharField(
+        verbose_name=_('Действие'), max_length=6, choices=Action.choices
+    )
+    # Состояние после изменения, для удаления - последнее состояние
+    data = models.JSONField(
+        verbose_name=_('Данные'), encoder=DjangoJSONEncoder, default=dict
+    )
+    created_at = models.DateTimeField(verbose_name=_('Время'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Изменение')
+        verbose_name_plural = _('Журнал изменений')
+
+    def __str__(self) -> str:
+        return f'{self.sequence}: {self.action} {self.kind} {self.object_id}'
+
+
+class ChangeSequence(models.Model):
+    """
+    Счётчик номеров журнала изменений, единственная строка.
+
+    Строка блокируется до конца транзакции, выдавшей номера: транзакция
+    с большими номерами не может зафиксироваться раньше транзакции с
+    меньшими, и читатель журнала не пропустит запоздавшую запись.
+    """
+
+    # Последний выданный номер
+    last = models.BigIntegerField(default=0)
+    # Номер последней очистки журнала: читателям с меньшим номером
+    # нужна полная синхронизация
+    reset = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _('Счётчик журнала изменений')
+
+    def __str__(self) -> str:
+        return f'{self.last} (очищен на {self.reset})'
@@ -0,0 +1,144 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q, QuerySet
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Порядок, по которому строятся курсоры сотрудников
+KEYSET_ORDERING = ('full_name', 'id')
+
+
+def encode_cursor(position: tuple[str, int]) -> str:
+    """Курсор из ключа (full_name, id) последней отданной строки"""
+
+    raw = json.dumps(position, ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(encoded: str) -> tuple[str, int]:
+    """Ключ из курсора, ValueError - курсор некорректен"""
+
+    try:
+        full_name, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        return str(full_name), int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError(encoded) from None
+
+
+def after_position(queryset: QuerySet, position: tuple[str, int]) -> QuerySet:
+    """Строки строго после ключа в порядке KEYSET_ORDERING"""
+
+    full_name, pk = position
+    # Условие >= отдельно от OR: по нему база выбирает диапазон индекса
+    return queryset.filter(full_name__gte=full_name).filter(
+        Q(full_name__gt=full_name) | Q(id__gt=pk)
+    )
+
+
+class EmployeeKeysetPagination(BasePagination):
+    """
+    Keyset-пагинация сотрудников по (full_name, id).
+
+    Курсор хранит ключ последней отданной строки, следующая страница
+    выбирается условием по индексу (department_id, full_name) без OFFSET,
+    поэтому стоимость любой страницы не зависит от её номера.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: object = None
+    ) -> list:
+        queryset = self.page_queryset(queryset, request)
+        return self.finish_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset: QuerySet, request: Request) -> list:
+        """Асинхронный вариант paginate_queryset() для async-представлений"""
+
+        queryset = self.page_queryset(queryset, request)
+        return self.finish_page([obj async for obj in queryset])
+
+    def page_queryset(self, queryset: QuerySet, request: Request) -> QuerySet:
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*KEYSET_ORDERING)
+        if self.position is not None:
+            queryset = after_position(queryset, self.position)
+        # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+        return queryset[: self.limit + 1]
+
+    def finish_page(self, results: list) -> list:
+        self.has_next = len(results) > self.limit
+        results = results[: self.limit]
+        self.next_position = (
+            (results[-1].full_name, results[-1].id) if self.has_next else None
+        )
+        return results
+
+    def get_paginated_response(self, data: list) -> Response:
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self) -> str | None:
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position)
+        )
+
+    def encode_cursor(self, position: tuple[str, int]) -> str:
+        return encode_cursor(position)
+
+    def decode_cursor(self, request: Request) -> tuple[str, int] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return decode_cursor(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message) from None
+
+    def get_schema_operation_parameters(self, view: object) -> list:
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'schema': {'type': 'integer'},
+            },
+        ]
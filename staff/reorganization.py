@@ -0,0 +1,276 @@
+"""
+Пакетная реорганизация подразделений: перемещения и переименования.
+
+Перемещение через DepartmentAdmin или ``move_node()`` переписывает
+lft/rght большой части дерева на каждый узел. Здесь все изменения
+применяются к дереву в памяти, поля MPTT и пути затронутых деревьев
+пересчитываются один раз и записываются ``bulk_update`` только для
+изменившихся строк - как ``disable_mptt_updates()`` с последующим
+``partial_rebuild()``, но без построчных сохранений. Агрегаты и кэш
+пересчитываются один раз на всю пачку, перемещения и переименования
+пишутся в журнал изменений (staff.changelog) в той же транзакции.
+"""
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from .cache import invalidate_all
+from .changelog import record
+from .models import Change, Department
+from .stats import refresh_department_stats
+from .tree import nested_set_fields, path_fields
+
+NAME_LENGTH = 100
+MPTT_FIELDS = ('tree_id', 'lft', 'rght', 'level')
+FIELDS = ('parent_id', 'name', *MPTT_FIELDS, 'path', 'name_path')
+
+
+class ReorganizationError(ValueError):
+    """Недопустимый набор изменений"""
+
+
+@dataclass(frozen=True)
+class DepartmentChange:
+    """Перемещение и/или переименование подразделения"""
+
+    department_id: int
+    # Новый родитель при move=True, None - сделать подразделение корнем
+    parent_id: int | None = None
+    move: bool = False
+    name: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> 'DepartmentChange':
+        """Изменение из ``{"id": 1, "parent": 2, "name": "..."}``"""
+
+        if not isinstance(data, Mapping):
+            raise ReorganizationError('Ожидается объект с полем id')
+        department_id = data.get('id')
+        parent_id = data.get('parent')
+        name = data.get('name')
+        if not isinstance(department_id, int) or isinstance(department_id, bool):
+            raise ReorganizationError(f'Некорректный id: {department_id!r}')
+        if parent_id is not None and (
+            not isinstance(parent_id, int) or isinstance(parent_id, bool)
+        ):
+            raise ReorganizationError(f'Некорректный parent: {parent_id!r}')
+        if name is not None:
+            if not isinstance(name, str) or not name.strip():
+                raise ReorganizationError(f'Некорректное название: {name!r}')
+            name = name.strip()
+            if len(name) > NAME_LENGTH:
+                raise ReorganizationError(
+                    f'Название длиннее {NAME_LENGTH} символов: {name}'
+                )
+        if 'parent' not in data and name is None:
+            raise ReorganizationError(
+                f'Нет изменений для подразделения {department_id}'
+            )
+        return cls(department_id, parent_id, 'parent' in data, name)
+
+
+@dataclass
+class ReorganizationResult:
+    moved: int
+    renamed: int
+    # Переписанные строки staff_department
+    updated: int
+    # Итоговые tree_id затронутых деревьев
+    tree_ids: list[int]
+
+
+def reorganize(
+    changes: Iterable[DepartmentChange], dry_run: bool = False
+) -> ReorganizationResult:
+    """
+    Применение изменений одной транзакцией.
+
+    Изменения применяются по порядку, повтор подразделения перекрывает
+    предыдущие. Набор проверяется целиком: циклы и совпадение названий
+    у соседей отклоняют его без изменений в базе. Соседи упорядочиваются
+    по названию (``order_insertion_by``), корни нумеруются по названию.
+    С филиалами (STAFF_TREE_SHARDS) не выполняется: изменения применяются
+    в одной базе, а подразделения набора могут быть в разных.
+    """
+
+    if settings.STAFF_TREE_SHARDS:
+        raise ReorganizationError(
+            'Команда работает только с одной базой: уберите STAFF_TREE_SHARDS'
+        )
+    changes = list(changes)
+    with transaction.atomic():
+        return _reorganize(changes, dry_run)
+
+
+def _reorganize(changes: list[DepartmentChange], dry_run: bool) -> ReorganizationResult:
+    ids = {change.department_id for change in changes}
+    ids |= {change.parent_id for change in changes if change.move} - {None}
+    touched = dict(
+        Department.objects.select_for_update()
+        .filter(pk__in=ids)
+        .values_list('id', 'tree_id')
+    )
+    missing = ids - touched.keys()
+    if missing:
+        raise ReorganizationError(
+            f'Подразделения не найдены: {", ".join(map(str, sorted(missing)))}'
+        )
+
+    affected = set(touched.values())
+    current = {}
+    nodes = {}
+    for pk, parent_id, name, *fields in (
+        Department.objects.select_for_update()
+        .filter(tree_id__in=affected)
+        .values_list('id', *FIELDS)
+    ):
+        current[pk] = (parent_id, name, *fields)
+        nodes[pk] = (parent_id, name)
+
+    moved, renamed = set(), set()
+    # Прежние родители перемещаемых: их предки теряют сотрудников поддерева
+    sources = set()
+    for change in changes:
+        parent_id, name = nodes[change.department_id]
+        if change.move:
+            sources.add(current[change.department_id][0])
+            parent_id = change.parent_id
+            moved.add(change.department_id)
+        if change.name is not None:
+            name = change.name
+            renamed.add(change.department_id)
+        nodes[change.department_id] = (parent_id, name)
+    _validate(nodes, moved, renamed)
+
+    # Корни нетронутых деревьев нужны только для нумерации tree_id
+    roots = [
+        (name, tree_id, pk)
+        for pk, name, tree_id in Department.objects.filter(parent=None)
+        .exclude(tree_id__in=affected)
+        .values_list('id', 'name', 'tree_id')
+    ]
+    roots += [
+        (name, current[pk][2], pk)
+        for pk, (parent_id, name) in nodes.items()
+        if parent_id is None
+    ]
+    tree_ids = {pk: tree_id for tree_id, (*_, pk) in enumerate(sorted(roots), start=1)}
+    shifted = {
+        old: tree_ids[pk]
+        for _, old, pk in roots
+        if pk not in nodes and tree_ids[pk] != old
+    }
+
+    fields = nested_set_fields(nodes, tree_ids)
+    paths = path_fields(nodes)
+    # Строки группируются по набору изменившихся полей: у большинства
+    # меняются только lft/rght, и CASE для остальных полей не нужен
+    changed = {}
+    for pk, (parent_id, name) in nodes.items():
+        row = (parent_id, name, *fields[pk], *paths[pk])
+        names = tuple(
+            field
+            for field, old, new in zip(FIELDS, current[pk], row, strict=True)
+            if old != new
+        )
+        if names:
+            changed.setdefault(names, []).append(
+                Department(id=pk, **dict(zip(FIELDS, row, strict=True)))
+            )
+    result = ReorganizationResult(
+        moved=len(moved),
+        renamed=len(renamed),
+        updated=sum(map(len, changed.values())),
+        tree_ids=sorted(
+            tree_ids[pk] for pk, (parent_id, _) in nodes.items() if parent_id is None
+        ),
+    )
+    if dry_run:
+        return result
+
+    if shifted:
+        # Сдвиг нетронутых деревьев одним UPDATE: CASE вычисляется по старому
+        # значению каждой строки, поэтому обмен номерами безопасен
+        result.updated += Department.objects.filter(tree_id__in=shifted).update(
+            tree_id=Case(
+                *(When(tree_id=old, then=Value(new)) for old, new in shifted.items())
+            )
+        )
+    for names, departments in changed.items():
+        Department.objects.bulk_update(departments, names, batch_size=1000)
+    _log_changes(current, nodes, moved | renamed)
+    if moved:
+        # Прямые агрегаты при перемещении не меняются: пересчитываются
+        # только цепочки предков прежних и новых родителей
+        refresh_department_stats(
+            _ancestors(nodes, sources | {nodes[pk][0] for pk in moved})
+        )
+    # Как в invalidate_departments: сейчас и ещё раз после фиксации
+    invalidate_all()
+    transaction.on_commit(invalidate_all)
+    return result
+
+
+def _validate(
+    nodes: Mapping[int, tuple[int | None, str]], moved: set[int], renamed: set[int]
+) -> None:
+    for pk in moved:
+        seen = set()
+        parent_id = nodes[pk][0]
+        while parent_id is not None and parent_id not in seen:
+            if parent_id == pk:
+                raise ReorganizationError(
+                    f'Подразделение {pk} нельзя переместить в собственное поддерево'
+                )
+            seen.add(parent_id)
+            parent_id = nodes[parent_id][0]
+
+    # Корни уникальностью названий не ограничены (NULL в ограничении)
+    siblings = {}
+    for pk in moved | renamed:
+        parent_id, name = nodes[pk]
+        if parent_id is not None:
+            siblings.setdefault(parent_id, set()).add(name)
+    taken = {}
+    for pk, (parent_id, name) in nodes.items():
+        if name in siblings.get(parent_id, ()):
+            other = taken.setdefault((parent_id, name), pk)
+            if other != pk:
+                raise ReorganizationError(
+                    f'У подразделения {parent_id} два дочерних "{name}": {other} и {pk}'
+                )
+
+
+def _log_changes(
+    current: Mapping[int, tuple],
+    nodes: Mapping[int, tuple[int | None, str]],
+    department_ids: set[int],
+) -> None:
+    moves, updates = [], []
+    for pk in sorted(department_ids):
+        old_parent_id, old_name = current[pk][:2]
+        parent_id, name = nodes[pk]
+        data = {'name': name, 'parent_id': parent_id}
+        if parent_id != old_parent_id:
+            moves.append((pk, {**data, 'moved_from': old_parent_id}))
+        elif name != old_name:
+            updates.append((pk, data))
+    record(Change.Kind.DEPARTMENT, Change.Action.MOVE, moves)
+    record(Change.Kind.DEPARTMENT, Change.Action.UPDATE, updates)
+
+
+def _ancestors(
+    nodes: Mapping[int, tuple[int | None, str]], department_ids: set[int | None]
+) -> set[int]:
+    """Подразделения и все их предки в итоговом дереве"""
+
+    result = set()
+    for pk in department_ids:
+        while pk is not None and pk not in result:
+            result.add(pk)
+            pk = nodes[pk][0]
+    return result
@@ -0,0 +1,226 @@
+"""
+Чтение из реплик основной базы для нагруженных представлений.
+
+Представления, помеченные ``replica_reads`` (главная страница, узлы
+дерева, аналитика), читают модели staff из реплики из
+``STAFF_DB_REPLICAS``, выбранной на время запроса. Остальные запросы
+и любые записи идут в default. Реплика отстаёт от основной базы,
+поэтому в основную базу читают:
+
+- запросы после записи: весь остаток запроса и следующие
+  ``STAFF_REPLICA_LAG_SECONDS`` секунд сессии (cookie), чтобы
+  пользователь видел свои изменения;
+- чтения внутри транзакции default;
+- ответы, которые будут закэшированы вскоре после инвалидации
+  (``fresh_reads()`` в staff.cache): иначе в кэш под новым
+  поколением попадут данные, ещё не дошедшие до реплики.
+
+Реплики относятся только к default: деревья в базах филиалов
+(staff.sharding) читаются из своих баз.
+"""
+
+import random
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .sharding import current_database
+
+PIN_COOKIE = 'staff_primary'
+
+
+@dataclass
+class _ReplicaState:
+    # Реплика запроса, None - читать из default
+    alias: str | None = None
+    # В запросе была запись моделей staff
+    wrote: bool = False
+    # Внутри primary_reads()
+    primary: bool = False
+
+
+# Состояние текущего запроса. Хранится изменяемый объект: process_view
+# под ASGI выполняется в копии контекста
+_state: ContextVar[_ReplicaState | None] = ContextVar('staff_replica', default=None)
+# Реплика -> время (monotonic), до которого она считается недоступной
+_unavailable: dict[str, float] = {}
+
+
+def replicas_enabled() -> bool:
+    return bool(settings.STAFF_DB_REPLICAS)
+
+
+def replica_reads(view: Callable) -> Callable:
+    """Пометка функции-представления: модели staff читаются из реплики"""
+
+    view.replica_reads = True
+    return view
+
+
+def _reads_from_replica(view_func: Callable) -> bool:
+    # У представлений-классов пометка - атрибут класса
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_func, 'replica_reads', False) or getattr(
+        view_class, 'replica_reads', False
+    )
+
+
+def choose_replica() -> str | None:
+    """
+    Случайная доступная реплика.
+
+    Соединение проверяется сразу: недоступная реплика пропускается на
+    ``STAFF_REPLICA_RETRY_SECONDS``, без реплик чтение идёт в default.
+    """
+
+    now = time.monotonic()
+    candidates = [
+        alias
+        for alias in settings.STAFF_DB_REPLICAS
+        if _unavailable.get(alias, 0) <= now
+    ]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            _unavailable[alias] = now + settings.STAFF_REPLICA_RETRY_SECONDS
+            continue
+        return alias
+    return None
+
+
+@contextmanager
+def primary_reads() -> Iterator[None]:
+    """Чтения внутри блока идут в default"""
+
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = previous
+
+
+class ReplicaRouter:
+    """
+    Чтение моделей staff из реплики текущего запроса.
+
+    Стоит в DATABASE_ROUTERS перед TreeShardRouter: если реплика не
+    выбрана, решение остаётся за маршрутизатором филиалов.
+    """
+
+    def db_for_read(self, model: type[Model], **hints) -> str | None:
+        state = _state.get()
+        if (
+            state is None
+            or state.alias is None
+            or state.wrote
+            or state.primary
+            or model._meta.app_label != 'staff'
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return None
+        return state.alias
+
+    def db_for_write(self, model: type[Model], **hints) -> str | None:
+        state = _state.get()
+        if state is not None and model._meta.app_label == 'staff':
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1: Model, obj2: Model, **hints) -> bool | None:
+        # Объекты из реплики и из default - одни и те же строки
+        group = {DEFAULT_DB_ALIAS, *settings.STAFF_DB_REPLICAS}
+        if obj1._state.db in group and obj2._state.db in group:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, **hints) -> bool | None:
+        # Схема реплик приходит с репликацией
+        if db in settings.STAFF_DB_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Выбор реплики для помеченных представлений и закрепление сессии
+    за default после записи.
+
+    Отключается, если ``STAFF_DB_REPLICAS`` пуст. Стоит после
+    TreeShardMiddleware: реплика выбирается, только если дерево
+    запроса живёт в default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        if not replicas_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.async_mode:
+            return self.__acall__(request)
+        state = _ReplicaState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin(state, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        state = _ReplicaState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._pin(state, response)
+
+    def _pin(self, state: _ReplicaState, response: HttpResponse) -> HttpResponse:
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.STAFF_REPLICA_LAG_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(
+        self,
+        request: HttpRequest,
+        view_func: Callable,
+        view_args: list,
+        view_kwargs: dict,
+    ) -> None:
+        state = _state.get()
+        if (
+            state is None
+            or PIN_COOKIE in request.COOKIES
+            or not _reads_from_replica(view_func)
+            or current_database() not in (None, DEFAULT_DB_ALIAS)
+        ):
+            return
+        state.alias = choose_replica()
@@ -0,0 +1,80 @@
+import re
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .models import Department, Employee
+from .tree import department_paths
+
+# Минимальная длина слова в полнотекстовом индексе InnoDB
+# (innodb_ft_min_token_size); более короткие запросы ищутся по префиксу
+FULLTEXT_MIN_TOKEN = 3
+FULLTEXT_SPECIAL = re.compile(r'[+\-<>()~*"@]+')
+
+
+def _fulltext_query(query: str) -> str | None:
+    """Запрос BOOLEAN MODE: каждое слово обязательно и ищется по префиксу"""
+
+    words = FULLTEXT_SPECIAL.sub(' ', query).split()
+    if not words or any(len(word) < FULLTEXT_MIN_TOKEN for word in words):
+        return None
+    return ' '.join(f'+{word}*' for word in words)
+
+
+def _match(queryset: QuerySet, query: str) -> QuerySet:
+    fulltext = _fulltext_query(query) if connection.vendor == 'mysql' else None
+    if fulltext is None:
+        # Префиксный LIKE использует B-tree индексы по full_name и position
+        return queryset.filter(
+            Q(full_name__istartswith=query) | Q(position__istartswith=query)
+        ).order_by('full_name', 'id')
+
+    relevance = RawSQL(
+        'MATCH (staff_employee.full_name, staff_employee.position) '
+        'AGAINST (%s IN BOOLEAN MODE)',
+        [fulltext],
+    )
+    return (
+        queryset.annotate(relevance=relevance)
+        .filter(relevance__gt=0)
+        .order_by('-relevance', 'full_name', 'id')
+    )
+
+
+def search_employees(
+    query: str, root: Department | None = None, limit: int = 20
+) -> list[dict]:
+    """
+    Поиск сотрудников по ФИО и должности.
+
+    На MariaDB/MySQL используется полнотекстовый индекс с поиском по
+    префиксам слов, на остальных базах и для коротких запросов - префикс
+    ФИО или должности. ``root`` ограничивает поиск поддеревом.
+    Каждый результат содержит путь до подразделения от корня.
+    """
+
+    query = query.strip()
+    if not query:
+        return []
+
+    employees = Employee.objects.select_related('department')
+    if root is not None:
+        employees = employees.filter(
+            department__tree_id=root.tree_id,
+            department__lft__gte=root.lft,
+            department__rght__lte=root.rght,
+        )
+    employees = list(_match(employees, query)[:limit])
+    paths = department_paths([employee.department for employee in employees])
+
+    return [
+        {
+            'id': employee.id,
+            'full_name': employee.full_name,
+            'position': employee.position,
+            'department_id': employee.department_id,
+            'path': paths[employee.department_id],
+        }
+        for employee in employees
+    ]
@@ -0,0 +1,366 @@
+"""
+Генерация тестовой структуры компании.
+
+Дерево подразделений строится целиком в памяти вместе со значениями
+nested set (lft/rght/level/tree_id) и вставляется одним bulk_create,
+без пересчёта MPTT на каждую запись. Сотрудники генерируются пакетами
+из заранее подготовленных словарей имён и должностей; каждый пакет
+детерминирован своим номером и общим seed, поэтому пакеты можно
+готовить в пуле процессов параллельно со вставкой (generated_batches).
+Сгенерированные данные в журнал изменений не пишутся: журнал очищается
+вместе со старыми данными.
+"""
+
+import multiprocessing
+import random
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, timedelta
+from itertools import count
+
+from django.db import connection, transaction
+
+from faker import Faker
+
+from .changelog import reset_changes
+from .models import Department, DepartmentStats, Employee
+from .tree import path_fields
+
+LOCATIONS = [
+    'Головной офис (Москва)',
+    'Филиал "Северо-Запад" (Санкт-Петербург)',
+    'Филиал "Поволжье" (Нижний Новгород)',
+    'Филиал "Сибирь" (Новосибирск)',
+    'Технологический хаб (Иннополис)',
+]
+
+STRUCTURE_MAP = {
+    'Блок Информационных Технологий': {
+        'Дирекция Разработки ПО': [
+            'Отдел Backend разработки',
+            'Отдел Frontend разработки',
+            'Отдел мобильной разработки',
+            'Отдел QA и автоматизации',
+            'Отдел архитектуры',
+        ],
+        'Дирекция Инфраструктуры': [
+            'Отдел DevOps',
+            'Отдел системного администрирования',
+            'Отдел баз данных',
+            'Отдел технической поддержки',
+        ],
+        'Дирекция Аналитики': [
+            'Отдел системного анализа',
+            'Отдел Data Science',
+            'Отдел BI отчетности',
+        ],
+    },
+    'Финансовый Блок': {
+        'Департамент Бухгалтерии': [
+            'Отдел расчета зарплаты',
+            'Отдел работы с поставщиками',
+            'Отдел основных средств',
+            'Отдел налогового учета',
+        ],
+        'Департамент Планирования': [
+            'Отдел бюджетирования',
+            'Отдел финансового контроля',
+            'Отдел инвестиционного анализа',
+        ],
+    },
+    'Блок Управления Персоналом (HR)': {
+        'Дирекция по подбору': [
+            'Отдел IT-рекрутмента',
+            'Отдел массового подбора',
+            'Отдел Executive Search',
+        ],
+        'Дирекция развития талантов': [
+            'Отдел обучения',
+            'Отдел корпоративной культуры',
+            'Отдел кадрового резерва',
+        ],
+    },
+    'Коммерческий Блок': {
+        'Департамент B2B продаж': [
+            'Отдел по работе с ключевыми клиентами',
+            'Отдел тендерных продаж',
+            'Отдел регионального развития',
+        ],
+        'Департамент Маркетинга': [
+            'Отдел Digital-маркетинга',
+            'Отдел PR и коммуникаций',
+            'Отдел продуктового маркетинга',
+        ],
+    },
+}
+
+GROUP_PREFIXES = ['Группа', 'Сектор', 'Команда']
+PROJECT_NAMES = ['Альфа', 'Бета', 'Гамма', 'Омега', 'Феникс', 'Прайм', 'Кор', 'Легаси']
+
+POSITIONS = {
+    'entry': ['Стажер', 'Младший специалист', 'Специалист', 'Ассистент'],
+    'mid': ['Ведущий специалист', 'Старший специалист', 'Инженер', 'Менеджер'],
+    'senior': [
+        'Главный специалист',
+        'Эксперт',
+        'Руководитель группы',
+        'Архитектор',
+    ],
+}
+
+# Доли сотрудников: нижний уровень, предпоследний уровень, остальные
+TIER_WEIGHTS = (0.8, 0.15, 0.05)
+HIRE_PERIOD_DAYS = 3652
+POOL_DRAWS = 3000
+# Сколько пакетов на процесс генерируется впрок, пока идёт вставка
+PREFETCH_PER_WORKER = 2
+
+
+def child_names(path: list[str], fanout: int | None, rng: random.Random) -> list[str]:
+    """Названия дочерних подразделений для узла с путём ``path``"""
+
+    if len(path) == 1:
+        return list(STRUCTURE_MAP)
+    if len(path) == 2:
+        return list(STRUCTURE_MAP[path[1]])
+    if len(path) == 3:
+        return list(STRUCTURE_MAP[path[1]][path[2]])
+
+    names = []
+    for i in range(fanout or rng.randint(2, 5)):
+        prefix = rng.choice(GROUP_PREFIXES)
+        if 'IT' in path[1] or 'Разработки' in path[2]:
+            # IT-шные названия групп
+            names.append(f'{prefix} проекта {rng.choice(PROJECT_NAMES)}-{i + 1}')
+        else:
+            # Обычные названия
+            names.append(f'{prefix} №{i + 1}')
+    return names
+
+
+def build_departments(
+    depth: int = 5, fanout: int | None = None, rng: random.Random | None = None
+) -> list[Department]:
+    """
+    Построение дерева подразделений в памяти.
+
+    Возвращает несохранённые объекты с заполненными id, полями MPTT
+    и материализованными путями.
+    Порядок соседей и tree_id корней соответствует
+    ``order_insertion_by = ['name']``.
+    """
+
+    rng = rng or random.Random()
+    departments = []
+    ids = count(1)
+
+    def add(path: list[str], parent_id: int | None, tree_id: int, left: int) -> int:
+        level = len(path) - 1
+        department = Department(
+            id=next(ids),
+            name=path[-1],
+            parent_id=parent_id,
+            tree_id=tree_id,
+            level=level,
+            lft=left,
+        )
+        departments.append(department)
+
+        right = left + 1
+        if level + 1 < depth:
+            for name in sorted(child_names(path, fanout, rng)):
+                right = add([*path, name], department.id, tree_id, right) + 1
+        department.rght = right
+        return right
+
+    for tree_id, name in enumerate(sorted(LOCATIONS), start=1):
+        add([name], None, tree_id, 1)
+
+    paths = path_fields({d.id: (d.parent_id, d.name) for d in departments})
+    for department in departments:
+        department.path, department.name_path = paths[department.id]
+    return departments
+
+
+class EmployeeGenerator:
+    """
+    Генератор пакетов сотрудников.
+
+    Словари имён и должностей готовятся один раз, дальше каждая строка
+    собирается несколькими выборками из них. Пакет с номером ``index``
+    зависит только от ``seed`` и номера, поэтому результат
+    воспроизводим независимо от того, кто и в каком порядке его создаёт.
+    Строки пакета - кортежи (full_name, position, hire_date, salary,
+    department_id).
+    """
+
+    def __init__(self, departments: list[Department], seed: int | None = None) -> None:
+        self.seed = random.randrange(2**32) if seed is None else seed
+        self.today = date.today()
+
+        max_level = max(department.level for department in departments)
+        self.leaf_ids = [d.id for d in departments if d.level == max_level]
+        self.mid_ids = [d.id for d in departments if d.level == max_level - 1]
+        self.top_ids = [d.id for d in departments if d.level < max_level - 1]
+        self.root_ids = {d.id for d in departments if d.level == 0}
+        # На мелких деревьях часть уровней может отсутствовать
+        self.mid_ids = self.mid_ids or self.leaf_ids
+        self.top_ids = self.top_ids or self.mid_ids
+
+        fake = Faker('ru_RU')
+        fake.seed_instance(self.seed)
+        self.male_names = self._pool(
+            fake.last_name_male, fake.first_name_male, fake.middle_name_male
+        )
+        self.female_names = self._pool(
+            fake.last_name_female, fake.first_name_female, fake.middle_name_female
+        )
+        self.jobs = sorted({fake.job() for _ in range(POOL_DRAWS)})
+
+    @staticmethod
+    def _pool(*parts: Callable[[], str]) -> tuple[list[str], ...]:
+        return tuple(sorted({part() for _ in range(POOL_DRAWS)}) for part in parts)
+
+    def batch(self, index: int, size: int) -> list[tuple]:
+        rng = random.Random(f'{self.seed}:{index}')
+        tiers = rng.choices(range(len(TIER_WEIGHTS)), weights=TIER_WEIGHTS, k=size)
+        genders = rng.choices((self.male_names, self.female_names), k=size)
+        hire_offsets = [rng.randrange(HIRE_PERIOD_DAYS) for _ in range(size)]
+
+        rows = []
+        for tier, names, offset in zip(tiers, genders, hire_offsets, strict=True):
+            last_names, first_names, middle_names = names
+            full_name = (
+                f'{rng.choice(last_names)} {rng.choice(first_names)} '
+                f'{rng.choice(middle_names)}'
+            )
+            if tier == 0:
+                department_id = rng.choice(self.leaf_ids)
+                salary = rng.randint(40000, 120000)
+                position = f'{rng.choice(POSITIONS["entry"])} {rng.choice(self.jobs)}'
+            elif tier == 1:
+                department_id = rng.choice(self.mid_ids)
+                salary = rng.randint(90000, 200000)
+                position = rng.choice(POSITIONS['mid'])
+            else:
+                department_id = rng.choice(self.top_ids)
+                salary = rng.randint(200000, 800000)
+                position = (
+                    'Директор филиала'
+                    if department_id in self.root_ids
+                    else 'Начальник подразделения'
+                )
+            hire_date = self.today - timedelta(days=offset)
+            rows.append((full_name, position, hire_date, salary, department_id))
+        return rows
+
+    @staticmethod
+    def plan(total: int, batch_size: int, start: int = 0) -> Iterator[tuple[int, int]]:
+        """Номера и размеры пакетов на ``total`` строк, начиная с номера ``start``"""
+
+        for offset in range(0, total, batch_size):
+            yield start + offset // batch_size, min(batch_size, total - offset)
+
+    def batches(self, total: int, batch_size: int, start: int = 0) -> Iterator[list]:
+        """Пакеты на ``total`` строк, нумерация пакетов начинается со ``start``"""
+
+        for index, size in self.plan(total, batch_size, start):
+            yield self.batch(index, size)
+
+
+# Генератор в процессе пула: передаётся при fork один раз, а не с каждым пакетом
+_worker_generator: EmployeeGenerator | None = None
+
+
+def _init_worker(generator: EmployeeGenerator) -> None:
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _worker_batch(index: int, size: int) -> list[tuple]:
+    return _worker_generator.batch(index, size)
+
+
+def generated_batches(
+    generator: EmployeeGenerator,
+    total: int,
+    batch_size: int,
+    workers: int = 1,
+    start: int = 0,
+) -> Iterator[list[tuple]]:
+    """
+    Пакеты ``generator.batches()``, сгенерированные в ``workers`` процессах.
+
+    Пакеты отдаются строго по порядку номеров, поэтому строки и порядок
+    вставки при заданном seed не зависят от числа процессов. Впрок
+    готовится не больше ``PREFETCH_PER_WORKER * workers`` пакетов: пока
+    вызывающий код пишет пакет в базу, процессы генерируют следующие, а
+    память ограничена этим окном.
+
+    Процессы создаются через fork: они наследуют генератор и не
+    обращаются к базе (унаследованные соединения не используются и не
+    закрываются - процесс пула завершается через os._exit).
+    """
+
+    if workers <= 1:
+        yield from generator.batches(total, batch_size, start)
+        return
+
+    pending: deque[Future] = deque()
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+        initargs=(generator,),
+    ) as pool:
+        try:
+            for index, size in generator.plan(total, batch_size, start):
+                if len(pending) >= PREFETCH_PER_WORKER * workers:
+                    yield pending.popleft().result()
+                pending.append(pool.submit(_worker_batch, index, size))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Вставка прервана: готовить оставшиеся пакеты незачем
+            for future in pending:
+                future.cancel()
+
+
+def insert_employees(rows: list[tuple], batch_size: int) -> None:
+    """Вставка пакета строк; дубликаты (ФИО в подразделении) пропускаются"""
+
+    Employee.objects.bulk_create(
+        [
+            Employee(
+                full_name=full_name,
+                position=position,
+                hire_date=hire_date,
+                salary=salary,
+                department_id=department_id,
+            )
+            for full_name, position, hire_date, salary, department_id in rows
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def wipe_staff_data() -> None:
+    """
+    Удаление всех подразделений и сотрудников.
+
+    Выполняется прямыми DELETE: удаление через ORM при подключённых
+    сигналах загружает и обрабатывает каждую строку отдельно. Журнал
+    изменений очищается: потребителям нужна полная синхронизация.
+    """
+
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in (DepartmentStats, Employee):
+            cursor.execute(f'DELETE FROM {quote(model._meta.db_table)}')
+        # Самоссылающийся внешний ключ проверяется построчно
+        table = quote(Department._meta.db_table)
+        cursor.execute(f'UPDATE {table} SET {quote("parent_id")} = NULL')
+        cursor.execute(f'DELETE FROM {table}')
+        reset_changes()
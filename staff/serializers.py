@@ -1,27 +1,59 @@
+from django.db.models import QuerySet
+from django.db.models.functions import Coalesce
+
 from rest_framework import serializers
 
-from .models import Department, Employee
+from .columnar import EMPLOYEE_COLUMNS, employee_columns
+from .instrumentation import TimedListSerializer, TimedSerializerMixin
+from .models import Department, DepartmentStats, Employee
+from .stats import with_rollup
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Employee
         fields = ['id', 'full_name', 'position', 'salary', 'hire_date']
+        list_serializer_class = TimedListSerializer
+
+
+def department_children(department: Department) -> QuerySet:
+    """
+    Дочерние подразделения для DepartmentSerializer одним запросом.
+
+    Число сотрудников и итоги поддерева берутся из агрегатов (LEFT JOIN),
+    признак наличия детей считается по lft/rght без запросов.
+    """
+
+    return with_rollup(department.get_children()).annotate(
+        employee_count=Coalesce('stats__direct_count', 0)
+    )
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Добавляем поле, чтобы фронтенд знал, рисовать ли "плюс"
     has_children = serializers.SerializerMethodField()
+    # Аннотации из department_children()
+    employee_count = serializers.IntegerField(read_only=True)
+    headcount = serializers.IntegerField(read_only=True)
+    payroll = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
 
     class Meta:
         model = Department
-        fields = ['id', 'name', 'has_children']
+        fields = [
+            'id',
+            'name',
+            'has_children',
+            'employee_count',
+            'headcount',
+            'payroll',
+        ]
+        list_serializer_class = TimedListSerializer
 
     def get_has_children(self, obj: Department) -> bool:
-        return not obj.is_leaf_node()
+        return obj.rght - obj.lft > 1
 
 
-class DepartmentDetailsSerializer(serializers.ModelSerializer):
+class DepartmentDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
     employees = serializers.SerializerMethodField()
 
@@ -29,9 +61,53 @@ class DepartmentDetailsSerializer(serializers.ModelSerializer):
         model = Department
         fields = ['children', 'employees']
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Сотрудников можно получать постранично отдельным запросом
+        if not self.context.get('include_employees', True):
+            self.fields.pop('employees')
+
     def get_children(self, obj: Department):
-        children = obj.get_children()
-        return DepartmentSerializer(children, many=True).data
+        return DepartmentSerializer(department_children(obj), many=True).data
 
     def get_employees(self, obj: Department):
+        if self.context.get('columnar'):
+            return employee_columns(obj.employees.values_list(*EMPLOYEE_COLUMNS))
         return EmployeeSerializer(obj.employees.all(), many=True).data
+
+
+class DepartmentStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    salary_avg = serializers.DecimalField(
+        max_digits=16, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = DepartmentStats
+        fields = [
+            'direct_count',
+            'direct_salary_sum',
+            'cumulative_count',
+            'salary_sum',
+            'salary_min',
+            'salary_max',
+            'salary_avg',
+        ]
+
+
+class BranchSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Подразделение в списке крупнейших: итоги поддерева из with_rollup()
+    и путь от корня из контекста (``paths``)
+    """
+
+    headcount = serializers.IntegerField(read_only=True)
+    payroll = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
+    path = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Department
+        fields = ['id', 'name', 'level', 'headcount', 'payroll', 'path']
+        list_serializer_class = TimedListSerializer
+
+    def get_path(self, obj: Department) -> list[dict]:
+        return self.context['paths'][obj.pk]
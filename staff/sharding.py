@@ -0,0 +1,209 @@
+"""
+Размещение деревьев подразделений в отдельных базах.
+
+Дерево - филиал верхнего уровня - живёт целиком (подразделения,
+сотрудники, агрегаты) в базе из ``STAFF_TREE_SHARDS``, остальные
+деревья - в default. Запросы вложенных множеств всегда ограничены
+одним деревом, поэтому переносу дерева запросы не мешают:
+TreeShardRouter направляет запросы моделей staff в базу дерева
+текущего запроса. Дерево определяется по подразделению из URL
+(TreeShardMiddleware) или задаётся явно через ``using_root()``.
+
+Деревья задаются id корневого подразделения, а не tree_id: django-mptt
+вставляет корни по названию (``order_insertion_by``) и сдвигает tree_id
+остальных деревьев базы. id подразделений и сотрудников должны быть
+уникальны между базами (непересекающиеся диапазоны автоинкремента), это
+проверяет staff.checks. Массовые команды (seed_db, import_staff,
+reorganize_departments) с филиалами не запускаются.
+"""
+
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .models import Department, DepartmentStats, Employee
+
+# База дерева текущего запроса. Хранится изменяемый список, а не сама
+# строка: process_view под ASGI выполняется в копии контекста
+_current: ContextVar[list[str | None] | None] = ContextVar(
+    'staff_tree_database', default=None
+)
+
+
+def database_for_root(root_id: int | None) -> str:
+    """База дерева с корневым подразделением ``root_id``"""
+
+    return settings.STAFF_TREE_SHARDS.get(root_id, DEFAULT_DB_ALIAS)
+
+
+def tree_databases() -> list[str]:
+    """default и базы филиалов"""
+
+    shards = sorted(set(settings.STAFF_TREE_SHARDS.values()) - {DEFAULT_DB_ALIAS})
+    return [DEFAULT_DB_ALIAS, *shards]
+
+
+def current_database() -> str | None:
+    """База дерева текущего запроса, если она уже определена"""
+
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def using_database(alias: str) -> Iterator[None]:
+    """Запросы моделей staff внутри блока идут в базу ``alias``"""
+
+    token = _current.set([alias])
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def using_root(root_id: int) -> AbstractContextManager[None]:
+    """Запросы моделей staff внутри блока идут в базу дерева ``root_id``"""
+
+    return using_database(database_for_root(root_id))
+
+
+def department_database(pk: int) -> str | None:
+    """
+    База, в которой находится подразделение ``pk``.
+
+    Базы перебираются по порядку - по запросу по первичному ключу на
+    базу; без филиалов запросов нет вовсе.
+    """
+
+    if not settings.STAFF_TREE_SHARDS:
+        return DEFAULT_DB_ALIAS
+    for alias in tree_databases():
+        if Department.objects.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+def keep_database(chunks: Iterator[str]) -> Iterator[str]:
+    """
+    Потоковый ответ, читающий из базы текущего запроса.
+
+    Тело StreamingHttpResponse читается уже после выхода из middleware,
+    когда база запроса сброшена.
+    """
+
+    current = _current.get()
+    if not current or not current[0]:
+        return chunks
+    return _in_database(chunks, current[0])
+
+
+def _in_database(chunks: Iterator[str], alias: str) -> Iterator[str]:
+    while True:
+        token = _current.set([alias])
+        try:
+            chunk = next(chunks, None)
+        finally:
+            _current.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+class TreeShardRouter:
+    """
+    Маршрутизация моделей staff по дереву.
+
+    База берётся из текущего запроса (``using_root()``, middleware), без
+    контекста - по экземпляру: прочитанное подразделение остаётся в своей
+    базе, корень идёт в базу своего дерева, новое подразделение - в базу
+    родителя, сотрудник и агрегаты - в базу своего подразделения. Если
+    ничего не известно, решение остаётся за Django (база экземпляра или
+    default).
+    """
+
+    def _database(self, model: type[Model], **hints) -> str | None:
+        if model._meta.app_label != 'staff' or not settings.STAFF_TREE_SHARDS:
+            return None
+        if current := current_database():
+            return current
+        instance = hints.get('instance')
+        if isinstance(instance, Department):
+            return self._department_database(instance)
+        if isinstance(instance, Employee | DepartmentStats):
+            field = instance._meta.get_field('department')
+            if field.is_cached(instance):
+                return self._department_database(instance.department)
+            # Прочитанный экземпляр остаётся в своей базе
+            if instance._state.db or instance.department_id is None:
+                return None
+            return department_database(instance.department_id)
+        return None
+
+    def _department_database(self, department: Department) -> str | None:
+        if department._state.db:
+            return department._state.db
+        if department.parent_id is None:
+            return database_for_root(department.pk)
+        field = department._meta.get_field('parent')
+        if field.is_cached(department):
+            return self._department_database(department.parent)
+        return department_database(department.parent_id)
+
+    db_for_read = _database
+    db_for_write = _database
+
+
+class TreeShardMiddleware:
+    """
+    Выбор базы по подразделению запроса: ``pk`` из URL или ``?root=``.
+
+    Отключается, если ``STAFF_TREE_SHARDS`` пуст. Админка и запросы без
+    подразделения работают с default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        if not settings.STAFF_TREE_SHARDS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _current.set([None])
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        token = _current.set([None])
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+
+    def process_view(
+        self,
+        request: HttpRequest,
+        view_func: Callable,
+        view_args: list,
+        view_kwargs: dict,
+    ) -> None:
+        current = _current.get()
+        pk = str(view_kwargs.get('pk') or request.GET.get('root') or '')
+        if current is not None and pk.isdigit():
+            current[0] = department_database(int(pk))
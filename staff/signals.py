@@ -0,0 +1,161 @@
+import threading
+from collections.abc import Callable
+from functools import wraps
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_department_chain, invalidate_departments, invalidate_tree
+from .changelog import log_department, log_department_employees_deleted, log_employee
+from .instrumentation import install_query_recorder
+from .models import Change, Department, DepartmentStats, Employee
+from .sharding import current_database, using_database
+from .stats import employee_changed, refresh_ancestor_stats, stats_updates_enabled
+
+# Подразделения, удаляемые в текущем потоке: сотрудники, удаляемые каскадом
+# вместе с ними, не обрабатываются построчно
+_deleting = threading.local()
+
+
+def _deleting_ids() -> set[int]:
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+def _in_instance_database(handler: Callable) -> Callable:
+    """
+    Запросы обработчика идут в базу, в которую пишется экземпляр: без
+    контекста запроса (команды, shell) агрегаты филиала иначе
+    пересчитывались бы в default.
+    """
+
+    @wraps(handler)
+    def wrapper(sender: type, using: str, **kwargs) -> None:
+        if not settings.STAFF_TREE_SHARDS or current_database():
+            return handler(sender, using=using, **kwargs)
+        with using_database(using):
+            return handler(sender, using=using, **kwargs)
+
+    return wrapper
+
+
+@receiver(pre_save, sender=Employee)
+@_in_instance_database
+def remember_employee_state(sender: type, instance: Employee, **kwargs) -> None:
+    instance._original_state = None
+    if instance._state.adding:
+        return
+    instance._original_state = (
+        Employee.objects.filter(pk=instance.pk)
+        .values_list('department_id', 'salary')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Employee)
+@_in_instance_database
+def update_stats_on_employee_save(sender: type, instance: Employee, **kwargs) -> None:
+    if not stats_updates_enabled():
+        return
+    old = getattr(instance, '_original_state', None)
+    employee_changed(old, (instance.department_id, instance.salary))
+
+
+@receiver(post_save, sender=Employee)
+@_in_instance_database
+def invalidate_cache_on_employee_save(
+    sender: type, instance: Employee, **kwargs
+) -> None:
+    old = getattr(instance, '_original_state', None)
+    if old is not None and old[0] != instance.department_id:
+        invalidate_department_chain(old[0])
+    invalidate_department_chain(instance.department_id)
+
+
+@receiver(post_save, sender=Employee)
+@_in_instance_database
+def log_employee_save(
+    sender: type, instance: Employee, created: bool, **kwargs
+) -> None:
+    old = getattr(instance, '_original_state', None)
+    if created:
+        log_employee(instance, Change.Action.CREATE)
+    elif old is not None and old[0] != instance.department_id:
+        log_employee(instance, Change.Action.MOVE, moved_from=old[0])
+    else:
+        log_employee(instance, Change.Action.UPDATE)
+
+
+@receiver(post_delete, sender=Employee)
+@_in_instance_database
+def update_on_employee_delete(sender: type, instance: Employee, **kwargs) -> None:
+    # Удаление каскадом записано в журнал при удалении подразделения
+    if instance.department_id in _deleting_ids():
+        return
+    log_employee(instance, Change.Action.DELETE)
+    invalidate_department_chain(instance.department_id)
+    if stats_updates_enabled():
+        employee_changed((instance.department_id, instance.salary), None)
+
+
+@receiver(post_save, sender=Department)
+@_in_instance_database
+def update_on_department_save(
+    sender: type, instance: Department, created: bool, **kwargs
+) -> None:
+    # Признак перемещения выставляют Department.save и DepartmentManager.move_node
+    moved = '_moved_from_parent_id' in instance.__dict__
+    old_parent_id = instance.__dict__.pop('_moved_from_parent_id', None)
+
+    if created:
+        log_department(instance, Change.Action.CREATE)
+    elif moved:
+        log_department(instance, Change.Action.MOVE, moved_from=old_parent_id)
+    else:
+        log_department(instance, Change.Action.UPDATE)
+
+    if moved:
+        invalidate_department_chain(old_parent_id)
+    invalidate_department_chain(instance.pk)
+    invalidate_tree()
+
+    if not stats_updates_enabled():
+        return
+    if created:
+        DepartmentStats.objects.get_or_create(department=instance)
+    elif moved:
+        refresh_ancestor_stats(old_parent_id)
+        refresh_ancestor_stats(instance.parent_id)
+
+
+@receiver(pre_delete, sender=Department)
+@_in_instance_database
+def remember_deleted_department(sender: type, instance: Department, **kwargs) -> None:
+    _deleting_ids().add(instance.pk)
+    log_department_employees_deleted(instance)
+
+
+@receiver(post_delete, sender=Department)
+@_in_instance_database
+def update_on_department_delete(sender: type, instance: Department, **kwargs) -> None:
+    deleting = _deleting_ids()
+    deleting.discard(instance.pk)
+    log_department(instance, Change.Action.DELETE)
+    invalidate_departments([instance.pk])
+    invalidate_tree()
+    if instance.parent_id in deleting:
+        return
+    invalidate_department_chain(instance.parent_id)
+    if stats_updates_enabled():
+        refresh_ancestor_stats(instance.parent_id)
+
+
+@receiver(connection_created)
+def instrument_connection(
+    sender: type, connection: BaseDatabaseWrapper, **kwargs
+) -> None:
+    install_query_recorder(connection)
@@ -0,0 +1,242 @@
+"""
+Снимок верхних уровней дерева подразделений в памяти процесса.
+
+Корни и первые уровни раскрывает каждый пользователь, поэтому главная
+страница и дочерние отделы этих уровней (department-data без
+сотрудников) отдаются из снимка без запросов к базе. Снимок неизменяем
+и хранит узлы в массивах; пересобирается в фоновом потоке и
+подменяется целиком.
+
+Актуальность проверяется по поколениям кэша API (staff.cache): снимок
+годится для подразделения, если его ответы не инвалидировались после
+начала чтения снимка. Устаревший снимок не используется - ответ
+строится по базе, а снимок пересобирается. Изменения из других
+процессов видны, только если кэш общий: с LocMemCache снимок по
+умолчанию выключен (STAFF_SNAPSHOT_LEVELS в core/settings.py).
+"""
+
+import logging
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.functions import Coalesce
+
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .cache import departments_last_change, last_change
+from .models import Department
+from .sharding import tree_databases
+from .stats import money, with_rollup
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TreeSnapshot:
+    """
+    Узлы уровней ``0..levels-1`` в порядке (tree_id, lft).
+
+    Позиции узла во всех массивах совпадают; дети узла - срез
+    ``children[child_start[i]:child_start[i] + child_counts[i]]``
+    (для последнего уровня дети не загружены, child_counts = 0).
+    """
+
+    # Время (нс) перед чтением из базы: всё, что инвалидировано позже,
+    # могло не попасть в снимок
+    started: int
+    levels: int
+    ids: array
+    parents: array  # позиция родителя, -1 у корня
+    names: tuple[str, ...]
+    lft: array
+    rght: array
+    level: array
+    employee_counts: array
+    # Итоги поддерева (with_rollup)
+    headcounts: array
+    payrolls: tuple[Decimal, ...]
+    child_start: array
+    child_counts: array
+    children: array
+    roots: array
+    positions: dict[int, int]
+
+    @classmethod
+    def build(cls, levels: int) -> 'TreeSnapshot':
+        started = time.time_ns()
+        rows = []
+        for alias in tree_databases():
+            rows.extend(
+                with_rollup(Department.objects.using(alias).filter(level__lt=levels))
+                .annotate(employee_count=Coalesce('stats__direct_count', 0))
+                .order_by('tree_id', 'lft')
+                .values_list(
+                    'id',
+                    'parent_id',
+                    'name',
+                    'tree_id',
+                    'lft',
+                    'rght',
+                    'level',
+                    'employee_count',
+                    'headcount',
+                    'payroll',
+                )
+            )
+        # Деревья из разных баз - по tree_id, как на главной странице
+        rows.sort(key=lambda row: (row[3], row[4]))
+
+        positions = {row[0]: position for position, row in enumerate(rows)}
+        grouped = [[] for _ in rows]
+        roots = array('l')
+        for position, row in enumerate(rows):
+            if row[1] is None:
+                roots.append(position)
+            else:
+                grouped[positions[row[1]]].append(position)
+        child_start, child_counts, children = array('l'), array('l'), array('l')
+        for group in grouped:
+            child_start.append(len(children))
+            child_counts.append(len(group))
+            children.extend(group)
+
+        return cls(
+            started=started,
+            levels=levels,
+            ids=array('q', (row[0] for row in rows)),
+            parents=array(
+                'l', (-1 if row[1] is None else positions[row[1]] for row in rows)
+            ),
+            names=tuple(row[2] for row in rows),
+            lft=array('q', (row[4] for row in rows)),
+            rght=array('q', (row[5] for row in rows)),
+            level=array('l', (row[6] for row in rows)),
+            employee_counts=array('q', (row[7] for row in rows)),
+            headcounts=array('q', (row[8] for row in rows)),
+            payrolls=tuple(row[9] for row in rows),
+            child_start=child_start,
+            child_counts=child_counts,
+            children=children,
+            roots=roots,
+            positions=positions,
+        )
+
+    def _node(self, position: int) -> dict:
+        return {
+            'id': self.ids[position],
+            'name': self.names[position],
+            'has_children': self.rght[position] - self.lft[position] > 1,
+            'headcount': self.headcounts[position],
+            'payroll': money(self.payrolls[position]),
+        }
+
+    def root_nodes(self) -> list[dict]:
+        """Корни для главной страницы"""
+
+        return [self._node(position) for position in self.roots]
+
+    def children_of(self, department_id: int) -> list[dict] | None:
+        """
+        Дети подразделения в формате DepartmentSerializer или None,
+        если подразделения нет в снимке или его дети не загружены.
+        """
+
+        position = self.positions.get(department_id)
+        if position is None or self.level[position] >= self.levels - 1:
+            return None
+        start = self.child_start[position]
+        return [
+            {**self._node(child), 'employee_count': self.employee_counts[child]}
+            for child in self.children[start : start + self.child_counts[position]]
+        ]
+
+
+_snapshot: TreeSnapshot | None = None
+_rebuilding = threading.Lock()
+
+
+def rebuild() -> TreeSnapshot:
+    """Пересборка снимка в текущем потоке"""
+
+    global _snapshot
+    _snapshot = TreeSnapshot.build(settings.STAFF_SNAPSHOT_LEVELS)
+    return _snapshot
+
+
+def _rebuild_in_background() -> None:
+    try:
+        rebuild()
+    except Exception:
+        logger.exception('Не удалось пересобрать снимок дерева')
+    finally:
+        # Соединения этого потока больше не понадобятся
+        connections.close_all()
+        _rebuilding.release()
+
+
+def schedule_rebuild() -> None:
+    """Пересборка в фоновом потоке; одновременно идёт не больше одной"""
+
+    if _rebuilding.acquire(blocking=False):
+        threading.Thread(
+            target=_rebuild_in_background, name='staff-tree-snapshot', daemon=True
+        ).start()
+
+
+def _fresh_snapshot(department_id: int | None = None) -> TreeSnapshot | None:
+    if not settings.STAFF_SNAPSHOT_LEVELS:
+        return None
+    # Поколения читаются до проверки снимка: недостающие создаются
+    # сейчас, и снимок, собранный следом, их уже учтёт
+    changed = last_change(department_id)
+    snapshot = _snapshot
+    if (
+        snapshot is None
+        or snapshot.levels != settings.STAFF_SNAPSHOT_LEVELS
+        or changed >= snapshot.started
+    ):
+        schedule_rebuild()
+        return None
+    return snapshot
+
+
+def snapshot_roots() -> list[dict] | None:
+    """Корни из актуального снимка, None - читать из базы"""
+
+    snapshot = _fresh_snapshot()
+    if snapshot is None:
+        return None
+    # Итоги корней меняются вместе с сотрудниками, а не только со структурой
+    roots = (snapshot.ids[position] for position in snapshot.roots)
+    if departments_last_change(roots) >= snapshot.started:
+        schedule_rebuild()
+        return None
+    return snapshot.root_nodes()
+
+
+def snapshot_children(department_id: int) -> list[dict] | None:
+    """Дети подразделения из актуального снимка, None - читать из базы"""
+
+    snapshot = _fresh_snapshot(department_id)
+    return snapshot.children_of(department_id) if snapshot else None
+
+
+class SnapshotChildrenMixin:
+    """
+    Ответ без сотрудников (``include_employees()`` ложно) для верхних
+    уровней - из снимка. Ставится после CachedDepartmentResponseMixin:
+    снимок заменяет только построение ответа по базе.
+    """
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        if not self.include_employees():
+            children = snapshot_children(self.kwargs['pk'])
+            if children is not None:
+                return Response({'children': children})
+        return super().retrieve(request, *args, **kwargs)
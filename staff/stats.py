@@ -0,0 +1,283 @@
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Count, F, Max, Min, Q, QuerySet, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Department, DepartmentStats, Employee
+from .sharding import tree_databases
+
+_state = threading.local()
+
+
+@contextmanager
+def stats_updates_disabled() -> Iterator[None]:
+    """
+    Отключение инкрементального обновления агрегатов.
+
+    Используется при массовых операциях: после них агрегаты
+    пересчитываются целиком через rebuild_department_stats().
+    """
+
+    previous = getattr(_state, 'disabled', False)
+    _state.disabled = True
+    try:
+        yield
+    finally:
+        _state.disabled = previous
+
+
+def stats_updates_enabled() -> bool:
+    return not getattr(_state, 'disabled', False)
+
+
+def rebuild_department_stats(tree_ids: Iterable[int] | None = None) -> int:
+    """
+    Полный пересчёт агрегатов одним проходом.
+
+    Прямые значения берутся одним GROUP BY по сотрудникам, накопительные
+    сворачиваются снизу вверх в памяти. Возвращает число подразделений.
+    """
+
+    departments = Department.objects.all()
+    employees = Employee.objects.all()
+    if tree_ids is not None:
+        tree_ids = list(tree_ids)
+        departments = departments.filter(tree_id__in=tree_ids)
+        employees = employees.filter(department__tree_id__in=tree_ids)
+
+    nodes = list(departments.order_by('-level').values_list('id', 'parent_id'))
+    stats = {pk: DepartmentStats(department_id=pk) for pk, _ in nodes}
+
+    direct = employees.values('department_id').annotate(
+        count=Count('id'), total=Sum('salary'), low=Min('salary'), high=Max('salary')
+    )
+    for row in direct:
+        item = stats[row['department_id']]
+        item.direct_count = item.cumulative_count = row['count']
+        item.direct_salary_sum = item.salary_sum = row['total']
+        item.salary_min = row['low']
+        item.salary_max = row['high']
+
+    # Узлы отсортированы по убыванию уровня: дети учтены раньше родителей
+    for pk, parent_id in nodes:
+        if parent_id is None or parent_id not in stats:
+            continue
+        _merge(stats[parent_id], stats[pk])
+
+    existing = DepartmentStats.objects.all()
+    if tree_ids is not None:
+        existing = existing.filter(department__tree_id__in=tree_ids)
+    # База текущего дерева (using_tree), а не всегда default
+    with transaction.atomic(using=router.db_for_write(DepartmentStats)):
+        existing.delete()
+        DepartmentStats.objects.bulk_create(stats.values(), batch_size=1000)
+    return len(stats)
+
+
+def refresh_department_stats(department_ids: Iterable[int]) -> None:
+    """
+    Пересчёт агрегатов указанных подразделений снизу вверх.
+
+    Прямые значения всех подразделений берутся одним GROUP BY, к ним
+    добавляются сохранённые агрегаты остальных дочерних подразделений
+    и пересчитанные - дочерних из того же набора.
+    """
+
+    nodes = list(
+        Department.objects.filter(pk__in=set(department_ids))
+        .order_by('-level')
+        .values_list('id', 'parent_id')
+    )
+    stats = {pk: DepartmentStats(department_id=pk) for pk, _ in nodes}
+
+    direct = (
+        Employee.objects.filter(department_id__in=stats)
+        .values('department_id')
+        .annotate(
+            count=Count('id'),
+            total=Sum('salary'),
+            low=Min('salary'),
+            high=Max('salary'),
+        )
+    )
+    for row in direct:
+        item = stats[row['department_id']]
+        item.direct_count = item.cumulative_count = row['count']
+        item.direct_salary_sum = item.salary_sum = row['total']
+        item.salary_min = row['low']
+        item.salary_max = row['high']
+
+    children = (
+        DepartmentStats.objects.filter(department__parent_id__in=stats)
+        .exclude(department_id__in=stats)
+        .annotate(parent_id=F('department__parent_id'))
+    )
+    for child in children:
+        _merge(stats[child.parent_id], child)
+    # Узлы отсортированы по убыванию уровня: дети учтены раньше родителей
+    for pk, parent_id in nodes:
+        if parent_id in stats:
+            _merge(stats[parent_id], stats[pk])
+
+    with transaction.atomic():
+        DepartmentStats.objects.filter(department_id__in=stats).delete()
+        DepartmentStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+def refresh_ancestor_stats(department_id: int | None) -> None:
+    """Пересчёт агрегатов подразделения и всех его предков"""
+
+    if department_id is None:
+        return
+    department = Department.objects.filter(pk=department_id).first()
+    if department is None:
+        return
+    ancestors = department.get_ancestors(include_self=True).values_list('pk', flat=True)
+    refresh_department_stats(ancestors)
+
+
+def employee_changed(
+    old: tuple[int, Decimal] | None, new: tuple[int, Decimal] | None
+) -> None:
+    """
+    Инкрементальное обновление агрегатов при изменении сотрудника.
+
+    ``old`` и ``new`` - пары (department_id, salary) до и после изменения,
+    None для создания и удаления соответственно. Счётчики и суммы
+    обновляются одним UPDATE по цепочке предков; минимум и максимум
+    пересчитываются, только если уходящая зарплата была экстремумом.
+    """
+
+    if old == new:
+        return
+    if old is not None and _is_extreme(*old):
+        refresh_ancestor_stats(old[0])
+        if new is not None and new[0] != old[0]:
+            refresh_ancestor_stats(new[0])
+        return
+
+    if old is not None:
+        department_id, salary = old
+        _ancestor_stats(department_id).update(
+            cumulative_count=F('cumulative_count') - 1,
+            salary_sum=F('salary_sum') - salary,
+        )
+        DepartmentStats.objects.filter(department_id=department_id).update(
+            direct_count=F('direct_count') - 1,
+            direct_salary_sum=F('direct_salary_sum') - salary,
+        )
+    if new is not None:
+        department_id, salary = new
+        salary = Value(Decimal(salary))
+        _ancestor_stats(department_id).update(
+            cumulative_count=F('cumulative_count') + 1,
+            salary_sum=F('salary_sum') + salary,
+            salary_min=Least(Coalesce('salary_min', salary), salary),
+            salary_max=Greatest(Coalesce('salary_max', salary), salary),
+        )
+        DepartmentStats.objects.filter(department_id=department_id).update(
+            direct_count=F('direct_count') + 1,
+            direct_salary_sum=F('direct_salary_sum') + salary,
+        )
+
+
+def _ancestor_stats(department_id: int) -> QuerySet:
+    """Агрегаты подразделения и его предков по границам nested set"""
+
+    node = Department.objects.values('tree_id', 'lft', 'rght').get(pk=department_id)
+    return DepartmentStats.objects.filter(
+        department__tree_id=node['tree_id'],
+        department__lft__lte=node['lft'],
+        department__rght__gte=node['rght'],
+    )
+
+
+def _is_extreme(department_id: int, salary: Decimal) -> bool:
+    return (
+        _ancestor_stats(department_id)
+        .filter(Q(salary_min=salary) | Q(salary_max=salary))
+        .exists()
+    )
+
+
+def _merge(parent: DepartmentStats, child: DepartmentStats) -> None:
+    """Добавление накопительных агрегатов дочернего узла к родителю"""
+
+    parent.cumulative_count += child.cumulative_count
+    parent.salary_sum += child.salary_sum
+    if child.salary_min is not None:
+        parent.salary_min = (
+            child.salary_min
+            if parent.salary_min is None
+            else min(parent.salary_min, child.salary_min)
+        )
+    if child.salary_max is not None:
+        parent.salary_max = (
+            child.salary_max
+            if parent.salary_max is None
+            else max(parent.salary_max, child.salary_max)
+        )
+
+
+# Порядок крупнейших подразделений: по численности или ФОТ поддерева
+BRANCH_ORDERINGS = {
+    'headcount': 'stats__cumulative_count',
+    'payroll': 'stats__salary_sum',
+}
+
+
+def with_rollup(departments: QuerySet) -> QuerySet:
+    """Численность (headcount) и ФОТ (payroll) поддерева из агрегатов, LEFT JOIN"""
+
+    return departments.annotate(
+        headcount=Coalesce('stats__cumulative_count', 0),
+        payroll=Coalesce('stats__salary_sum', Value(Decimal(0))),
+    )
+
+
+def money(value: Decimal) -> str:
+    """Сумма в ответах без сериализатора - как DecimalField: два знака"""
+
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def largest_branches(
+    order: str,
+    limit: int,
+    root: Department | None = None,
+    level: int | None = None,
+) -> list[Department]:
+    """
+    Крупнейшие подразделения по ``order`` (ключ BRANCH_ORDERINGS) среди
+    потомков ``root`` или во всех деревьях, при ``level`` - только на
+    этом уровне.
+
+    Сортировка идёт по индексам агрегатов: без ``root`` из каждой базы
+    деревьев читается не больше ``limit`` строк, результаты сливаются.
+    """
+
+    key = BRANCH_ORDERINGS[order]
+    if root is not None:
+        queries = [
+            Department.objects.using(root._state.db).filter(
+                tree_id=root.tree_id, lft__gt=root.lft, rght__lt=root.rght
+            )
+        ]
+    else:
+        queries = [Department.objects.using(alias) for alias in tree_databases()]
+
+    branches = []
+    for departments in queries:
+        if level is not None:
+            departments = departments.filter(level=level)
+        branches.extend(
+            with_rollup(departments)
+            .filter(stats__isnull=False)
+            .order_by(f'-{key}', 'id')[:limit]
+        )
+    branches.sort(key=lambda department: (-getattr(department, order), department.pk))
+    return branches[:limit]
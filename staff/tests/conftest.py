@@ -1,11 +1,25 @@
 from datetime import date
 
 import pytest
+from django.core.cache import cache
 from rest_framework.test import APIClient
 
 from staff.models import Department, Employee
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_tree_snapshot(settings):
+    # Снимок пересобирается в фоновом потоке; тесты снимка включают его сами
+    settings.STAFF_SNAPSHOT_LEVELS = 0
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -0,0 +1,74 @@
+from datetime import date
+
+import pytest
+from django.urls import reverse
+
+from staff import changelist
+from staff.models import Department, Employee
+
+URL = reverse('admin:staff_employee_changelist')
+
+
+@pytest.fixture
+def employees():
+    root = Department.objects.create(name="Root")
+    child = Department.objects.create(name="Child", parent=root)
+    Department.objects.create(name="Other")
+    Employee.objects.bulk_create(
+        Employee(
+            full_name=f"Worker{number:02}",
+            position="Dev",
+            salary=100,
+            hire_date=date.today(),
+            department=child if number % 2 else root,
+        )
+        for number in range(30)
+    )
+    return {'root': root, 'child': child}
+
+
+def names(response):
+    return [employee.full_name for employee in response.context['cl'].result_list]
+
+
+@pytest.mark.django_db
+def test_department_filter_covers_subtree(admin_client, employees):
+    param = 'department__id__inhierarchy'
+
+    response = admin_client.get(URL, {param: employees['root'].pk})
+    assert response.context['cl'].result_count == 30
+    response = admin_client.get(URL, {param: employees['child'].pk})
+    assert response.context['cl'].result_count == 15
+    assert admin_client.get(URL, {param: 99999}).url.endswith('?e=1')
+
+
+@pytest.mark.django_db
+def test_next_page_by_cursor(admin_client, employees, settings):
+    settings.STAFF_ADMIN_MAX_OFFSET = 25
+    first = admin_client.get(URL)
+    cl = first.context['cl']
+    assert list(cl.paginator.get_elided_page_range(1)) == [1]
+    assert names(first) == [f"Worker{number:02}" for number in range(25)]
+
+    second = admin_client.get(URL + cl.next_url)
+    assert names(second) == [f"Worker{number:02}" for number in range(25, 30)]
+    assert second.context['cl'].page_num == 2
+    assert second.context['cl'].next_url is None
+    # Курсор не переносится в ссылки фильтров и сортировки
+    assert changelist.CURSOR_VAR not in second.context['cl'].get_query_string()
+
+    assert admin_client.get(URL, {changelist.CURSOR_VAR: 'bad'}).url.endswith('?e=1')
+
+
+@pytest.mark.django_db
+def test_estimated_count_without_filters(admin_client, employees, settings, monkeypatch):
+    settings.STAFF_ADMIN_ESTIMATED_COUNT = 1000
+    monkeypatch.setattr(changelist, 'estimated_rows', lambda model, using: 5_000_000)
+
+    response = admin_client.get(URL)
+    assert response.context['cl'].result_count == 5_000_000
+    assert '≈ 5000000' in response.content.decode()
+    # С поиском число строк точное
+    response = admin_client.get(URL, {'q': 'Worker1'})
+    assert response.context['cl'].result_count == 10
+    assert not response.context['cl'].paginator.estimated
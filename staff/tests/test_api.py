@@ -1,7 +1,13 @@
+import json
+
 import pytest
+from datetime import date
+
 from django.urls import reverse
 from rest_framework import status
 
+from staff.models import Department, Employee
+
 
 @pytest.mark.django_db
 def test_anonymous_access_denied(api_client, structure):
@@ -34,3 +40,361 @@ def test_404_on_invalid_id(api_client, user):
     url = reverse('api-department-data', kwargs={'pk': 99999})
     response = api_client.get(url)
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_department_data_without_employees(api_client, user, structure):
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-data', kwargs={'pk': structure['root'].id})
+
+    response = api_client.get(url, {'employees': '0'})
+    assert response.status_code == status.HTTP_200_OK
+    assert 'employees' not in response.json()
+    assert len(response.json()['children']) == 1
+
+
+@pytest.mark.django_db
+def test_employees_keyset_pagination(api_client, user, structure):
+    root = structure['root']
+    for name in ["Anna", "Boris", "Clara", "Worker 2"]:
+        Employee.objects.create(
+            full_name=name,
+            position="Dev",
+            salary=100,
+            hire_date=date.today(),
+            department=root,
+        )
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-employees', kwargs={'pk': root.id})
+
+    names = []
+    response = api_client.get(url, {'page_size': 2})
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert len(data['results']) <= 2
+        names.extend(emp['full_name'] for emp in data['results'])
+        if not data['next']:
+            break
+        response = api_client.get(data['next'])
+
+    assert names == ["Anna", "Boris", "Clara", "Worker", "Worker 2"]
+
+
+@pytest.mark.django_db
+def test_employees_invalid_cursor(api_client, user, structure):
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-employees', kwargs={'pk': structure['root'].id})
+    response = api_client.get(url, {'cursor': 'not-a-cursor'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_employees_unknown_department(api_client, user):
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-employees', kwargs={'pk': 99999})
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_department_tree(api_client, user, structure):
+    Department.objects.create(name="Grandchild", parent=structure['child'])
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-tree', kwargs={'pk': structure['root'].id})
+
+    data = api_client.get(url).json()
+    assert data['name'] == "Root"
+    assert data['children'][0]['name'] == "Child"
+    assert data['children'][0]['children'][0]['name'] == "Grandchild"
+    assert data['children'][0]['children'][0]['has_children'] is False
+    assert 'employees' not in data
+
+    data = api_client.get(url, {'depth': 1, 'employees': 1}).json()
+    assert 'children' not in data['children'][0]
+    assert data['children'][0]['has_children'] is True
+    assert [emp['full_name'] for emp in data['employees']] == ["Worker"]
+
+    response = api_client.get(url, {'depth': 'x'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_department_data_cache_and_etag(api_client, user, structure):
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-data', kwargs={'pk': structure['root'].id})
+
+    first = api_client.get(url)
+    etag = first['ETag']
+    assert api_client.get(url).json() == first.json()
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    structure['emp'].full_name = "Renamed"
+    structure['emp'].save()
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['ETag'] != etag
+    assert response.json()['employees'][0]['full_name'] == "Renamed"
+
+
+@pytest.mark.django_db
+def test_cache_invalidates_ancestors(api_client, user, structure):
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-tree', kwargs={'pk': structure['root'].id})
+    assert api_client.get(url).json()['children'][0]['has_children'] is False
+
+    Department.objects.create(name="Grandchild", parent=structure['child'])
+    assert api_client.get(url).json()['children'][0]['has_children'] is True
+
+
+@pytest.mark.django_db
+def test_cache_stats_requires_admin(api_client, user, admin_user, structure):
+    url = reverse('api-cache-stats')
+    api_client.force_authenticate(user=user)
+    assert api_client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+    data_url = reverse('api-department-data', kwargs={'pk': structure['root'].id})
+    api_client.get(data_url)
+    api_client.get(data_url)
+    api_client.force_authenticate(user=admin_user)
+    counts = api_client.get(url).json()['department-data']
+    assert counts['miss'] >= 1
+    assert counts['hit'] >= 1
+
+
+@pytest.mark.django_db
+def test_employee_search(api_client, user, structure):
+    other_root = Department.objects.create(name="Other")
+    Employee.objects.create(
+        full_name="Workman",
+        position="QA",
+        salary=100,
+        hire_date=date.today(),
+        department=other_root,
+    )
+    api_client.force_authenticate(user=user)
+    url = reverse('api-employee-search')
+
+    results = api_client.get(url, {'q': 'work'}).json()['results']
+    assert [hit['full_name'] for hit in results] == ["Worker", "Workman"]
+    assert results[0]['path'] == [{'id': structure['root'].id, 'name': "Root"}]
+
+    results = api_client.get(url, {'q': 'de', 'root': structure['root'].id}).json()
+    assert [hit['full_name'] for hit in results['results']] == ["Worker"]
+
+    assert api_client.get(url, {'q': 'work', 'root': 99999}).status_code == 404
+    assert api_client.get(url, {'q': ''}).json()['results'] == []
+
+
+@pytest.mark.django_db
+def test_async_department_data_matches_sync(api_client, user, structure):
+    root_id = structure['root'].id
+    assert api_client.get(
+        reverse('api-async-department-data', kwargs={'pk': root_id})
+    ).status_code == 403
+
+    api_client.force_login(user)
+    sync = api_client.get(reverse('api-department-data', kwargs={'pk': root_id}))
+    response = api_client.get(
+        reverse('api-async-department-data', kwargs={'pk': root_id})
+    )
+    assert response.status_code == 200
+    assert response.json() == sync.json()
+    assert response['ETag'] == sync['ETag']
+
+    response = api_client.get(
+        reverse('api-async-department-data', kwargs={'pk': root_id}),
+        {'employees': '0'},
+    )
+    assert 'employees' not in response.json()
+    assert api_client.get(
+        reverse('api-async-department-data', kwargs={'pk': 99999})
+    ).status_code == 404
+
+
+@pytest.mark.django_db
+def test_async_department_employees_pagination(api_client, user, structure):
+    root = structure['root']
+    for i in range(4):
+        Employee.objects.create(
+            full_name=f"Extra {i}",
+            position="Dev",
+            salary=100,
+            hire_date=date.today(),
+            department=root,
+        )
+    api_client.force_login(user)
+    url = reverse('api-async-department-employees', kwargs={'pk': root.id})
+
+    names = []
+    page = api_client.get(url, {'page_size': 2}).json()
+    while True:
+        names += [row['full_name'] for row in page['results']]
+        if page['next'] is None:
+            break
+        page = api_client.get(page['next']).json()
+    assert names == ["Extra 0", "Extra 1", "Extra 2", "Extra 3", "Worker"]
+    assert api_client.get(url, {'cursor': 'bad'}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_columnar_employees(api_client, user, structure):
+    root = structure['root']
+    Employee.objects.create(
+        full_name="Another",
+        position="Dev",
+        salary=250.5,
+        hire_date=date(2020, 1, 2),
+        department=root,
+    )
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-employees', kwargs={'pk': root.id})
+
+    page = api_client.get(url, {'format': 'columnar', 'page_size': 1}).json()
+    columns = page['results']
+    assert columns['full_name'] == ["Another"]
+    assert columns['salary'] == [250.5]
+    assert columns['hire_date'] == ['2020-01-02']
+    assert columns['dictionaries']['position'][columns['position'][0]] == "Dev"
+
+    columns = api_client.get(page['next']).json()['results']
+    assert columns['full_name'] == ["Worker"]
+
+    url = reverse('api-department-data', kwargs={'pk': root.id})
+    data = api_client.get(url, {'format': 'columnar'}).json()
+    assert sorted(data['employees']['full_name']) == ["Another", "Worker"]
+    assert data['employees']['dictionaries']['position'] == ["Dev"]
+    assert isinstance(api_client.get(url).json()['employees'], list)
+
+    api_client.force_login(user)
+    url = reverse('api-async-department-data', kwargs={'pk': root.id})
+    assert api_client.get(url, {'format': 'columnar'}).json() == data
+
+
+@pytest.mark.django_db
+def test_department_analytics(api_client, user, structure):
+    root, child = structure['root'], structure['child']
+    today = date.today()
+    for salary, years in ((200, 0), (300, 2), (500, 12)):
+        Employee.objects.create(
+            full_name=f"Analyst {salary}",
+            position="Analyst",
+            salary=salary,
+            hire_date=today.replace(year=today.year - years, day=1),
+            department=child,
+        )
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-analytics', kwargs={'pk': root.id})
+
+    response = api_client.get(url)
+    assert response.status_code == 200
+    data = response.json()
+    nodes = {node['id']: node for node in data['nodes']}
+    assert data['tenure_buckets'] == ['0-1', '1-3', '3-5', '5-10', '10+']
+
+    top = nodes[root.id]
+    assert top['headcount'] == 4
+    assert top['payroll'] == 1100
+    assert top['salary_mean'] == 275
+    assert top['salary_median'] == 250
+    assert top['salary_percentiles']['p25'] == 175
+    assert top['tenure'] == [2, 1, 0, 0, 1]
+
+    assert nodes[child.id]['headcount'] == 3
+    assert nodes[child.id]['salary_median'] == 300
+
+    empty = Department.objects.create(name="Empty", parent=child)
+    assert api_client.get(url).json() != data
+    node = api_client.get(
+        reverse('api-department-analytics', kwargs={'pk': empty.id})
+    ).json()['nodes'][0]
+    assert node['headcount'] == 0
+    assert node['salary_median'] is None
+
+
+@pytest.mark.django_db
+def test_export_streams_csv_and_ndjson(client, user, structure):
+    url = reverse('api-export', kwargs={'kind': 'departments'})
+    assert client.get(url).status_code == 403
+
+    client.force_login(user)
+    response = client.get(url)
+    assert response.streaming
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert lines == ['id,parent_id,name,level,path', f'{structure["root"].id},,Root,0,Root',
+                     f'{structure["child"].id},{structure["root"].id},Child,1,Root / Child']
+
+    url = reverse('api-export', kwargs={'kind': 'employees'})
+    response = client.get(url, {'format': 'ndjson', 'root': structure['root'].id})
+    rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    assert rows == [{
+        'id': structure['emp'].id,
+        'full_name': 'Worker',
+        'position': 'Dev',
+        'salary': '100.00',
+        'hire_date': date.today().isoformat(),
+        'department_id': structure['root'].id,
+        'department_path': 'Root',
+    }]
+
+    response = client.get(url, {'root': structure['child'].id})
+    assert b''.join(response.streaming_content).decode().splitlines()[1:] == []
+    assert client.get(url, {'format': 'xml'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_index_passes_roots_to_renderer(client, user, structure):
+    client.force_login(user)
+    response = client.get(reverse('index'))
+    assert response.status_code == 200
+    assert response.context['roots'] == [
+        {
+            'id': structure['root'].id,
+            'name': 'Root',
+            'has_children': True,
+            'headcount': 1,
+            'payroll': '100.00',
+        }
+    ]
+    assert b'id="tree-roots"' in response.content
+
+
+@pytest.mark.django_db
+def test_largest_branches(api_client, user, structure):
+    root, child = structure['root'], structure['child']
+    other = Department.objects.create(name="Other")
+    grandchild = Department.objects.create(name="Grandchild", parent=child)
+    for name, salary, department in [
+        ('A', 300, child), ('B', 50, grandchild), ('C', 10, other), ('D', 10, other)
+    ]:
+        Employee.objects.create(
+            full_name=name,
+            position='Dev',
+            salary=salary,
+            hire_date=date.today(),
+            department=department,
+        )
+    api_client.force_authenticate(user=user)
+    url = reverse('api-largest-branches')
+
+    children = api_client.get(
+        reverse('api-department-data', kwargs={'pk': root.id}), {'employees': '0'}
+    ).json()['children']
+    assert [(c['headcount'], c['payroll']) for c in children] == [(2, '350.00')]
+
+    results = api_client.get(url, {'limit': 3}).json()['results']
+    assert [(r['name'], r['headcount']) for r in results] == [
+        ('Root', 3), ('Child', 2), ('Other', 2)
+    ]
+    assert results[1]['path'] == [
+        {'id': root.id, 'name': 'Root'}, {'id': child.id, 'name': 'Child'}
+    ]
+    results = api_client.get(url, {'sort': 'payroll', 'level': 0}).json()['results']
+    assert [(r['name'], r['payroll']) for r in results] == [
+        ('Root', '450.00'), ('Other', '20.00')
+    ]
+    results = api_client.get(url, {'root': root.id}).json()['results']
+    assert [r['name'] for r in results] == ['Child', 'Grandchild']
+    assert api_client.get(url, {'sort': 'name'}).status_code == 400
@@ -0,0 +1,196 @@
+import json
+from datetime import UTC, date, datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from staff.archive import Archive, ArchiveError, capture, diff, list_archives
+from staff.models import Department, Employee
+
+
+@pytest.fixture
+def archive_dir(settings, tmp_path):
+    settings.STAFF_ARCHIVE_DIR = tmp_path / 'archive'
+    return settings.STAFF_ARCHIVE_DIR
+
+
+def hire(name, department, salary=100):
+    return Employee.objects.create(
+        full_name=name,
+        position='Dev',
+        salary=salary,
+        hire_date=date(2020, 1, 1),
+        department=department,
+    )
+
+
+@pytest.mark.django_db
+def test_capture_round_trip(structure, archive_dir):
+    root, child = structure['root'], structure['child']
+    hire('Младший', child, salary='50.25')
+    grandchild = Department.objects.create(name='Отдел', parent=child)
+
+    path = capture()
+    assert path.parent == archive_dir
+    with Archive(path) as archive:
+        assert archive.meta['departments'] == 3
+        assert archive.meta['employees'] == 2
+        assert archive.strings('employee.full_name')[1] == 'Младший'
+        assert archive.dictionary('employee.position')[1] == 'Dev'
+        assert list(archive.column('employee.salary')) == [10000, 5025]
+        assert archive.tree() == [
+            {
+                'id': root.pk,
+                'name': 'Root',
+                'has_children': True,
+                'headcount': 2,
+                'payroll': '150.25',
+                'children': [
+                    {
+                        'id': child.pk,
+                        'name': 'Child',
+                        'has_children': True,
+                        'headcount': 1,
+                        'payroll': '50.25',
+                        'children': [
+                            {
+                                'id': grandchild.pk,
+                                'name': 'Отдел',
+                                'has_children': False,
+                                'headcount': 0,
+                                'payroll': '0.00',
+                                'children': [],
+                            }
+                        ],
+                    }
+                ],
+            }
+        ]
+        subtree = archive.tree(root=child.pk, depth=0)
+        assert subtree == [
+            {
+                'id': child.pk,
+                'name': 'Child',
+                'has_children': True,
+                'headcount': 1,
+                'payroll': '50.25',
+            }
+        ]
+
+    path.write_bytes(b'garbage')
+    with pytest.raises(ArchiveError):
+        Archive(path)
+
+
+@pytest.mark.django_db
+def test_capture_same_second(structure, archive_dir, monkeypatch):
+    monkeypatch.setattr('staff.archive.timezone.now', lambda: moment)
+    moment = datetime(2026, 1, 1, 9, tzinfo=UTC)
+    first = capture()
+    hire('Новый', structure['child'])
+    second = capture()
+
+    assert first.name == 'structure-20260101T090000Z.stfa'
+    assert second.name == 'structure-20260101T090000Z_1.stfa'
+    (archive_dir / 'structure-20260101T085959Z_12.stfa').touch()
+    (archive_dir / 'structure-latest.stfa').touch()
+    assert [path.name for path in list_archives()] == [
+        'structure-20260101T085959Z_12.stfa',
+        first.name,
+        second.name,
+    ]
+    with Archive(first) as old, Archive(second) as new:
+        assert (old.meta['employees'], new.meta['employees']) == (1, 2)
+
+
+@pytest.mark.django_db
+def test_diff(structure, tmp_path):
+    root, child, emp = structure['root'], structure['child'], structure['emp']
+    leaver = hire('Уволен', child)
+    old_path = capture(tmp_path / 'old')
+
+    leaver.delete()
+    emp.department = child
+    emp.save()
+    newcomer = hire('Новый', root, salary=300)
+    other = Department.objects.create(name='Other')
+    child.refresh_from_db()
+    Department.objects.move_node(child, other)
+    other.name = 'Другой'
+    other.save()
+    new_path = capture(tmp_path / 'new')
+
+    with Archive(old_path) as old, Archive(new_path) as new:
+        changes = diff(old, new).as_dict()
+
+    assert changes['hires'] == {
+        'count': 1,
+        'items': [
+            {
+                'id': newcomer.pk,
+                'full_name': 'Новый',
+                'position': 'Dev',
+                'department_id': root.pk,
+            }
+        ],
+    }
+    assert [item['full_name'] for item in changes['leavers']['items']] == ['Уволен']
+    assert changes['moves']['items'] == [
+        {
+            'id': emp.pk,
+            'full_name': 'Worker',
+            'position': 'Dev',
+            'department_id': child.pk,
+            'moved_from': root.pk,
+        }
+    ]
+    assert changes['departments']['created'] == [
+        {'id': other.pk, 'name': 'Другой', 'parent_id': None}
+    ]
+    assert changes['departments']['moved'] == [
+        {'id': child.pk, 'name': 'Child', 'from': root.pk, 'to': other.pk}
+    ]
+    payroll = {item['id']: item for item in changes['payroll']}
+    assert payroll[root.pk]['headcount'] == [2, 1]
+    assert payroll[root.pk]['delta'] == '100.00'
+    # Уволенного в Child заменил переведённый с той же зарплатой
+    assert child.pk not in payroll
+    assert payroll[other.pk]['delta'] == '100.00'
+
+
+@pytest.mark.django_db
+def test_archive_api_and_commands(api_client, user, structure, archive_dir):
+    call_command('archive_structure', stdout=StringIO())
+    (first,) = archive_dir.iterdir()
+    first.rename(archive_dir / 'structure-20260101T090000Z.stfa')
+    hire('Новый', structure['child'])
+    call_command('archive_structure', keep=2, stdout=StringIO())
+
+    (archive_dir / 'structure-20260102T090000Z.stfa').write_bytes(b'garbage')
+    api_client.force_authenticate(user=user)
+    archives = api_client.get(reverse('api-archive')).json()
+    assert [item.get('employees') for item in archives] == [1, None, 2]
+    assert archives[1]['name'] == 'structure-20260102T090000Z.stfa'
+    assert 'error' in archives[1]
+    (archive_dir / 'structure-20260102T090000Z.stfa').unlink()
+
+    url = reverse('api-archive-tree')
+    response = api_client.get(url, {'date': '2026-01-01', 'depth': 0})
+    assert response.json()['roots'][0]['headcount'] == 1
+    assert 'children' not in response.json()['roots'][0]
+    assert api_client.get(url, {'date': '2025-12-31'}).status_code == 404
+    assert api_client.get(url, {'date': 'вчера'}).status_code == 400
+    today = date.today().isoformat()
+    assert api_client.get(url, {'date': today, 'root': 0}).status_code == 404
+
+    response = api_client.get(
+        reverse('api-archive-diff'), {'from': '2026-01-01', 'to': today}
+    )
+    assert response.json()['hires']['count'] == 1
+
+    out = StringIO()
+    call_command('diff_structure', '2026-01-01', today, limit=0, stdout=out)
+    changes = json.loads(out.getvalue())
+    assert changes['hires'] == {'count': 1, 'items': []}
@@ -0,0 +1,143 @@
+import json
+from datetime import date
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+from staff.changelog import changes_since
+from staff.models import Change, Department, Employee
+from staff.reorganization import DepartmentChange, reorganize
+from staff.seeding import wipe_staff_data
+
+
+def log(since=0):
+    return [
+        (change['action'], change['kind'], change['object_id'])
+        for change in changes_since(since, 1000)[0]
+    ]
+
+
+def last_sequence():
+    return Change.objects.order_by('sequence').last().sequence
+
+
+@pytest.mark.django_db
+def test_saves_and_deletes_are_logged(structure):
+    root, child, emp = structure['root'], structure['child'], structure['emp']
+    root_id = root.pk
+    assert log() == [
+        ('create', 'department', root.pk),
+        ('create', 'department', child.pk),
+        ('create', 'employee', emp.pk),
+    ]
+    since = last_sequence()
+
+    emp.salary = 200
+    emp.save()
+    emp.department = child
+    emp.save()
+    other = Department.objects.create(name="Other")
+    Department.objects.move_node(child, other)
+    root.refresh_from_db()
+    root.delete()
+
+    changes = changes_since(since, 1000)[0]
+    assert [change['sequence'] for change in changes] == list(
+        range(since + 1, since + 6)
+    )
+    assert [(c['action'], c['kind'], c['object_id']) for c in changes] == [
+        ('update', 'employee', emp.pk),
+        ('move', 'employee', emp.pk),
+        ('create', 'department', other.pk),
+        ('move', 'department', child.pk),
+        # Сотрудник и child к этому времени уже не в поддереве root
+        ('delete', 'department', root_id),
+    ]
+    assert changes[0]['data']['salary'] == '200.00'
+    assert changes[1]['data']['moved_from'] == root_id
+    assert changes[3]['data'] == {
+        'name': 'Child', 'parent_id': other.pk, 'moved_from': root_id
+    }
+
+
+@pytest.mark.django_db
+def test_cascade_delete_logs_employees(structure):
+    since = last_sequence()
+    expected = [
+        ('delete', 'employee', structure['emp'].pk),
+        ('delete', 'department', structure['child'].pk),
+        ('delete', 'department', structure['root'].pk),
+    ]
+    structure['root'].delete()
+    assert sorted(log(since)) == sorted(expected)
+
+
+@pytest.mark.django_db
+def test_bulk_operations_are_logged(structure, tmp_path):
+    since = last_sequence()
+    reorganize([
+        DepartmentChange(structure['child'].pk, None, move=True),
+        DepartmentChange(structure['root'].pk, name='Renamed'),
+    ])
+    assert log(since) == [
+        ('move', 'department', structure['child'].pk),
+        ('update', 'department', structure['root'].pk),
+    ]
+
+    since = last_sequence()
+    employees = tmp_path / 'employees.csv'
+    employees.write_text(
+        'full_name,position,salary,hire_date,department_path\n'
+        'Worker,Dev,100,' + date.today().isoformat() + ',Renamed\n'
+        'Новый,Dev,100,2020-01-01,Child / Отдел\n'
+    )
+    departments = tmp_path / 'departments.csv'
+    departments.write_text('path\nChild / Отдел\n')
+    call_command(
+        'import_staff', departments=str(departments), employees=str(employees)
+    )
+    new_department = Department.objects.get(name='Отдел')
+    new_employee = Employee.objects.get(full_name='Новый')
+    # Неизменившийся сотрудник в журнал не попадает
+    assert log(since) == [
+        ('create', 'department', new_department.pk),
+        ('create', 'employee', new_employee.pk),
+    ]
+
+
+@pytest.mark.django_db
+def test_change_feed_api(admin_client, structure):
+    url = reverse('api-changes')
+    first = admin_client.get(url, {'since': 0, 'limit': 2}).json()
+    assert [change['object_id'] for change in first['changes']] == [
+        structure['root'].pk, structure['child'].pk
+    ]
+    assert first['more'] is True
+    second = admin_client.get(url, {'since': first['next']}).json()
+    assert [change['object_id'] for change in second['changes']] == [
+        structure['emp'].pk
+    ]
+    assert second['more'] is False
+    assert admin_client.get(url).status_code == 400
+
+    wipe_staff_data()
+    response = admin_client.get(url, {'since': second['next']})
+    assert response.status_code == 410
+    reset = response.json()['reset']
+    assert admin_client.get(url, {'since': reset}).json()['changes'] == []
+
+
+@pytest.mark.django_db
+def test_stream_changes_command(structure):
+    out = StringIO()
+    call_command('stream_changes', since=1, batch_size=1, stdout=out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [line['sequence'] for line in lines] == [2, 3]
+    assert lines[1]['data']['full_name'] == 'Worker'
+
+    wipe_staff_data()
+    with pytest.raises(CommandError, match='полная синхронизация'):
+        call_command('stream_changes', since=3, stdout=out)
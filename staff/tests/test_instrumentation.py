@@ -0,0 +1,86 @@
+import pytest
+from django.urls import reverse
+
+from staff.cache import counters
+from staff.instrumentation import Histogram, metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+    counters.reset()
+    yield
+    metrics.reset()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    assert list(histogram.cumulative()) == [('1', 2), ('5', 3), ('+Inf', 4)]
+    assert histogram.sum == 14.5
+
+
+@pytest.mark.django_db
+def test_server_timing_header(api_client, user, structure, settings):
+    settings.STAFF_METRICS_SAMPLE_RATE = 1.0
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-data', kwargs={'pk': structure['root'].id})
+
+    response = api_client.get(url)
+    timing = response['Server-Timing']
+    assert timing.startswith('db;dur=')
+    assert 'serialize;dur=' in timing
+    assert 'total;dur=' in timing
+
+
+@pytest.mark.django_db
+def test_unsampled_request_has_no_timing(api_client, user, structure, settings):
+    settings.STAFF_METRICS_SAMPLE_RATE = 0.0
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-data', kwargs={'pk': structure['root'].id})
+
+    response = api_client.get(url)
+    assert 'Server-Timing' not in response
+    assert 'staff_request_queries_count' not in metrics.render()
+    assert 'view="api-department-data",status="200"' in metrics.render()
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(api_client, user, structure, django_user_model):
+    api_client.force_authenticate(user=user)
+    api_client.get(reverse('api-department-data', kwargs={'pk': structure['root'].id}))
+    api_client.force_login(user)
+    assert api_client.get(reverse('metrics')).status_code == 403
+
+    admin = django_user_model.objects.create_superuser('admin', password='admin')
+    api_client.force_login(admin)
+    response = api_client.get(reverse('metrics'))
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+
+    body = response.content.decode()
+    assert 'staff_request_queries_count{view="api-department-data"} 1' in body
+    assert (
+        'staff_cache_requests_total{namespace="department-data",outcome="miss"} 1'
+        in body
+    )
+
+
+@pytest.mark.django_db
+def test_metrics_token(client, settings):
+    settings.STAFF_METRICS_TOKEN = 'secret'
+    assert client.get(reverse('metrics')).status_code == 403
+
+    response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_async_view_queries_are_counted(client, user, structure, settings):
+    settings.STAFF_METRICS_SAMPLE_RATE = 1.0
+    client.force_login(user)
+    url = reverse('api-async-department-employees', kwargs={'pk': structure['root'].id})
+
+    timing = client.get(url)['Server-Timing']
+    assert 'desc="0 queries"' not in timing
@@ -0,0 +1,90 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from staff.models import Department
+from staff.reorganization import DepartmentChange, reorganize
+from staff.tree import path_fields
+
+
+def assert_paths_consistent():
+    nodes = dict(
+        (pk, (parent_id, name))
+        for pk, parent_id, name in Department.objects.values_list(
+            'id', 'parent_id', 'name'
+        )
+    )
+    stored = {
+        pk: (path, name_path)
+        for pk, path, name_path in Department.objects.values_list(
+            'id', 'path', 'name_path'
+        )
+    }
+    assert stored == path_fields(nodes)
+
+
+@pytest.mark.django_db
+def test_paths_follow_save_move_and_rename(structure):
+    root, child = structure['root'], structure['child']
+    leaf = Department.objects.create(name='Leaf', parent=child)
+    assert leaf.path == f'{root.pk}/{child.pk}/{leaf.pk}/'
+    assert leaf.name_path == 'Root / Child / Leaf'
+
+    other = Department.objects.create(name='Other')
+    Department.objects.move_node(child, other, 'last-child')
+    child.refresh_from_db()
+    child.name = 'Moved'
+    child.save()
+    leaf.refresh_from_db()
+    assert leaf.path == f'{other.pk}/{child.pk}/{leaf.pk}/'
+    assert leaf.name_path == 'Other / Moved / Leaf'
+    assert set(Department.objects.under(other.path)) == {other, child, leaf}
+    assert_paths_consistent()
+
+
+@pytest.mark.django_db
+def test_bulk_operations_maintain_paths():
+    call_command('seed_db', employees=50, depth=4, fanout=2, seed=1, batch_size=50)
+    assert_paths_consistent()
+
+    roots = list(Department.objects.filter(level=0).order_by('tree_id'))
+    division = roots[1].get_children().first()
+    reorganize(
+        [
+            DepartmentChange(division.pk, roots[0].pk, move=True, name='Новый блок'),
+            DepartmentChange(roots[0].pk, name='Переименованный филиал'),
+        ]
+    )
+    assert_paths_consistent()
+
+
+@pytest.mark.django_db
+def test_department_paths_api(api_client, user, structure):
+    root, child = structure['root'], structure['child']
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-paths')
+
+    response = api_client.get(url, {'ids': f'{child.pk},{root.pk}'})
+    assert response.status_code == 200
+    assert response.json()['results'] == {
+        str(child.pk): [
+            {'id': root.pk, 'name': 'Root'},
+            {'id': child.pk, 'name': 'Child'},
+        ],
+        str(root.pk): [{'id': root.pk, 'name': 'Root'}],
+    }
+
+    response = api_client.get(url, {'under': root.pk, 'limit': 1})
+    assert response.json() == {
+        'results': [
+            {
+                'id': root.pk,
+                'parent_id': None,
+                'name': 'Root',
+                'level': 0,
+                'name_path': 'Root',
+            }
+        ],
+        'truncated': True,
+    }
+    assert api_client.get(url, {'ids': 'x'}).status_code == 400
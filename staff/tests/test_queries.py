@@ -0,0 +1,139 @@
+"""
+Верхняя граница числа SQL-запросов для каждого представления API.
+
+Граница не зависит от числа дочерних подразделений и сотрудников:
+N+1 в сериализаторе превысит её уже на широкой структуре. Два запроса
+из каждой границы - сессия и пользователь.
+"""
+
+from datetime import date
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from staff.archive import capture
+from staff.models import Department, Employee
+
+# (имя URL, передать pk корня, параметры, граница)
+GET_CASES = [
+    ('api-department-data', True, {}, 5),
+    ('api-department-data', True, {'format': 'columnar'}, 5),
+    ('api-department-data', True, {'employees': '0'}, 4),
+    ('api-department-employees', True, {}, 4),
+    ('api-department-employees', True, {'format': 'columnar'}, 4),
+    ('api-department-stats', True, {}, 3),
+    ('api-department-tree', True, {}, 4),
+    ('api-department-analytics', True, {}, 5),
+    ('api-department-paths', False, {'under': 'root'}, 4),
+    ('api-department-paths', False, {'ids': 'all'}, 4),
+    ('api-employee-search', False, {'q': 'Worker', 'root': 'root'}, 5),
+    ('api-async-department-data', True, {}, 5),
+    ('api-async-department-employees', True, {}, 4),
+    ('api-largest-branches', False, {}, 4),
+    ('api-largest-branches', False, {'root': 'root', 'limit': '100'}, 5),
+    ('api-changes', False, {'since': '0'}, 4),
+    ('api-cache-stats', False, {}, 2),
+    ('metrics', False, {}, 2),
+]
+
+# Архив читается из файлов срезов: в базу - только сессия и пользователь
+ARCHIVE_CASES = [
+    ('api-archive', {}, 2),
+    ('api-archive-tree', {'date': 'today'}, 2),
+    ('api-archive-tree', {'date': 'today', 'root': 'root', 'depth': '1'}, 2),
+    ('api-archive-diff', {'from': 'today', 'to': 'today'}, 2),
+]
+
+
+@pytest.fixture(params=[1, 25], ids=lambda fan_out: f'fan_out={fan_out}')
+def wide_structure(request):
+    root = Department.objects.create(name="Root")
+    for number in range(request.param):
+        child = Department.objects.create(name=f"Child {number}", parent=root)
+        Department.objects.create(name="Leaf", parent=child)
+        for department in (root, child):
+            Employee.objects.create(
+                full_name=f"Worker {number}",
+                position="Dev",
+                salary=100,
+                hire_date=date.today(),
+                department=department,
+            )
+    return root
+
+
+def _params(params: dict, root: Department) -> dict:
+    values = {
+        'root': str(root.pk),
+        'all': ','.join(map(str, Department.objects.values_list('pk', flat=True))),
+        'today': timezone.now().date().isoformat(),
+    }
+    return {name: values.get(value, value) for name, value in params.items()}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(('name', 'with_pk', 'params', 'limit'), GET_CASES)
+def test_get_query_count(
+    admin_client, django_assert_max_num_queries, wide_structure,
+    name, with_pk, params, limit,
+):
+    kwargs = {'pk': wide_structure.pk} if with_pk else {}
+    url = reverse(name, kwargs=kwargs)
+    params = _params(params, wide_structure)
+
+    with django_assert_max_num_queries(limit):
+        response = admin_client.get(url, params)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(('name', 'params', 'limit'), ARCHIVE_CASES)
+def test_archive_query_count(
+    admin_client, django_assert_max_num_queries, settings, tmp_path,
+    wide_structure, name, params, limit,
+):
+    settings.STAFF_ARCHIVE_DIR = tmp_path
+    capture()
+    url = reverse(name)
+    params = _params(params, wide_structure)
+
+    with django_assert_max_num_queries(limit):
+        response = admin_client.get(url, params)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('kind', ['departments', 'employees'])
+def test_export_query_count(
+    admin_client, django_assert_max_num_queries, wide_structure, kind
+):
+    url = reverse('api-export', kwargs={'kind': kind})
+
+    with django_assert_max_num_queries(6):
+        response = admin_client.get(url, {'root': wide_structure.pk})
+        b''.join(response.streaming_content)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_reorganization_query_count(
+    admin_client, django_assert_max_num_queries, wide_structure
+):
+    child = wide_structure.get_children().last()
+    body = {'changes': [{'id': child.pk, 'parent': None, 'name': 'Moved'}]}
+    url = reverse('api-department-reorganization')
+
+    with django_assert_max_num_queries(21):
+        response = admin_client.post(url, body, content_type='application/json')
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_children_employee_count(api_client, user, wide_structure):
+    api_client.force_authenticate(user=user)
+    url = reverse('api-department-data', kwargs={'pk': wide_structure.pk})
+
+    children = api_client.get(url, {'employees': '0'}).json()['children']
+    assert {child['employee_count'] for child in children} == {1}
+    assert all(child['has_children'] for child in children)
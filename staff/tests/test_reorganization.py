@@ -0,0 +1,95 @@
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+
+from staff.models import Department, DepartmentStats
+from staff.reorganization import DepartmentChange, ReorganizationError, reorganize
+from staff.stats import rebuild_department_stats
+
+
+def tree_fields():
+    return list(
+        Department.objects.order_by('id').values_list(
+            'id', 'parent_id', 'name', 'lft', 'rght', 'level', 'tree_id'
+        )
+    )
+
+
+def stats():
+    return list(
+        DepartmentStats.objects.order_by('department_id').values_list(
+            'department_id', 'cumulative_count', 'salary_sum'
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_reorganize_matches_mptt_rebuild():
+    call_command('seed_db', employees=300, depth=4, fanout=2, seed=1, batch_size=100)
+    roots = list(Department.objects.filter(level=0).order_by('tree_id'))
+    target = roots[0].get_children().first()
+    taken = set(target.get_children().values_list('name', flat=True))
+    groups = [
+        department
+        for department in Department.objects.filter(level=3, tree_id=roots[1].tree_id)
+        if department.name not in taken
+    ][:3]
+    division = roots[2].get_children().first()
+
+    result = reorganize(
+        [
+            *(DepartmentChange(group.pk, target.pk, move=True) for group in groups),
+            DepartmentChange(division.pk, move=True, name='Самостоятельный блок'),
+            DepartmentChange(roots[1].pk, name='А-филиал'),
+        ]
+    )
+
+    assert result.moved == 4
+    assert result.renamed == 2
+    moved = tree_fields()
+    assert Department.objects.get(pk=division.pk).is_root_node()
+    assert Department.objects.get(pk=groups[0].pk).parent_id == target.pk
+    Department.objects.rebuild()
+    assert tree_fields() == moved
+
+    reorganized = stats()
+    rebuild_department_stats()
+    assert stats() == reorganized
+
+
+@pytest.mark.django_db
+def test_reorganize_rejects_invalid_changes(structure):
+    root, child = structure['root'], structure['child']
+    sibling = Department.objects.create(name='Sibling', parent=root)
+    before = tree_fields()
+
+    with pytest.raises(ReorganizationError, match='собственное поддерево'):
+        reorganize([DepartmentChange(root.pk, child.pk, move=True)])
+    with pytest.raises(ReorganizationError, match='два дочерних'):
+        reorganize([DepartmentChange(sibling.pk, name='Child')])
+    with pytest.raises(ReorganizationError, match='не найдены'):
+        reorganize([DepartmentChange(child.pk, 10**6, move=True)])
+    assert tree_fields() == before
+
+
+@pytest.mark.django_db
+def test_reorganization_api(client, admin_client, structure):
+    url = reverse('api-department-reorganization')
+    body = {'changes': [{'id': structure['child'].pk, 'parent': None}]}
+
+    assert client.post(url, body, content_type='application/json').status_code == 403
+
+    response = admin_client.post(
+        url, {**body, 'dry_run': True}, content_type='application/json'
+    )
+    assert response.status_code == 200
+    assert response.json()['moved'] == 1
+    assert Department.objects.get(pk=structure['child'].pk).parent_id is not None
+
+    response = admin_client.post(url, body, content_type='application/json')
+    assert response.status_code == 200
+    assert Department.objects.get(pk=structure['child'].pk).is_root_node()
+
+    body = {'changes': [{'id': structure['root'].pk, 'parent': 'x'}]}
+    response = admin_client.post(url, body, content_type='application/json')
+    assert response.status_code == 400
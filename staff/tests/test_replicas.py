@@ -0,0 +1,143 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.urls import resolve, reverse
+
+from staff import replicas
+from staff.cache import fresh_reads, invalidate_all
+from staff.models import Department
+from staff.replicas import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter, replica_reads
+from staff.sharding import using_root
+
+router = ReplicaRouter()
+
+
+@pytest.fixture
+def replica(settings, monkeypatch):
+    settings.STAFF_DB_REPLICAS = ['replica']
+    monkeypatch.setattr(replicas, 'choose_replica', lambda: 'replica')
+
+
+def call(request, view):
+    """Проход запроса через middleware с вызовом process_view, как в обработчике"""
+
+    def get_response(request):
+        middleware.process_view(request, view, [], {})
+        return view(request)
+
+    middleware = ReplicaMiddleware(get_response)
+    return middleware(request)
+
+
+def reads(log, write=False):
+    @replica_reads
+    def view(request):
+        log.append(router.db_for_read(Department))
+        if write:
+            router.db_for_write(Department)
+            log.append(router.db_for_read(Department))
+        log.append(router.db_for_read(User))
+        return HttpResponse()
+
+    return view
+
+
+def test_views_marked_for_replica_reads():
+    def marked(name, **kwargs):
+        return replicas._reads_from_replica(resolve(reverse(name, kwargs=kwargs)).func)
+
+    assert marked('index')
+    assert marked('api-department-data', pk=1)
+    assert marked('api-async-department-data', pk=1)
+    assert marked('api-department-analytics', pk=1)
+    assert not marked('api-department-employees', pk=1)
+    assert not marked('api-department-reorganization')
+
+
+def test_reads_go_to_replica_until_write(rf, replica):
+    log = []
+    response = call(rf.get('/'), reads(log))
+    # Модели вне staff (сессии, пользователи) всегда читаются из default
+    assert log == ['replica', None]
+    assert PIN_COOKIE not in response.cookies
+
+    log = []
+    response = call(rf.get('/'), reads(log, write=True))
+    assert log == ['replica', None, None]
+    assert response.cookies[PIN_COOKIE]['max-age'] == 5
+
+    # Сессия после записи читает из default
+    log = []
+    request = rf.get('/')
+    request.COOKIES[PIN_COOKIE] = '1'
+    call(request, reads(log))
+    assert log == [None, None]
+
+
+def test_unmarked_view_and_primary_reads(rf, replica):
+    log = []
+
+    def view(request):
+        log.append(router.db_for_read(Department))
+        return HttpResponse()
+
+    call(rf.get('/'), view)
+
+    @replica_reads
+    def primary(request):
+        with replicas.primary_reads():
+            log.append(router.db_for_read(Department))
+        log.append(router.db_for_read(Department))
+        return HttpResponse()
+
+    call(rf.get('/'), primary)
+    assert log == [None, None, 'replica']
+
+
+def test_sharded_tree_is_not_read_from_replica(rf, replica, settings):
+    settings.STAFF_TREE_SHARDS = {1000: 'branch'}
+    log = []
+    with using_root(1000):
+        call(rf.get('/'), reads(log))
+    with using_root(1):
+        call(rf.get('/'), reads(log))
+    assert log == [None, None, 'replica', None]
+
+
+def test_fresh_reads_after_invalidation(rf, replica, settings):
+    log = []
+
+    @replica_reads
+    def view(request):
+        with fresh_reads(1):
+            log.append(router.db_for_read(Department))
+        return HttpResponse()
+
+    invalidate_all()
+    call(rf.get('/'), view)
+    settings.STAFF_REPLICA_LAG_SECONDS = 0
+    call(rf.get('/'), view)
+    assert log == [None, 'replica']
+
+
+def test_unavailable_replica_is_skipped(settings, monkeypatch):
+    settings.STAFF_DB_REPLICAS = ['replica']
+    attempts = []
+
+    class Connection:
+        def ensure_connection(self):
+            attempts.append(1)
+            raise DatabaseError
+
+    monkeypatch.setattr(replicas, 'connections', {'replica': Connection()})
+    monkeypatch.setattr(replicas, '_unavailable', {})
+    assert replicas.choose_replica() is None
+    assert replicas.choose_replica() is None
+    assert len(attempts) == 1
+
+
+def test_replicas_are_not_migrated(settings):
+    settings.STAFF_DB_REPLICAS = ['replica']
+    assert router.allow_migrate('replica', 'staff') is False
+    assert router.allow_migrate('default', 'staff') is None
@@ -0,0 +1,144 @@
+import random
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from staff.export import export_stream
+from staff.importing import DepartmentTree, save_departments
+from staff.models import Department, DepartmentStats, Employee
+from staff.seeding import (
+    EmployeeGenerator,
+    build_departments,
+    generated_batches,
+    wipe_staff_data,
+)
+
+
+def tree_fields():
+    return list(
+        Department.objects.order_by('id').values_list(
+            'id', 'parent_id', 'lft', 'rght', 'level', 'tree_id'
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_build_departments_matches_mptt_rebuild():
+    departments = build_departments(depth=6, fanout=2, rng=random.Random(1))
+    Department.objects.bulk_create(departments)
+
+    built = tree_fields()
+    Department.objects.rebuild()
+    assert tree_fields() == built
+    assert max(d.level for d in departments) == 5
+
+
+def test_employee_batches_are_reproducible():
+    departments = build_departments(depth=5, rng=random.Random(1))
+    first = EmployeeGenerator(departments, seed=7)
+    second = EmployeeGenerator(departments, seed=7)
+
+    assert first.batch(3, 100) == second.batch(3, 100)
+    assert first.batch(3, 100) != first.batch(4, 100)
+    ids = {d.id for d in departments}
+    assert all(row[4] in ids for row in first.batch(0, 100))
+
+
+def test_generated_batches_do_not_depend_on_workers():
+    generator = EmployeeGenerator(build_departments(depth=4, rng=random.Random(1)), 7)
+    serial = list(generated_batches(generator, 1050, 100))
+    assert [len(rows) for rows in serial] == [100] * 10 + [50]
+    assert list(generated_batches(generator, 1050, 100, workers=3)) == serial
+
+
+@pytest.mark.django_db
+def test_seed_db_command():
+    call_command(
+        'seed_db', employees=500, depth=4, fanout=2, seed=1, batch_size=200, workers=2
+    )
+
+    assert Employee.objects.count() == 500
+    assert Department.objects.filter(level=3).exists()
+    assert not Department.objects.filter(level=4).exists()
+    roots = DepartmentStats.objects.filter(department__level=0)
+    assert sum(s.cumulative_count for s in roots) == 500
+
+
+@pytest.mark.django_db
+def test_import_staff_round_trip(tmp_path):
+    call_command('seed_db', employees=300, depth=4, fanout=2, seed=1, batch_size=100)
+    expected_tree = sorted(
+        (d.name, d.level, d.rght - d.lft) for d in Department.objects.all()
+    )
+    expected_employees = sorted(
+        Employee.objects.values_list('full_name', 'position', 'salary', 'hire_date')
+    )
+    departments = tmp_path / 'departments.csv'
+    departments.write_text(''.join(export_stream('departments', 'csv')))
+    employees = tmp_path / 'employees.ndjson'
+    employees.write_text(''.join(export_stream('employees', 'ndjson')))
+
+    wipe_staff_data()
+    call_command(
+        'import_staff',
+        departments=str(departments),
+        employees=str(employees),
+        batch_size=50,
+    )
+
+    assert sorted(
+        (d.name, d.level, d.rght - d.lft) for d in Department.objects.all()
+    ) == expected_tree
+    assert sorted(
+        Employee.objects.values_list('full_name', 'position', 'salary', 'hire_date')
+    ) == expected_employees
+    tree = tree_fields()
+    Department.objects.rebuild()
+    assert tree_fields() == tree
+    roots = DepartmentStats.objects.filter(department__level=0)
+    assert sum(s.cumulative_count for s in roots) == 300
+
+    # Повторная загрузка обновляет, а не дублирует
+    call_command('import_staff', employees=str(employees))
+    assert Employee.objects.count() == 300
+
+
+@pytest.mark.django_db
+def test_import_ids_come_from_database(structure):
+    tree = DepartmentTree.load()
+    leaf = tree.ensure(['Root', 'Child', 'Отдел', 'Группа'])
+    assert leaf < 0
+    # Подразделение, вставленное параллельно после чтения дерева
+    concurrent = Department.objects.create(name='Параллельный')
+
+    save_departments(tree, batch_size=100)
+    group = Department.objects.get(name='Группа')
+    assert tree.saved[leaf] == group.pk
+    assert group.pk > concurrent.pk
+    assert group.parent.name == 'Отдел'
+    assert group.parent.parent_id == structure['child'].pk
+    assert group.name_path == 'Root / Child / Отдел / Группа'
+    ids = (structure['root'].pk, structure['child'].pk, group.parent_id, group.pk)
+    assert group.path == ''.join(f'{pk}/' for pk in ids)
+    assert Department.objects.filter(pk=concurrent.pk).exists()
+
+
+@pytest.mark.django_db
+def test_import_staff_dry_run_reports_errors(tmp_path, structure):
+    employees = tmp_path / 'employees.csv'
+    employees.write_text(
+        'full_name,position,salary,hire_date,department_path\n'
+        'Новый,Dev,100,2020-01-01,Root / Child\n'
+        'Ошибка,Dev,много,2020-01-01,Root\n'
+        'Потерянный,Dev,100,2020-01-01,Нет такого\n'
+    )
+    with pytest.raises(CommandError, match='Ошибок: 2'):
+        call_command('import_staff', employees=str(employees), dry_run=True)
+
+    employees.write_text(
+        'full_name,position,salary,hire_date,department_path\n'
+        'Новый,Dev,100,2020-01-01,Root / Child\n'
+    )
+    call_command('import_staff', employees=str(employees), dry_run=True)
+    assert not Employee.objects.filter(full_name='Новый').exists()
@@ -0,0 +1,220 @@
+from datetime import date
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from staff.changelog import changes_since
+from staff.checks import check_tree_shards
+from staff.models import Change, Department, DepartmentStats, Employee
+from staff.sharding import (
+    TreeShardMiddleware,
+    TreeShardRouter,
+    department_database,
+    using_root,
+)
+
+
+@pytest.fixture(scope='module')
+def branch_database(tmp_path_factory, django_db_blocker):
+    """Вторая база (SQLite) со всей схемой под дерево филиала"""
+
+    connections.settings['branch'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': str(tmp_path_factory.mktemp('shard') / 'branch.sqlite3'),
+        'ATOMIC_REQUESTS': False,
+        'AUTOCOMMIT': True,
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {},
+        'TIME_ZONE': None,
+        'USER': '',
+        'PASSWORD': '',
+        'HOST': '',
+        'PORT': '',
+        'TEST': {'CHARSET': None, 'COLLATION': None, 'MIGRATE': True, 'MIRROR': None},
+    }
+    with django_db_blocker.unblock():
+        call_command('migrate', database='branch', verbosity=0)
+    yield 'branch'
+    connections['branch'].close()
+    del connections['branch']
+    del connections.settings['branch']
+
+
+@override_settings(STAFF_TREE_SHARDS={1000: 'branch'})
+def test_router_places_trees():
+    router = TreeShardRouter()
+
+    assert router.db_for_read(Employee) is None
+    with using_root(1000):
+        assert router.db_for_read(Employee) == 'branch'
+        assert router.db_for_write(Department) == 'branch'
+        assert router.db_for_read(User) is None
+    with using_root(1):
+        assert router.db_for_read(Employee) == 'default'
+    root = Department(pk=1000)
+    assert router.db_for_write(Department, instance=root) == 'branch'
+    assert router.db_for_write(Department, instance=Department(parent=root)) == 'branch'
+    assert router.db_for_write(Department, instance=Department()) == 'default'
+    branch = Department(pk=1001, parent=root)
+    assert (
+        router.db_for_write(Employee, instance=Employee(department=branch)) == 'branch'
+    )
+    stats = DepartmentStats(department=branch)
+    assert router.db_for_write(DepartmentStats, instance=stats) == 'branch'
+
+
+@override_settings(STAFF_TREE_SHARDS={1000: 'branch'})
+@pytest.mark.parametrize(
+    'command', ['seed_db', 'import_staff', 'reorganize_departments']
+)
+def test_bulk_commands_refuse_shards(command):
+    args = ['-'] if command == 'reorganize_departments' else []
+    with pytest.raises(CommandError, match='STAFF_TREE_SHARDS'):
+        call_command(command, *args)
+
+
+@pytest.mark.django_db
+@override_settings(STAFF_TREE_SHARDS={1000: 'branch'})
+def test_reorganization_api_refuses_shards(admin_client, structure):
+    url = reverse('api-department-reorganization')
+    body = {'changes': [{'id': structure['child'].pk, 'parent': None}]}
+    response = admin_client.post(url, body, content_type='application/json')
+    assert response.status_code == 400
+    assert 'STAFF_TREE_SHARDS' in response.json()['changes']
+    assert Department.objects.get(pk=structure['child'].pk).parent_id is not None
+
+
+@pytest.mark.django_db
+@override_settings(STAFF_TREE_SHARDS={1000: 'branch'})
+def test_middleware_routes_by_department(structure):
+    router = TreeShardRouter()
+    seen = []
+
+    def view(request):
+        seen.append(router.db_for_read(Employee))
+        return HttpResponse()
+
+    def dispatch(request):
+        # Обработчик Django вызывает process_view внутри цепочки middleware
+        middleware.process_view(request, view, [], {'pk': structure['root'].pk})
+        return view(request)
+
+    middleware = TreeShardMiddleware(dispatch)
+    middleware(RequestFactory().get('/'))
+    assert seen == ['default']
+    assert router.db_for_read(Employee) is None
+
+
+@pytest.fixture
+def branch_tree(branch_database, settings, structure):
+    """
+    Дерево с корнем 1000 перенесено в базу филиала, в default остались
+    Root и Zeta; id в базе филиала начинаются с 1000
+    """
+
+    zeta = Department.objects.create(name='Zeta')
+    settings.STAFF_TREE_SHARDS = {1000: 'branch'}
+    Department.objects.using('branch').bulk_create(
+        [
+            Department(id=1000, name='Филиал', tree_id=2, lft=1, rght=4, level=0),
+            Department(
+                id=1001, name='Отдел', parent_id=1000, tree_id=2, lft=2, rght=3, level=1
+            ),
+        ]
+    )
+    Employee.objects.using('branch').create(
+        id=1000,
+        full_name='Сотрудник филиала',
+        position='Dev',
+        salary=100,
+        hire_date=date(2020, 1, 1),
+        department_id=1001,
+    )
+    return {**structure, 'zeta': zeta}
+
+
+@pytest.mark.django_db(databases=['default', 'branch'])
+def test_tree_in_second_database(
+    branch_tree, api_client, user, django_capture_on_commit_callbacks
+):
+    call_command('rebuild_department_stats', stdout=StringIO())
+    assert check_tree_shards(databases=['default', 'branch']) == []
+
+    api_client.force_authenticate(user=user)
+    data = api_client.get(reverse('api-department-tree', kwargs={'pk': 1000})).json()
+    assert data['name'] == 'Филиал'
+    assert data['headcount'] == 1
+    assert [child['name'] for child in data['children']] == ['Отдел']
+
+    # Запись вне запроса: сотрудник и агрегаты - в базе его подразделения,
+    # журнал изменений - в default после фиксации транзакции филиала
+    department = Department.objects.using('branch').get(pk=1001)
+    since = changes_since(0, 1000)[0][-1]['sequence']
+    with django_capture_on_commit_callbacks(using='branch', execute=True):
+        Employee(
+            full_name='Новый',
+            position='Dev',
+            salary=50,
+            hire_date=date(2020, 1, 1),
+            department=department,
+        ).save()
+        assert changes_since(since, 10) == ([], False)
+    assert not Employee.objects.filter(full_name='Новый').exists()
+    stats = DepartmentStats.objects.using('branch').get(pk=1000)
+    assert stats.cumulative_count == 2
+    (change,) = changes_since(since, 10)[0]
+    assert (change['kind'], change['data']['full_name']) == ('employee', 'Новый')
+    assert not Change.objects.using('branch').exists()
+
+    Employee.objects.create(
+        id=1001,
+        full_name='Пересечение',
+        position='Dev',
+        salary=1,
+        hire_date=date(2020, 1, 1),
+        department=branch_tree['root'],
+    )
+    zeta = branch_tree['zeta'].pk
+    with override_settings(
+        STAFF_TREE_SHARDS={1000: 'branch', zeta: 'branch', 1001: 'branch'}
+    ):
+        errors = check_tree_shards(databases=['default', 'branch'])
+    assert [error.id for error in errors] == [
+        'staff.E001',
+        'staff.E002',
+        'staff.E003',
+        'staff.E003',
+    ]
+
+
+@pytest.mark.django_db(databases=['default', 'branch'])
+def test_new_root_keeps_routing(branch_tree):
+    # Alpha вставляется перед Root по названию, и django-mptt сдвигает
+    # tree_id деревьев default - на маршрутизацию это не влияет
+    root, zeta = branch_tree['root'], branch_tree['zeta']
+    Department.objects.create(name='Alpha')
+    root.refresh_from_db()
+    zeta.refresh_from_db()
+    assert (root.tree_id, zeta.tree_id) == (2, 3)
+
+    router = TreeShardRouter()
+    assert department_database(root.pk) == 'default'
+    assert department_database(1000) == 'branch'
+    assert router.db_for_write(Department, instance=root) == 'default'
+    assert (
+        router.db_for_write(Department, instance=Department(parent=root)) == 'default'
+    )
+    assert (
+        router.db_for_write(Employee, instance=Employee(department=root)) == 'default'
+    )
+    child = Department.objects.create(name='Новый отдел', parent=root)
+    assert Department.objects.using('default').filter(pk=child.pk).exists()
+    assert not Department.objects.using('branch').filter(name='Новый отдел').exists()
+    assert check_tree_shards(databases=['default', 'branch']) == []
@@ -0,0 +1,72 @@
+import pytest
+from django.urls import reverse
+
+from staff import snapshot
+from staff.models import Department
+
+
+@pytest.fixture
+def rebuilds(settings, monkeypatch):
+    """Снимок из двух уровней; пересборка синхронно, а не в фоне"""
+
+    settings.STAFF_SNAPSHOT_LEVELS = 2
+    calls = []
+    monkeypatch.setattr(snapshot, '_snapshot', None)
+    monkeypatch.setattr(
+        snapshot, 'schedule_rebuild', lambda: calls.append(snapshot.rebuild())
+    )
+    return calls
+
+
+@pytest.mark.django_db
+def test_top_levels_served_without_queries(
+    client, user, structure, rebuilds, django_assert_num_queries
+):
+    client.force_login(user)
+    root = structure['root']
+    url = reverse('api-department-data', kwargs={'pk': root.pk})
+
+    # Первый запрос читает базу и запускает сборку снимка
+    expected = client.get(url, {'employees': '0'}).json()
+    index = client.get(reverse('index')).context['roots']
+    assert rebuilds
+
+    # Сессия и пользователь
+    with django_assert_num_queries(2):
+        response = client.get(url, {'employees': '0', 'format': 'columnar'})
+    assert response.json() == expected
+    with django_assert_num_queries(2):
+        assert client.get(reverse('index')).context['roots'] == index
+
+    # Дети последнего уровня снимка не загружены
+    assert snapshot.snapshot_children(structure['child'].pk) is None
+
+
+@pytest.mark.django_db
+def test_changed_department_not_served_from_stale_snapshot(structure, rebuilds):
+    root = structure['root']
+    snapshot.snapshot_children(root.pk)
+    assert snapshot.snapshot_children(root.pk)[0]['name'] == 'Child'
+    count = len(rebuilds)
+
+    Department.objects.create(name='Another', parent=root)
+    assert snapshot.snapshot_children(root.pk) is None
+    assert len(rebuilds) == count + 1
+
+    names = [child['name'] for child in snapshot.snapshot_children(root.pk)]
+    assert names == ['Another', 'Child']
+    assert snapshot.snapshot_roots() == [
+        {
+            'id': root.pk,
+            'name': 'Root',
+            'has_children': True,
+            'headcount': 1,
+            'payroll': '100.00',
+        }
+    ]
+
+    # Итоги корня меняются без изменения структуры
+    structure['emp'].salary = 250
+    structure['emp'].save()
+    assert snapshot.snapshot_roots() is None
+    assert snapshot.snapshot_roots()[0]['payroll'] == '250.00'
@@ -0,0 +1,118 @@
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+
+import pytest
+from django.apps import apps
+from django.db import connection
+
+from staff.models import Department, DepartmentStats, Employee
+from staff.stats import rebuild_department_stats
+
+
+def hire(department, name, salary):
+    return Employee.objects.create(
+        full_name=name,
+        position="Dev",
+        salary=salary,
+        hire_date=date.today(),
+        department=department,
+    )
+
+
+def stats_of(department):
+    return DepartmentStats.objects.get(department=department)
+
+
+def snapshot():
+    return {
+        s.department_id: (
+            s.direct_count,
+            s.direct_salary_sum,
+            s.cumulative_count,
+            s.salary_sum,
+            s.salary_min,
+            s.salary_max,
+        )
+        for s in DepartmentStats.objects.all()
+    }
+
+
+@pytest.fixture
+def tree():
+    root = Department.objects.create(name="Root")
+    left = Department.objects.create(name="Left", parent=root)
+    right = Department.objects.create(name="Right", parent=root)
+    leaf = Department.objects.create(name="Leaf", parent=left)
+    return {'root': root, 'left': left, 'right': right, 'leaf': leaf}
+
+
+@pytest.mark.django_db
+def test_stats_follow_employee_changes(tree):
+    hire(tree['leaf'], "A", 100)
+    low = hire(tree['left'], "B", 50)
+    hire(tree['right'], "C", 300)
+
+    root = stats_of(tree['root'])
+    assert root.cumulative_count == 3
+    assert root.salary_sum == Decimal('450')
+    assert (root.salary_min, root.salary_max) == (Decimal('50'), Decimal('300'))
+    assert root.salary_avg == Decimal('150.00')
+    assert stats_of(tree['left']).direct_count == 1
+    assert stats_of(tree['left']).cumulative_count == 2
+
+    low.salary = 200
+    low.save()
+    assert stats_of(tree['root']).salary_min == Decimal('100')
+    assert stats_of(tree['left']).salary_sum == Decimal('300')
+
+    low.department = tree['right']
+    low.save()
+    assert stats_of(tree['left']).cumulative_count == 1
+    assert stats_of(tree['right']).cumulative_count == 2
+
+    low.delete()
+    assert stats_of(tree['root']).cumulative_count == 2
+    assert stats_of(tree['root']).salary_sum == Decimal('400')
+
+    incremental = snapshot()
+    rebuild_department_stats()
+    assert snapshot() == incremental
+
+    # Заполнение агрегатов при миграции уже существующей базы
+    DepartmentStats.objects.all().delete()
+    migration = import_module('staff.migrations.0003_department_stats')
+    migration.fill_stats(apps, SimpleNamespace(connection=connection))
+    assert snapshot() == incremental
+
+
+@pytest.mark.django_db
+def test_stats_follow_department_moves(tree):
+    hire(tree['leaf'], "A", 100)
+    hire(tree['right'], "B", 10)
+
+    leaf = Department.objects.get(pk=tree['leaf'].pk)
+    leaf.parent = Department.objects.get(pk=tree['right'].pk)
+    leaf.save()
+    assert stats_of(tree['left']).cumulative_count == 0
+    assert stats_of(tree['left']).salary_max is None
+    assert stats_of(tree['right']).cumulative_count == 2
+
+    leaf = Department.objects.get(pk=tree['leaf'].pk)
+    Department.objects.move_node(leaf, Department.objects.get(pk=tree['left'].pk))
+    assert stats_of(tree['left']).cumulative_count == 1
+    assert stats_of(tree['right']).cumulative_count == 1
+    assert stats_of(tree['root']).cumulative_count == 2
+
+
+@pytest.mark.django_db
+def test_stats_follow_department_delete(tree):
+    hire(tree['leaf'], "A", 100)
+    hire(tree['left'], "B", 200)
+    hire(tree['right'], "C", 300)
+
+    Department.objects.get(pk=tree['left'].pk).delete()
+    root = stats_of(tree['root'])
+    assert root.cumulative_count == 1
+    assert (root.salary_min, root.salary_max) == (Decimal('300'), Decimal('300'))
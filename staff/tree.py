@@ -0,0 +1,156 @@
+from collections.abc import Iterable, Mapping
+from itertools import count
+
+from rest_framework import serializers
+
+from .instrumentation import TimedSerializerMixin
+from .models import ID_SEPARATOR, PATH_SEPARATOR, Department, Employee
+from .serializers import EmployeeSerializer
+from .stats import money, with_rollup
+
+
+def build_subtree(
+    root: Department, depth: int | None = None, include_employees: bool = False
+) -> dict:
+    """
+    Поддерево подразделения в виде вложенного словаря.
+
+    Все узлы (с итогами поддерева из агрегатов) выбираются одним запросом
+    по диапазону lft на tree_id корня и собираются в дерево за один проход:
+    в порядке lft родитель всегда встречается раньше своих потомков. Узлы
+    на границе ``depth`` не содержат ключа ``children`` - их потомки не
+    загружались.
+    Сотрудники всего поддерева (если нужны) выбираются вторым запросом.
+    """
+
+    bounds = {'tree_id': root.tree_id, 'lft__range': (root.lft, root.rght)}
+    if depth is not None:
+        bounds['level__lte'] = root.level + depth
+    departments = Department.objects.filter(**bounds)
+
+    nodes = {}
+    rows = (
+        with_rollup(departments)
+        .order_by('lft')
+        .values_list(
+            'id', 'name', 'parent_id', 'lft', 'rght', 'level', 'headcount', 'payroll'
+        )
+    )
+    for pk, name, parent_id, lft, rght, level, headcount, payroll in rows:
+        node = {
+            'id': pk,
+            'name': name,
+            'has_children': rght - lft > 1,
+            'headcount': headcount,
+            'payroll': money(payroll),
+        }
+        if depth is None or level < root.level + depth:
+            node['children'] = []
+        if include_employees:
+            node['employees'] = []
+        nodes[pk] = node
+        if pk != root.pk:
+            nodes[parent_id]['children'].append(node)
+
+    if include_employees:
+        employees = list(
+            Employee.objects.filter(
+                **{f'department__{key}': value for key, value in bounds.items()}
+            ).order_by('full_name', 'id')
+        )
+        data = EmployeeSerializer(employees, many=True).data
+        for employee, item in zip(employees, data, strict=True):
+            nodes[employee.department_id]['employees'].append(item)
+
+    return nodes[root.pk]
+
+
+class DepartmentSubtreeSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """Поддерево подразделения; параметры берутся из контекста"""
+
+    def to_representation(self, instance: Department) -> dict:
+        return build_subtree(
+            instance,
+            depth=self.context.get('depth'),
+            include_employees=self.context.get('include_employees', False),
+        )
+
+
+def department_paths(departments: Iterable[Department]) -> dict[int, list[dict]]:
+    """
+    Пути от корня до каждого из подразделений.
+
+    id предков берутся из материализованного пути, названия - одним
+    запросом по первичному ключу.
+    """
+
+    ancestors = {
+        department.pk: [int(pk) for pk in department.path.split(ID_SEPARATOR)[:-1]]
+        for department in departments
+    }
+    ids = {pk for chain in ancestors.values() for pk in chain}
+    if not ids:
+        return {pk: [] for pk in ancestors}
+    names = dict(Department.objects.filter(pk__in=ids).values_list('id', 'name'))
+    return {
+        pk: [{'id': ancestor, 'name': names[ancestor]} for ancestor in chain]
+        for pk, chain in ancestors.items()
+    }
+
+
+def nested_set_fields(
+    nodes: Mapping[int, tuple[int | None, str]],
+    tree_ids: Mapping[int, int] | None = None,
+) -> dict[int, tuple[int, int, int, int]]:
+    """
+    Поля MPTT (tree_id, lft, rght, level) узлов, заданных парами
+    (id родителя, название).
+
+    Соседи упорядочены по названию, как при вставке с
+    ``order_insertion_by = ['name']``. ``tree_ids`` задаёт tree_id корней;
+    по умолчанию корни нумеруются с 1 в порядке названий.
+    """
+
+    children = {}
+    for pk, (parent_id, name) in nodes.items():
+        children.setdefault(parent_id, []).append((name, pk))
+    roots = [pk for _, pk in sorted(children.get(None, ()))]
+    if tree_ids is None:
+        tree_ids = {pk: tree_id for tree_id, pk in enumerate(roots, start=1)}
+
+    result = {}
+    for root_id in roots:
+        counter = count(1)
+        # Стек (id, уровень, lft или None при первом посещении)
+        stack = [(root_id, 0, None)]
+        while stack:
+            pk, level, left = stack.pop()
+            if left is not None:
+                result[pk] = (tree_ids[root_id], left, next(counter), level)
+                continue
+            stack.append((pk, level, next(counter)))
+            for _, child_id in sorted(children.get(pk, ()), reverse=True):
+                stack.append((child_id, level + 1, None))
+    return result
+
+
+def path_fields(
+    nodes: Mapping[int, tuple[int | None, str]],
+) -> dict[int, tuple[str, str]]:
+    """Материализованные пути (id, названия) узлов из пар (id родителя, название)"""
+
+    result = {}
+    for pk in nodes:
+        # Поднимаемся до предка с уже известным путём
+        chain = []
+        ancestor = pk
+        while ancestor is not None and ancestor not in result:
+            chain.append(ancestor)
+            ancestor = nodes[ancestor][0]
+        path, name_path = result.get(ancestor, ('', ''))
+        for node in reversed(chain):
+            name = nodes[node][1]
+            path = f'{path}{node}{ID_SEPARATOR}'
+            name_path = f'{name_path}{PATH_SEPARATOR}{name}' if name_path else name
+            result[node] = (path, name_path)
+    return result
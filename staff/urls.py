@@ -1,7 +1,22 @@
 from django.urls import path
 
-from . import views
-from .api import DepartmentDataAPIView
+from . import async_api, views
+from .api import (
+    ArchiveDiffAPIView,
+    ArchiveListAPIView,
+    ArchiveTreeAPIView,
+    CacheStatsAPIView,
+    ChangeFeedAPIView,
+    DepartmentAnalyticsAPIView,
+    DepartmentDataAPIView,
+    DepartmentEmployeesAPIView,
+    DepartmentPathsAPIView,
+    DepartmentReorganizationAPIView,
+    DepartmentStatsAPIView,
+    DepartmentSubtreeAPIView,
+    EmployeeSearchAPIView,
+    LargestBranchesAPIView,
+)
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -10,4 +25,61 @@ urlpatterns = [
         DepartmentDataAPIView.as_view(),
         name='api-department-data',
     ),
+    path(
+        'api/department-employees/<int:pk>/',
+        DepartmentEmployeesAPIView.as_view(),
+        name='api-department-employees',
+    ),
+    path(
+        'api/department-stats/<int:pk>/',
+        DepartmentStatsAPIView.as_view(),
+        name='api-department-stats',
+    ),
+    path(
+        'api/department-tree/<int:pk>/',
+        DepartmentSubtreeAPIView.as_view(),
+        name='api-department-tree',
+    ),
+    path(
+        'api/department-analytics/<int:pk>/',
+        DepartmentAnalyticsAPIView.as_view(),
+        name='api-department-analytics',
+    ),
+    path(
+        'api/department-paths/',
+        DepartmentPathsAPIView.as_view(),
+        name='api-department-paths',
+    ),
+    path(
+        'api/department-reorganization/',
+        DepartmentReorganizationAPIView.as_view(),
+        name='api-department-reorganization',
+    ),
+    path(
+        'api/largest-branches/',
+        LargestBranchesAPIView.as_view(),
+        name='api-largest-branches',
+    ),
+    path(
+        'api/employee-search/',
+        EmployeeSearchAPIView.as_view(),
+        name='api-employee-search',
+    ),
+    path(
+        'api/async/department-data/<int:pk>/',
+        async_api.department_data,
+        name='api-async-department-data',
+    ),
+    path(
+        'api/async/department-employees/<int:pk>/',
+        async_api.department_employees,
+        name='api-async-department-employees',
+    ),
+    path('api/changes/', ChangeFeedAPIView.as_view(), name='api-changes'),
+    path('api/archive/', ArchiveListAPIView.as_view(), name='api-archive'),
+    path('api/archive/tree/', ArchiveTreeAPIView.as_view(), name='api-archive-tree'),
+    path('api/archive/diff/', ArchiveDiffAPIView.as_view(), name='api-archive-diff'),
+    path('api/cache-stats/', CacheStatsAPIView.as_view(), name='api-cache-stats'),
+    path('api/export/<str:kind>/', views.export, name='api-export'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
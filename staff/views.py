@@ -1,11 +1,106 @@
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import render
+from operator import attrgetter
 
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, render
+from django.utils.crypto import constant_time_compare
+
+from .export import EXPORTS, FORMATS, aiterate, export_stream
+from .instrumentation import metrics as request_metrics
 from .models import Department
+from .replicas import replica_reads
+from .sharding import keep_database, tree_databases
+from .snapshot import snapshot_roots
+from .stats import money, with_rollup
 
 
+@replica_reads
 def index(request: HttpRequest) -> HttpResponse:
     """Главная страница"""
 
-    roots = Department.objects.root_nodes()
-    return render(request, 'staff/index.html', {'roots': roots})
+    roots = snapshot_roots()
+    if roots is None:
+        roots = [
+            {
+                'id': root.pk,
+                'name': root.name,
+                'has_children': not root.is_leaf_node(),
+                'headcount': root.headcount,
+                'payroll': money(root.payroll),
+            }
+            for root in sorted(
+                (
+                    root
+                    for alias in tree_databases()
+                    for root in with_rollup(
+                        Department.objects.db_manager(alias).root_nodes()
+                    )
+                ),
+                key=attrgetter('tree_id'),
+            )
+        ]
+    # Корни отдаются странице данными: дерево рисует клиентский рендерер
+    context = {
+        'roots': roots,
+        'async_api': settings.STAFF_ASYNC_API,
+    }
+    return render(request, 'staff/index.html', context)
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Метрики процесса в текстовом формате Prometheus.
+
+    Если задан ``STAFF_METRICS_TOKEN``, доступ по заголовку
+    ``Authorization: Bearer <token>``, иначе только для персонала.
+    """
+
+    token = settings.STAFF_METRICS_TOKEN
+    if token:
+        allowed = constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        request_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def export(request: HttpRequest, kind: str) -> HttpResponse:
+    """
+    Потоковая выгрузка подразделений или сотрудников.
+
+    Параметры: ``format`` - csv (по умолчанию) или ndjson, ``root`` -
+    ограничить выгрузку поддеревом подразделения.
+    """
+
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+    if kind not in EXPORTS:
+        return HttpResponseBadRequest(f'Неизвестная выгрузка: {kind}')
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest(f'Неизвестный формат: {export_format}')
+    root = None
+    if root_id := request.GET.get('root'):
+        if not root_id.isdigit():
+            return HttpResponseBadRequest('Ожидается id подразделения')
+        root = get_object_or_404(Department, pk=root_id)
+
+    chunks = keep_database(export_stream(kind, export_format, root))
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{export_format}"'
+    return response